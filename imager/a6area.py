@@ -0,0 +1,282 @@
+"""
+Area operations for the imager application.
+
+An area operation sets each pixel (or block of pixels) to the average of a
+rectangle of the original image.  Pixellating, box blurring and shrinking an
+image are all area operations.  Adding up the pixels of each rectangle is slow
+when the rectangles are large, so this module adds them up once, in a summed
+area table (also called an integral image).  Then the sum of any rectangle is
+found from just 4 entries of the table, no matter how large it is.
+
+If NumPy is installed, the table is a NumPy array and whole grids of sums are
+found at once.  Otherwise the table is an array of ints for each channel.
+
+Aaron Baruch (amb565) Ilan Klimberg (idk7)
+10/17/2026
+"""
+from array import array
+from itertools import accumulate
+import a6image
+
+try:
+    import numpy
+except ImportError:     # NumPy is optional
+    numpy = None
+
+
+class Integral(object):
+    """
+    A summed area table of an image.
+
+    The entry (row, col) of the table is the sum of every pixel above and to
+    the left of (row, col) in the image, in each channel.  The table has one
+    more row and one more column than the image, so that row 0 and column 0
+    are all 0.  The sum of the rectangle with its top left corner at (row, col)
+    that is height rows tall and width columns wide is then
+
+        T[row+height, col+width] - T[row, col+width] - T[row+height, col] + T[row, col]
+
+    for the table T.  An average is the sum divided by the number of pixels,
+    rounded down, as in the method pixellate in a6filter.Filter.
+
+    The table is computed when the object is made, so it does not change if
+    the image is changed later.
+    """
+    # Attribute _width: The width of the image
+    # Invariant: _width is an int >= 0
+    #
+    # Attribute _height: The height of the image
+    # Invariant: _height is an int >= 0
+    #
+    # Attribute _tables: The table of each channel, without NumPy
+    # Invariant: _tables is a list of 3 arrays of (_height+1)*(_width+1) ints
+    # in row-major order, or None if _array is used
+    #
+    # Attribute _array: The table, with NumPy
+    # Invariant: _array is an int64 NumPy array of shape (_height+1,_width+1,3),
+    # or None if NumPy is not installed
+
+    def __init__(self, image):
+        """
+        Initializes the summed area table of an image.
+
+        Parameter image: The image to add up
+        Precondition: image is an Image object
+        """
+        assert isinstance(image,a6image.Image), repr(image)+' is not an image'
+        self._width = image.getWidth()
+        self._height = image.getHeight()
+        self._tables = None
+        self._array = None
+        data = image.tobytes()
+        if numpy is not None:
+            pixels = numpy.frombuffer(data,dtype=numpy.uint8)
+            pixels = pixels.reshape(self._height,self._width,3).astype(numpy.int64)
+            self._array = numpy.zeros((self._height+1,self._width+1,3),dtype=numpy.int64)
+            self._array[1:,1:] = pixels.cumsum(0).cumsum(1)
+            return
+
+        # Each row of a table is the row above plus the running sum of the row
+        span = self._width
+        self._tables = []
+        for channel in range(3):
+            values = data[channel::3]
+            table = array('q',bytes(8*(span+1)))
+            above = table[:]
+            for row in range(self._height):
+                line = accumulate(values[row*span:(row+1)*span],initial=0)
+                above = array('q',map(int.__add__,above,line))
+                table.extend(above)
+            self._tables.append(table)
+
+    def getWidth(self):
+        """
+        Returns the width of the image
+        """
+        return self._width
+
+    def getHeight(self):
+        """
+        Returns the height of the image
+        """
+        return self._height
+
+    def total(self, row, col, height, width):
+        """
+        Returns the sum of the pixels in the given rectangle, as a tuple.
+
+        The result has the sum of the red values, the green values and the blue
+        values, in that order.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+        """
+        assert self._isRegion(row,col,height,width), 'the rectangle is not in the image'
+        if self._array is not None:
+            table = self._array
+            result = (table[row+height,col+width]-table[row,col+width]
+                      -table[row+height,col]+table[row,col])
+            return tuple(int(value) for value in result)
+
+        span = self._width+1
+        top = row*span
+        bottom = (row+height)*span
+        return tuple(table[bottom+col+width]-table[top+col+width]
+                     -table[bottom+col]+table[top+col] for table in self._tables)
+
+    def average(self, row, col, height, width):
+        """
+        Returns the average pixel in the given rectangle.
+
+        Each channel of the average is rounded down.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int > 0 and row+height <= image height
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int > 0 and col+width <= image width
+        """
+        assert height > 0 and width > 0, 'the rectangle is empty'
+        count = height*width
+        return tuple(value//count for value in self.total(row,col,height,width))
+
+    def grid(self, step):
+        """
+        Returns the averages of the blocks of step x step pixels, as a pixel list.
+
+        The blocks start at the top left corner of the image.  The blocks at
+        the right and bottom edges are smaller if step does not divide the
+        width or height.  The averages are listed in row-major order, so the
+        result is the pixel list of an image that is one pixel for each block.
+
+        Parameter step: The size of the blocks
+        Precondition: step is an int > 0
+        """
+        assert type(step) == int and step > 0, repr(step)+' is not a valid step'
+        rows = list(range(0,self._height,step))+[self._height]
+        cols = list(range(0,self._width,step))+[self._width]
+        return self._averages(rows[:-1],rows[1:],cols[:-1],cols[1:])
+
+    def blur(self, radius):
+        """
+        Returns the box blur of the image, as a pixel list.
+
+        Each pixel of the result is the average of the square of pixels that
+        are at most radius rows and radius columns away from it, in the image.
+        Near the edges, the part of the square outside the image is left out.
+
+        Parameter radius: The radius of the square
+        Precondition: radius is an int >= 0
+        """
+        assert type(radius) == int and radius >= 0, repr(radius)+' is not a valid radius'
+        rows = range(self._height)
+        cols = range(self._width)
+        return self._averages([max(row-radius,0) for row in rows],
+                              [min(row+radius+1,self._height) for row in rows],
+                              [max(col-radius,0) for col in cols],
+                              [min(col+radius+1,self._width) for col in cols])
+
+    # HELPER METHODS
+    def _averages(self, tops, bottoms, lefts, rights):
+        """
+        Returns the averages of a grid of rectangles, as a pixel list.
+
+        There is a rectangle for each row (top, bottom) and column (left, right)
+        of the grid, listed in row-major order.  A rectangle covers the rows
+        top..bottom-1 and the columns left..right-1 of the image.
+
+        Parameter tops: The first image row of each grid row
+        Parameter bottoms: The image row after each grid row
+        Precondition: tops and bottoms are lists of ints of the same length,
+        with 0 <= top < bottom <= image height for each pair
+
+        Parameter lefts: The first image column of each grid column
+        Parameter rights: The image column after each grid column
+        Precondition: lefts and rights are lists of ints of the same length,
+        with 0 <= left < right <= image width for each pair
+        """
+        if self._array is not None:
+            top = numpy.array(tops)
+            bottom = numpy.array(bottoms)
+            left = numpy.array(lefts)
+            right = numpy.array(rights)
+            table = self._array
+            sums = (table[bottom][:,right]-table[top][:,right]
+                    -table[bottom][:,left]+table[top][:,left])
+            counts = numpy.outer(bottom-top,right-left)
+            data = (sums // counts[:,:,numpy.newaxis]).astype(numpy.uint8).tobytes()
+            return list(zip(data[0::3],data[1::3],data[2::3]))
+
+        span = self._width+1
+        result = []
+        red, green, blue = self._tables
+        for top, bottom in zip(tops,bottoms):
+            up = top*span
+            down = bottom*span
+            for left, right in zip(lefts,rights):
+                count = (bottom-top)*(right-left)
+                a = down+right
+                b = up+right
+                c = down+left
+                d = up+left
+                result.append(((red[a]-red[b]-red[c]+red[d])//count,
+                               (green[a]-green[b]-green[c]+green[d])//count,
+                               (blue[a]-blue[b]-blue[c]+blue[d])//count))
+        return result
+
+    def _isRegion(self, row, col, height, width):
+        """
+        Returns True if the given rectangle lies inside the image.
+
+        Parameter row: The top row of the rectangle
+        Precondition: NONE (row can be anything)
+
+        Parameter col: The left column of the rectangle
+        Precondition: NONE (col can be anything)
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: NONE (height can be anything)
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: NONE (width can be anything)
+        """
+        for value in (row,col,height,width):
+            if type(value) != int or value < 0:
+                return False
+        return row+height <= self._height and col+width <= self._width
+
+
+def downscale(image, factor):
+    """
+    Returns a new image that is image shrunk by the given factor.
+
+    Each pixel of the new image is the average of a block of factor x factor
+    pixels of image (see Integral.grid), so the new image is about factor
+    times narrower and shorter.  If factor does not divide the width or
+    height, the blocks at the right and bottom edges are smaller.
+
+    Parameter image: The image to shrink
+    Precondition: image is a nonempty Image object
+
+    Parameter factor: The size of the blocks
+    Precondition: factor is an int > 0
+    """
+    assert isinstance(image,a6image.Image) and len(image) > 0, repr(image)+' is not a nonempty image'
+    integral = Integral(image)
+    width = -(-image.getWidth()//factor)
+    return a6image.Image(integral.grid(factor),width)
@@ -0,0 +1,1523 @@
+"""
+Compact pixel storage for the imager application.
+
+An Image normally keeps its pixels in a pixel list, which is a Python list of
+3-element tuples. That is easy to work with, but every pixel costs a list slot,
+a tuple and (for uncommon colors) three int objects. That is more than 80 bytes
+for what is really 3 bytes of color.
+
+The classes in this module are pixel buffers. A pixel buffer is a drop-in
+replacement for a pixel list: it supports len, the [] operator (with positions
+and slices) and copy, and it always reads and writes pixels as 3-element tuples.
+So an Image can hold a pixel buffer instead of a pixel list, and none of the
+code using the Image has to know the difference.
+
+NumPy is optional.  If it is installed, the buffers can also present their
+pixels as an array, which lets filters process a whole image at once.
+
+Aaron Baruch (amb565) Ilan Klimberg (idk7)
+10/17/2026
+"""
+from array import array
+from bisect import bisect_right
+from itertools import chain, count, groupby, repeat
+import mmap
+import sys
+import tempfile
+
+try:
+    import numpy
+except ImportError:     # NumPy is optional
+    numpy = None
+
+
+class PixelBuffer(object):
+    """
+    The base class for all pixel buffers.
+
+    A pixel buffer acts like a pixel list whose length can never change. You
+    can read a pixel with buffer[pos] and write one with buffer[pos] = pixel.
+    If you use a slice instead of a position, you read (or write) a pixel list.
+
+    This class does not store anything itself. Subclasses decide how the
+    pixels are stored, and must implement __len__, __getitem__, __setitem__,
+    copy and tobytes.
+    """
+    # The storage mode (as named by PIL).  Only buffers with a reduced mode
+    # (see PaletteBuffer) change this.
+    MODE = 'RGB'
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this buffer
+        """
+        raise NotImplementedError('__len__ is not implemented')
+
+    def __getitem__(self, pos):
+        """
+        Returns the pixel at the given position, or a pixel list for a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+        """
+        raise NotImplementedError('__getitem__ is not implemented')
+
+    def __setitem__(self, pos, pixel):
+        """
+        Sets the pixel at the given position, or the pixels in a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+
+        Parameter pixel: The pixel value (a pixel list for a slice)
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255, or
+        a pixel list with the same length as the slice
+        """
+        raise NotImplementedError('__setitem__ is not implemented')
+
+    def __iter__(self):
+        """
+        Returns an iterator over the pixels in this buffer
+        """
+        for pos in range(len(self)):
+            yield self[pos]
+
+    def copy(self):
+        """
+        Returns a copy of this buffer.
+
+        The copy has the same kind of storage, but does not share it.
+        """
+        raise NotImplementedError('copy is not implemented')
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        raise NotImplementedError('tobytes is not implemented')
+
+    def asarray(self):
+        """
+        Returns a NumPy view of the pixels, or None if there is not one.
+
+        The view is an array of shape (len(self),3) and type uint8 that shares
+        its memory with this buffer, so changing it changes the buffer.  This
+        method returns None if NumPy is not installed or if the storage cannot
+        be viewed without copying it.
+        """
+        return None
+
+    def asbuffer(self):
+        """
+        Returns a memoryview of the packed pixels, or None if there is not one.
+
+        The view is of the bytes returned by tobytes, but it shares its memory
+        with this buffer instead of copying it.  This method returns None if 
+        the pixels are not stored as a single block of packed bytes.
+        """
+        return None
+
+    def promote(self):
+        """
+        Returns a buffer with the same pixels that can store any pixel.
+
+        Most buffers can store any pixel, and just return themselves.  A buffer
+        that raises a ModeError on some writes returns a new PackedBuffer
+        instead; it never changes itself.
+        """
+        return self
+
+    def reshape(self, width):
+        """
+        Returns a buffer with the same pixels, arranged for the given width.
+
+        Most buffers do not care about the width of the image, and just return
+        themselves.  A buffer whose layout depends on the width returns a new
+        buffer instead; it never changes itself, as it may be shared by a copy
+        of the image.
+
+        Parameter width: The new image width
+        Precondition: width is an int > 0 that evenly divides len(self)
+        """
+        return self
+
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this buffer.
+
+        This is the real memory used, counting every Python object that the 
+        buffer keeps (see sizeof), and not just 3 bytes a pixel. Subclasses 
+        add the objects holding their pixels to the count of this method.
+
+        If seen is given, objects already in it are not counted again, so 
+        storage shared with a copy of this buffer can be counted only once.
+
+        Parameter seen: The ids of the objects already counted (see sizeof)
+        Precondition: seen is a set of ints, or None
+        """
+        return sizeof([self,self.__dict__],set() if seen is None else seen)
+
+    def recolor(self, convert):
+        """
+        Returns a buffer with every pixel changed by the given function.
+
+        The function convert takes packed pixels (as returned by tobytes) and 
+        returns the new packed pixels, as a bytes object of the same length.  
+        Each new pixel must only depend on the old pixel in the same place, so
+        a buffer may convert its pixels in any order, or convert each of its
+        colors just once.
+        
+        A buffer that can store the new pixels changes itself and returns 
+        itself.  Otherwise it returns a new buffer, and does not change.  This
+        class converts the packed bytes in place, if there is a memoryview of 
+        them (see asbuffer).
+
+        Parameter convert: The function changing the pixels
+        Precondition: convert is a pointwise function from packed pixels to 
+        packed pixels (such as an a6lut.Table)
+        """
+        view = self.asbuffer()
+        if view is None:
+            self[:] = _unpack(convert(self.tobytes()))
+        else:
+            view[:] = convert(view)
+        return self
+
+
+class PackedBuffer(PixelBuffer):
+    """
+    A pixel buffer backed by a single array of interleaved RGB bytes.
+
+    Pixel pos is stored in the three bytes starting at 3*pos.  This takes 3
+    bytes a pixel, so a 24 megapixel image fits in 72 MB instead of the 2 GB
+    needed by a pixel list.
+
+    The bytes may be a bytearray, an array('B'), or any other writable buffer
+    of bytes (such as an mmap).  As with Image, the buffer stores a reference
+    to a writable byte array; it does not copy it.
+    """
+    # Attribute _bytes: The interleaved RGB bytes
+    # Invariant: _bytes is a writable byte array whose length is divisible by 3
+
+    def __init__(self, data):
+        """
+        Initializes a buffer from a pixel list or from packed bytes.
+
+        If data is a pixel list, the pixels are packed into a new bytearray.
+        If it is a writable byte array (bytearray, array('B'), mmap), the buffer
+        uses it directly.  Any other bytes (such as a bytes object) are copied.
+
+        Parameter data: The pixels to store
+        Precondition: data is a pixel list, or packed bytes whose length is
+        divisible by 3
+        """
+        if isinstance(data,list):
+            data = bytearray(chain.from_iterable(data))
+        elif not _is_writable(data):
+            data = bytearray(data)
+        assert len(data) % 3 == 0, repr(data)+' is not a sequence of packed pixels'
+        self._bytes = data
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this buffer
+        """
+        return len(self._bytes)//3
+
+    def __getitem__(self, pos):
+        """
+        Returns the pixel at the given position, or a pixel list for a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+        """
+        data = self._bytes
+        if isinstance(pos,slice):
+            start, stop, step = pos.indices(len(self))
+            if step != 1:
+                return [self[ii] for ii in range(start,stop,step)]
+            return _unpack(data[3*start:3*stop])
+        pos = 3*pos
+        return (data[pos],data[pos+1],data[pos+2])
+
+    def __setitem__(self, pos, pixel):
+        """
+        Sets the pixel at the given position, or the pixels in a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+
+        Parameter pixel: The pixel value (a pixel list for a slice)
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255, or
+        a pixel list with the same length as the slice
+        """
+        data = self._bytes
+        if isinstance(pos,slice):
+            start, stop, step = pos.indices(len(self))
+            span = range(start,stop,step)
+            assert len(span) == len(pixel), 'a pixel buffer cannot change size'
+            if step != 1:
+                for ii in range(len(span)):
+                    self[span[ii]] = pixel[ii]
+            else:
+                data[3*start:3*stop] = bytes(chain.from_iterable(pixel))
+            return
+        pos = 3*pos
+        data[pos  ] = pixel[0]
+        data[pos+1] = pixel[1]
+        data[pos+2] = pixel[2]
+
+    def __iter__(self):
+        """
+        Returns an iterator over the pixels in this buffer
+        """
+        data = self._bytes
+        return zip(data[0::3],data[1::3],data[2::3])
+
+    def copy(self):
+        """
+        Returns a copy of this buffer, stored in a new bytearray.
+        """
+        return PackedBuffer(bytearray(self._bytes))
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        return bytes(self._bytes)
+
+    def asarray(self):
+        """
+        Returns a NumPy view of the pixels, or None if NumPy is not installed.
+
+        The view is an array of shape (len(self),3) and type uint8 that shares
+        its memory with this buffer, so changing it changes the buffer.
+        """
+        if numpy is None:
+            return None
+        return numpy.frombuffer(self._bytes,dtype=numpy.uint8).reshape(-1,3)
+
+    def asbuffer(self):
+        """
+        Returns a memoryview of the packed pixels.
+
+        The view shares its memory with this buffer, so changing it changes
+        the buffer.
+        """
+        return memoryview(self._bytes).cast('B')
+
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this buffer.
+
+        This counts the packed bytes.  For a MappedBuffer, that is the whole
+        mapping, although the system need not keep all of it in memory.
+
+        Parameter seen: The ids of the objects already counted (see sizeof)
+        Precondition: seen is a set of ints, or None
+        """
+        seen = set() if seen is None else seen
+        return PixelBuffer.nbytes(self,seen)+sizeof([self._bytes],seen)
+
+
+class MappedBuffer(PackedBuffer):
+    """
+    A packed pixel buffer whose bytes live in a memory-mapped file.
+    
+    The pixels are stored exactly as in PackedBuffer, but the bytes are not 
+    read into memory.  The operating system pages them in when a pixel is
+    accessed (and can page them out again), so the image can be larger than
+    the memory of the machine.
+    
+    By default the mapping is private: changes to the buffer are never 
+    written back to the file.  So the same file can be opened as often as you
+    like, and always shows the original pixels.
+    """
+    # Attribute _map: The memory map of the file
+    # Invariant: _map is an mmap object
+    #
+    # Attribute _bytes: The interleaved RGB bytes (see PackedBuffer)
+    # Invariant: _bytes is a memoryview of _map, starting at the pixel offset
+    
+    # The number of bytes to write at once when copying a mapped buffer
+    CHUNK = 1 << 24
+    
+    def __init__(self, file, offset=0, private=True):
+        """
+        Initializes a buffer from the bytes of a file.
+        
+        The pixels are the bytes of the file starting at position offset and 
+        going to the end of the file.
+        
+        Parameter file: The file to map
+        Precondition: file is a path to a non-empty file, or a file object 
+        opened in binary mode (for reading and writing if private is False)
+        
+        Parameter offset: The position of the first pixel in the file
+        Precondition: offset is an int >= 0
+        
+        Parameter private: Whether to keep changes out of the file
+        Precondition: private is a bool
+        """
+        assert isinstance(offset,int) and offset >= 0, repr(offset)+' is not a valid offset'
+        access = mmap.ACCESS_COPY if private else mmap.ACCESS_WRITE
+        if isinstance(file,str):
+            with open(file,'rb' if private else 'r+b') as handle:
+                self._map = mmap.mmap(handle.fileno(),0,access=access)
+        else:
+            self._map = mmap.mmap(file.fileno(),0,access=access)
+        self._bytes = memoryview(self._map)[offset:]
+        assert len(self._bytes) % 3 == 0, repr(file)+' does not contain packed pixels'
+    
+    def copy(self):
+        """
+        Returns a copy of this buffer, stored in a new temporary file.
+        
+        The copy is a (non-private) memory map of an anonymous temporary file, 
+        so copying a large image does not require memory for the whole copy.
+        The temporary file is deleted when it is no longer used.
+        """
+        if len(self._bytes) == 0:
+            return PackedBuffer(bytearray())
+        
+        data = self._bytes
+        with tempfile.TemporaryFile() as handle:
+            for pos in range(0,len(data),self.CHUNK):
+                handle.write(data[pos:pos+self.CHUNK])
+            handle.flush()
+            return MappedBuffer(handle,private=False)
+    
+    def flush(self):
+        """
+        Writes any changes to the underlying file.
+        
+        This method does nothing if the mapping is private.
+        """
+        self._map.flush()
+
+
+class ArrayBuffer(PixelBuffer):
+    """
+    A pixel buffer backed by a NumPy array.
+
+    The pixels are stored in an array of type uint8 with one row of 3 color
+    values per pixel.  Like PackedBuffer this takes 3 bytes a pixel, but the
+    array can also be handed to NumPy directly (see asarray).
+
+    This class can only be used if NumPy is installed.
+    """
+    # Attribute _array: The pixel array
+    # Invariant: _array is a C-contiguous uint8 NumPy array of shape (n,3)
+
+    def __init__(self, data):
+        """
+        Initializes a buffer from a pixel list, packed bytes or an array.
+
+        If data is a NumPy array, the buffer keeps a view of it (it does not
+        copy it), so changes to the buffer change data as well. Any other data
+        is copied into a new array.
+
+        Parameter data: The pixels to store
+        Precondition: NumPy is installed. data is a pixel list, packed bytes
+        whose length is divisible by 3, or a C-contiguous uint8 array whose
+        last dimension is 3
+        """
+        assert numpy is not None, 'NumPy is not installed'
+        if isinstance(data,numpy.ndarray):
+            assert data.dtype == numpy.uint8 and data.shape[-1] == 3, \
+                repr(data)+' is not an array of pixels'
+            assert data.flags.c_contiguous, repr(data)+' is not contiguous'
+            array = data.reshape(-1,3)
+        elif isinstance(data,list):
+            array = numpy.array(data,dtype=numpy.uint8).reshape(-1,3)
+        else:
+            assert len(data) % 3 == 0, repr(data)+' is not a sequence of packed pixels'
+            array = numpy.frombuffer(data,dtype=numpy.uint8).reshape(-1,3).copy()
+        self._array = array
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this buffer
+        """
+        return len(self._array)
+
+    def __getitem__(self, pos):
+        """
+        Returns the pixel at the given position, or a pixel list for a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+        """
+        if isinstance(pos,slice):
+            return list(map(tuple,self._array[pos].tolist()))
+        return tuple(self._array[pos].tolist())
+
+    def __setitem__(self, pos, pixel):
+        """
+        Sets the pixel at the given position, or the pixels in a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+
+        Parameter pixel: The pixel value (a pixel list for a slice)
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255, or
+        a pixel list with the same length as the slice
+        """
+        if isinstance(pos,slice):
+            assert len(range(*pos.indices(len(self)))) == len(pixel), \
+                'a pixel buffer cannot change size'
+        self._array[pos] = pixel
+
+    def __iter__(self):
+        """
+        Returns an iterator over the pixels in this buffer
+        """
+        return map(tuple,self._array.tolist())
+
+    def copy(self):
+        """
+        Returns a copy of this buffer, stored in a new array.
+        """
+        return ArrayBuffer(self._array.copy())
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        return self._array.tobytes()
+
+    def asarray(self):
+        """
+        Returns the NumPy array storing the pixels.
+
+        The array has shape (len(self),3) and type uint8.  Changing it changes
+        the buffer.
+        """
+        return self._array
+
+    def asbuffer(self):
+        """
+        Returns a memoryview of the packed pixels.
+
+        The view shares its memory with this buffer, so changing it changes
+        the buffer.
+        """
+        return memoryview(self._array).cast('B')
+
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this buffer.
+
+        This counts the pixel array, even if it is a view of another array.
+
+        Parameter seen: The ids of the objects already counted (see sizeof)
+        Precondition: seen is a set of ints, or None
+        """
+        seen = set() if seen is None else seen
+        return PixelBuffer.nbytes(self,seen)+sizeof([self._array],seen)
+
+
+class ModeError(ValueError):
+    """
+    The error raised when a pixel buffer will not store a pixel.
+
+    Buffers with a reduced storage mode (see PaletteBuffer and GreyBuffer) 
+    raise this error instead of storing a color they cannot represent.  
+    Buffers that are only meant for reading (see RunBuffer) raise it once they
+    have been written to too much.  The buffer is unchanged by the failed 
+    write, except that some pixels in a failed slice assignment may have been 
+    written.  Use the method promote to get a buffer that can store the pixel.
+    """
+    pass
+
+
+class PaletteBuffer(PixelBuffer):
+    """
+    A pixel buffer that stores each pixel as an index into a palette.
+
+    The palette is a list of at most 256 colors, so each pixel takes a single
+    byte.  This is a third of the memory of PackedBuffer, and much less than 
+    that for images with only a few colors (such as samples/blocks.png).
+
+    Writing a color that is not in the palette adds it to the palette.  If the
+    palette is already full, the write raises a ModeError.  Image handles that
+    error by replacing the buffer with the RGB buffer returned by promote, so
+    an image with too many colors changes mode instead of failing.
+    """
+    # Attribute _palette: The colors of the palette
+    # Invariant: _palette is a pixel list with at most LIMIT distinct colors
+    #
+    # Attribute _index: The position of each color in the palette
+    # Invariant: _index is a dict mapping each pixel in _palette to its position
+    #
+    # Attribute _bytes: The palette index of each pixel
+    # Invariant: _bytes is a bytearray of positions in _palette
+    
+    # The most colors a palette can hold
+    LIMIT = 256
+    
+    # The storage mode (as named by PIL)
+    MODE = 'P'
+
+    def __init__(self, data, palette=None):
+        """
+        Initializes a buffer from a pixel list.
+
+        The palette starts out as the given colors, and any other colors in 
+        data are added in the order they appear.
+
+        Parameter data: The pixels to store
+        Precondition: data is a pixel list with at most LIMIT distinct colors
+        (including the palette)
+
+        Parameter palette: The initial palette
+        Precondition: palette is None or a pixel list of at most LIMIT 
+        distinct colors
+        """
+        self._palette = [] if palette is None else list(palette)
+        assert len(self._palette) <= self.LIMIT, 'the palette has too many colors'
+        self._index = dict(zip(self._palette,range(len(self._palette))))
+        self._bytes = bytearray(self._indices(data))
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this buffer
+        """
+        return len(self._bytes)
+
+    def __getitem__(self, pos):
+        """
+        Returns the pixel at the given position, or a pixel list for a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+        """
+        if isinstance(pos,slice):
+            return list(map(self._palette.__getitem__,self._bytes[pos]))
+        return self._palette[self._bytes[pos]]
+
+    def __setitem__(self, pos, pixel):
+        """
+        Sets the pixel at the given position, or the pixels in a slice.
+
+        This method raises a ModeError if a color is not in the palette and
+        the palette is full.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+
+        Parameter pixel: The pixel value (a pixel list for a slice)
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255, or
+        a pixel list with the same length as the slice
+        """
+        if isinstance(pos,slice):
+            assert len(range(*pos.indices(len(self)))) == len(pixel), \
+                'a pixel buffer cannot change size'
+            self._bytes[pos] = self._indices(pixel)
+        elif pixel in self._index:
+            self._bytes[pos] = self._index[pixel]
+        else:
+            self._bytes[pos] = self._add(pixel)
+
+    def __iter__(self):
+        """
+        Returns an iterator over the pixels in this buffer
+        """
+        return map(self._palette.__getitem__,self._bytes)
+
+    def copy(self):
+        """
+        Returns a copy of this buffer, with its own palette.
+        """
+        result = PixelBuffer.__new__(type(self))
+        result._palette = list(self._palette)
+        result._index = dict(self._index)
+        result._bytes = bytearray(self._bytes)
+        return result
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        result = bytearray(3*len(self._bytes))
+        padding = bytes(256-len(self._palette))
+        for channel in range(3):
+            table = bytes(color[channel] for color in self._palette)+padding
+            result[channel::3] = self._bytes.translate(table)
+        return bytes(result)
+
+    def getPalette(self):
+        """
+        Returns a copy of the palette of this buffer.
+        """
+        return list(self._palette)
+
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this buffer.
+
+        This counts the color indices, as well as the palette and its index
+        (which every buffer has a copy of).
+
+        Parameter seen: The ids of the objects already counted (see sizeof)
+        Precondition: seen is a set of ints, or None
+        """
+        seen = set() if seen is None else seen
+        result = PixelBuffer.nbytes(self,seen)
+        result = result+sizeof([self._bytes,self._palette,self._index],seen)
+        return result+sizeof(self._palette,seen)
+
+    def recolor(self, convert):
+        """
+        Returns a new buffer with every pixel changed by the given function.
+
+        Only the palette is converted, so this takes the same time no matter 
+        how large the image is.  The result is a GreyBuffer if every new color
+        is grey, and a PaletteBuffer otherwise (as a palette can only lose 
+        colors).  This buffer is not changed.
+
+        Parameter convert: The function changing the pixels
+        Precondition: convert is a pointwise function from packed pixels to 
+        packed pixels (see PixelBuffer.recolor)
+        """
+        colors = _unpack(convert(bytes(chain.from_iterable(self._palette))))
+        padding = bytes(256-len(colors))
+        if all(red == green == blue for red, green, blue in colors):
+            levels = bytes(color[0] for color in colors)+padding
+            return GreyBuffer(self._bytes.translate(levels))
+        result = PaletteBuffer(colors)
+        result._bytes = self._bytes.translate(bytes(result._bytes)+padding)
+        return result
+
+    def promote(self):
+        """
+        Returns an RGB buffer with the same pixels as this one.
+
+        The result is a PackedBuffer, which can store any color.  This buffer
+        is not changed.
+        """
+        return PackedBuffer(bytearray(self.tobytes()))
+
+    # HELPER METHODS
+    def _indices(self, pixels):
+        """
+        Returns the palette indices of the given pixels as bytes.
+
+        Colors that are not in the palette are added to it.  This method 
+        raises a ModeError if they do not fit.
+
+        Parameter pixels: The pixels to look up
+        Precondition: pixels is a pixel list
+        """
+        index = self._index
+        try:
+            return bytes(map(index.__getitem__,pixels))
+        except KeyError:
+            pass
+        
+        for pixel in pixels:
+            if not pixel in index:
+                self._add(pixel)
+        return bytes(map(index.__getitem__,pixels))
+
+    def _add(self, pixel):
+        """
+        Returns the palette index of a new color, after adding it to the palette.
+
+        This method raises a ModeError if the palette is full.
+
+        Parameter pixel: The color to add
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255 that
+        is not in the palette
+        """
+        pos = len(self._palette)
+        if pos >= self.LIMIT:
+            raise ModeError(repr(pixel)+' is not in the palette')
+        self._palette.append(pixel)
+        self._index[pixel] = pos
+        return pos
+
+
+class GreyBuffer(PaletteBuffer):
+    """
+    A pixel buffer for greyscale images, storing one byte per pixel.
+
+    A greyscale pixel has the same value in all three channels, so the buffer
+    only stores that value.  This is a palette buffer whose palette is the 256 
+    greys, in order.  So the palette can never grow, and writing any color 
+    that is not grey raises a ModeError (see PaletteBuffer).
+    """
+    # The storage mode (as named by PIL)
+    MODE = 'L'
+
+    def __init__(self, data):
+        """
+        Initializes a buffer from a pixel list or from grey levels.
+
+        If data is a pixel list, every pixel must be grey.  Otherwise data has
+        one byte for each pixel, giving its grey level.
+
+        Parameter data: The pixels to store
+        Precondition: data is a pixel list of grey pixels, or a bytes-like 
+        object of grey levels
+        """
+        if isinstance(data,list):
+            PaletteBuffer.__init__(self,data,_GREYS)
+        else:
+            PaletteBuffer.__init__(self,[],_GREYS)
+            self._bytes = bytearray(data)
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        result = bytearray(3*len(self._bytes))
+        result[0::3] = self._bytes
+        result[1::3] = self._bytes
+        result[2::3] = self._bytes
+        return bytes(result)
+
+
+# The palette of a GreyBuffer
+_GREYS = [(level,level,level) for level in range(256)]
+
+
+class RunBuffer(PixelBuffer):
+    """
+    A pixel buffer that stores each row of the image as runs of one color.
+
+    A run is a color and the number of pixels it repeats for.  Flat graphics 
+    (such as samples/blocks.png, or anything drawn with jail bars) have rows 
+    with only a few runs, so this takes far less memory than any other buffer,
+    and it makes copies and history entries just as small.
+
+    Each row keeps the column where each of its runs ends, so a pixel is found
+    with a binary search of its row.  Writing a pixel re-encodes its row, which
+    is fine for a few writes but slow for many.  So this buffer is meant for
+    images that are mostly read. Once the rows re-encoded add up to more than
+    1/DENSE of the image, any further write raises a ModeError, and Image 
+    switches to the (packed) buffer returned by promote.
+
+    Like TiledBuffer, the layout depends on the image width.
+    """
+    # Attribute _rows: The runs of each row, as a pair (ends, colors)
+    # Invariant: _rows is a list of tuples. In each tuple, ends is an array of
+    # increasing column positions ending at _width, and colors is a pixel list
+    # of the same length.  Run n covers the columns before ends[n] (and not 
+    # before ends[n-1]).  These tuples are never modified, only replaced, so 
+    # copies of the buffer may share them.
+    #
+    # Attribute _width: The number of pixels in a row
+    # Invariant: _width is an int > 0
+    #
+    # Attribute _written: The number of pixels re-encoded since this buffer was made
+    # Invariant: _written is an int >= 0
+    
+    # The fraction (1/DENSE) of the pixels that can be re-encoded before promoting
+    DENSE = 4
+
+    def __init__(self, data, width):
+        """
+        Initializes a buffer from a pixel list.
+
+        Parameter data: The pixels to store
+        Precondition: data is a pixel list (or a pixel buffer)
+
+        Parameter width: The image width
+        Precondition: width is an int > 0 that evenly divides len(data)
+        """
+        assert isinstance(width,int) and width > 0, repr(width)+' is not a valid width'
+        assert len(data) % width == 0, repr(width)+' does not divide the buffer'
+        self._width = width
+        self._rows = [_encode_runs(data[pos:pos+width]) for pos in range(0,len(data),width)]
+        self._written = 0
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this buffer
+        """
+        return len(self._rows)*self._width
+
+    def __getitem__(self, pos):
+        """
+        Returns the pixel at the given position, or a pixel list for a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+        """
+        if isinstance(pos,slice):
+            start, stop, step = pos.indices(len(self))
+            if step != 1:
+                return [self[ii] for ii in range(start,stop,step)]
+            result = []
+            for row, left, right in self._segments(start,stop):
+                result.extend(self._decode(row)[left:right])
+            return result
+        row, col = divmod(pos,self._width)
+        ends, colors = self._rows[row]
+        return colors[bisect_right(ends,col)]
+
+    def __setitem__(self, pos, pixel):
+        """
+        Sets the pixel at the given position, or the pixels in a slice.
+
+        This method raises a ModeError (without writing anything) once too many 
+        rows have been re-encoded (see DENSE).
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+
+        Parameter pixel: The pixel value (a pixel list for a slice)
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255, or
+        a pixel list with the same length as the slice
+        """
+        if isinstance(pos,slice):
+            start, stop, step = pos.indices(len(self))
+            span = range(start,stop,step)
+            assert len(span) == len(pixel), 'a pixel buffer cannot change size'
+            if step != 1:
+                self._count(len(span)*self._width)
+                for ii in range(len(span)):
+                    self._write(span[ii],[pixel[ii]])
+            else:
+                self._count(len(list(self._segments(start,stop)))*self._width)
+                self._write(start,pixel)
+            return
+        self._count(self._width)
+        self._write(pos,[pixel])
+
+    def __iter__(self):
+        """
+        Returns an iterator over the pixels in this buffer
+        """
+        for row in range(len(self._rows)):
+            yield from self._decode(row)
+
+    def copy(self):
+        """
+        Returns a copy of this buffer.
+
+        The copy shares the (unchangeable) runs of each row with this buffer,
+        so copying is fast and takes little memory.
+        """
+        result = PixelBuffer.__new__(RunBuffer)
+        result._width = self._width
+        result._rows = list(self._rows)
+        result._written = 0
+        return result
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        result = bytearray()
+        for ends, colors in self._rows:
+            last = 0
+            for end, color in zip(ends,colors):
+                result += bytes(color)*(end-last)
+                last = end
+        return bytes(result)
+
+    def promote(self):
+        """
+        Returns a packed buffer with the same pixels as this one.
+
+        This buffer is not changed.
+        """
+        return PackedBuffer(bytearray(self.tobytes()))
+
+    def reshape(self, width):
+        """
+        Returns a buffer with the same pixels, arranged for the given width.
+
+        If the width is unchanged, this is the buffer itself.  Otherwise the
+        pixels are encoded again as a new buffer.
+
+        Parameter width: The new image width
+        Precondition: width is an int > 0 that evenly divides len(self)
+        """
+        if width == self._width:
+            return self
+        return RunBuffer(self[:],width)
+
+    def getRunCount(self):
+        """
+        Returns the total number of runs in this buffer.
+
+        This is a measure of the memory used: each run takes a color and a
+        position, no matter how long it is.
+        """
+        return sum(len(ends) for ends, colors in self._rows)
+
+    def recolor(self, convert):
+        """
+        Returns a new buffer with every pixel changed by the given function.
+
+        Each distinct color of the runs is converted just once, and the new 
+        buffer shares the run positions with this one (which is not changed).
+
+        Parameter convert: The function changing the pixels
+        Precondition: convert is a pointwise function from packed pixels to 
+        packed pixels (see PixelBuffer.recolor)
+        """
+        colors = list(set(chain.from_iterable(row[1] for row in self._rows)))
+        table = dict(zip(colors,_unpack(convert(bytes(chain.from_iterable(colors))))))
+        result = PixelBuffer.__new__(RunBuffer)
+        result._width = self._width
+        result._rows = [(ends,list(map(table.__getitem__,row))) for ends, row in self._rows]
+        result._written = 0
+        return result
+
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this buffer.
+
+        This counts the runs of every row.  Copies of this buffer share the 
+        runs of the rows they have not written, so give them the same seen to
+        count those runs only once.
+
+        Parameter seen: The ids of the objects already counted (see sizeof)
+        Precondition: seen is a set of ints, or None
+        """
+        seen = set() if seen is None else seen
+        result = PixelBuffer.nbytes(self,seen)+sizeof([self._rows],seen)
+        for row in self._rows:
+            result = result+sizeof(chain([row],row,row[1]),seen)
+        return result
+
+    # HELPER METHODS
+    def _decode(self, row):
+        """
+        Returns the pixel list for the given row.
+
+        Parameter row: The row to decode
+        Precondition: row is an int with 0 <= row < number of rows
+        """
+        ends, colors = self._rows[row]
+        result = []
+        last = 0
+        for end, color in zip(ends,colors):
+            result.extend(repeat(color,end-last))
+            last = end
+        return result
+
+    def _segments(self, start, stop):
+        """
+        Yields the pieces of each row between the positions start and stop.
+
+        Each piece is a tuple (row, left, right) covering the columns from left
+        up to (but not including) right.
+
+        Parameter start: The first position
+        Precondition: start is an int with 0 <= start <= stop
+
+        Parameter stop: The position after the last one
+        Precondition: stop is an int with stop <= len(self)
+        """
+        width = self._width
+        while start < stop:
+            row, left = divmod(start,width)
+            right = min(width,left+stop-start)
+            yield (row,left,right)
+            start = start+right-left
+
+    def _write(self, start, pixels):
+        """
+        Writes pixels starting at position start, re-encoding every row touched.
+
+        Parameter start: The first position to write
+        Precondition: start is an int with 0 <= start <= len(self)-len(pixels)
+
+        Parameter pixels: The pixels to write
+        Precondition: pixels is a pixel list
+        """
+        used = 0
+        for row, left, right in self._segments(start,start+len(pixels)):
+            line = self._decode(row)
+            line[left:right] = pixels[used:used+right-left]
+            self._rows[row] = _encode_runs(line)
+            used = used+right-left
+
+    def _count(self, number):
+        """
+        Adds number to the pixels re-encoded, or raises a ModeError if that is too many.
+
+        Parameter number: The number of pixels about to be re-encoded
+        Precondition: number is an int >= 0
+        """
+        if self._written+number > len(self)//self.DENSE:
+            raise ModeError('too many pixels written to a run buffer')
+        self._written = self._written+number
+
+
+class TiledBuffer(PixelBuffer):
+    """
+    A pixel buffer that stores the image as a grid of square tiles.
+
+    Each tile holds the packed bytes for a size x size block of the image
+    (tiles on the right and bottom edges may be smaller).  The tiles are
+    independent of one another, which has two advantages.
+
+    First, copying the buffer only copies the list of tiles.  The tiles
+    themselves are shared, and a tile is not copied until it is written to.
+    So a copy of an image with a small local edit only costs the tiles that
+    the edit touched.
+
+    Second, every tile has a generation: a number that increases each time
+    the tile is written.  The buffer remembers the generation of its last
+    call to markClean, so it can report which tiles are dirty (written since
+    then) and which have changed since any earlier generation.  Anything that
+    mirrors the image (a texture, a file, a snapshot) only has to update the
+    tiles that changed.
+
+    As the layout depends on the width of the image, this buffer must know
+    that width.
+    """
+    # Attribute _tiles: The tiles in row-major order
+    # Invariant: _tiles is a list of _Tile objects
+    #
+    # Attribute _width: The image width
+    # Invariant: _width is an int > 0
+    #
+    # Attribute _size: The size of a (full) tile
+    # Invariant: _size is an int > 0
+    #
+    # Attribute _across: The number of tiles in each row of tiles
+    # Invariant: _across is an int >= 0
+    #
+    # Attribute _length: The number of pixels
+    # Invariant: _length is an int >= 0 divisible by _width
+    #
+    # Attribute _clean: The generation of the last call to markClean
+    # Invariant: _clean is an int >= 0
+
+    # The default tile size
+    SIZE = 256
+
+    def __init__(self, data, width, size=SIZE):
+        """
+        Initializes a tiled buffer from a pixel list or from packed bytes.
+
+        The pixels are copied into new tiles.  All of the tiles start out
+        clean.
+
+        Parameter data: The pixels to store
+        Precondition: data is a pixel list, or packed bytes whose length is
+        divisible by 3
+
+        Parameter width: The image width
+        Precondition: width is an int > 0 that evenly divides the number of
+        pixels
+
+        Parameter size: The width (and height) of a tile
+        Precondition: size is an int > 0
+        """
+        if isinstance(data,list):
+            data = bytes(chain.from_iterable(data))
+        else:
+            data = memoryview(data).cast('B')
+        assert len(data) % 3 == 0, repr(data)+' is not a sequence of packed pixels'
+        assert isinstance(width,int) and width > 0 and (len(data)//3) % width == 0, \
+            repr(width)+' is not a valid width'
+        assert isinstance(size,int) and size > 0, repr(size)+' is not a valid tile size'
+
+        self._width  = width
+        self._size   = size
+        self._length = len(data)//3
+        self._across = -(-width//size)
+        self._tiles  = []
+        height = self._length//width
+        for top in range(0,height,size):
+            for left in range(0,width,size):
+                tile = _Tile(min(size,width-left),min(size,height-top))
+                for row in range(tile.height):
+                    start = 3*((top+row)*width+left)
+                    tile.data += data[start:start+3*tile.width]
+                self._tiles.append(tile)
+        self._clean = next(_clock)
+
+    def __len__(self):
+        """
+        Returns the number of pixels in this buffer
+        """
+        return self._length
+
+    def __getitem__(self, pos):
+        """
+        Returns the pixel at the given position, or a pixel list for a slice.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+        """
+        if isinstance(pos,slice):
+            start, stop, step = pos.indices(self._length)
+            if step != 1:
+                return [self[ii] for ii in range(start,stop,step)]
+            tiles = self._tiles
+            chunks = [tiles[index].data[offset:offset+3*count]
+                      for (index,offset,count) in self._segments(start,stop)]
+            return _unpack(b''.join(chunks))
+
+        row, col = divmod(pos,self._width)
+        band, row = divmod(row,self._size)
+        across, col = divmod(col,self._size)
+        tile = self._tiles[band*self._across+across]
+        data = tile.data
+        pos = 3*(row*tile.width+col)
+        return (data[pos],data[pos+1],data[pos+2])
+
+    def __setitem__(self, pos, pixel):
+        """
+        Sets the pixel at the given position, or the pixels in a slice.
+
+        Only the tiles containing these pixels are marked as changed.
+
+        Parameter pos: The position in the buffer
+        Precondition: pos is an int with 0 <= pos < len(self), or a slice
+
+        Parameter pixel: The pixel value (a pixel list for a slice)
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255, or
+        a pixel list with the same length as the slice
+        """
+        if isinstance(pos,slice):
+            start, stop, step = pos.indices(self._length)
+            span = range(start,stop,step)
+            assert len(span) == len(pixel), 'a pixel buffer cannot change size'
+            if step != 1:
+                for ii in range(len(span)):
+                    self[span[ii]] = pixel[ii]
+                return
+            data = bytes(chain.from_iterable(pixel))
+            done = 0
+            for (index,offset,count) in self._segments(start,stop):
+                tile = self._writable(index)
+                tile.data[offset:offset+3*count] = data[done:done+3*count]
+                done = done + 3*count
+            return
+
+        row, col = divmod(pos,self._width)
+        band, row = divmod(row,self._size)
+        across, col = divmod(col,self._size)
+        tile = self._writable(band*self._across+across)
+        data = tile.data
+        pos = 3*(row*tile.width+col)
+        data[pos  ] = pixel[0]
+        data[pos+1] = pixel[1]
+        data[pos+2] = pixel[2]
+
+    def copy(self):
+        """
+        Returns a copy of this buffer that shares its tiles.
+
+        A shared tile is copied by whichever buffer writes to it first, so the
+        copy never sees changes to this buffer (or the other way around).
+        """
+        result = TiledBuffer.__new__(TiledBuffer)
+        result.__dict__.update(self.__dict__)
+        result._tiles = self._tiles[:]
+        for tile in self._tiles:
+            tile.shared = True
+        return result
+
+    def tobytes(self):
+        """
+        Returns the pixels of this buffer as packed bytes.
+
+        The result is a bytes object with three bytes (r,g,b) per pixel.
+        """
+        rows = []
+        for band in range(0,len(self._tiles),self._across):
+            tiles = self._tiles[band:band+self._across]
+            for row in range(tiles[0].height):
+                for tile in tiles:
+                    line = 3*tile.width
+                    rows.append(tile.data[row*line:(row+1)*line])
+        return b''.join(rows)
+
+    def reshape(self, width):
+        """
+        Returns a buffer with the same pixels, arranged for the given width.
+
+        If the width is unchanged, this method returns the buffer itself.
+        Otherwise, it returns a new tiled buffer (with the same tile size).
+
+        Parameter width: The new image width
+        Precondition: width is an int > 0 that evenly divides len(self)
+        """
+        if width == self._width:
+            return self
+        return TiledBuffer(self.tobytes(),width,self._size)
+
+    # TILE ACCESS
+    def getTileSize(self):
+        """
+        Returns the width (and height) of a full tile
+        """
+        return self._size
+
+    def getTiles(self, generation=None):
+        """
+        Returns the rectangles of the tiles that changed after generation.
+
+        Each rectangle is a tuple (row, col, height, width), with the same 
+        meaning as the argument to the method fill in Image.  If generation
+        is None, this method returns the dirty tiles instead: the tiles written
+        since the last call to markClean.
+
+        Parameter generation: The generation to compare against
+        Precondition: generation is an int returned by markClean, or None
+        """
+        if generation is None:
+            generation = self._clean
+        result = []
+        for index in range(len(self._tiles)):
+            tile = self._tiles[index]
+            if tile.generation > generation:
+                band, across = divmod(index,self._across)
+                result.append((band*self._size,across*self._size,tile.height,tile.width))
+        return result
+
+    def isDirty(self):
+        """
+        Returns True if any tile was written since the last call to markClean.
+        """
+        for tile in self._tiles:
+            if tile.generation > self._clean:
+                return True
+        return False
+
+    def markClean(self):
+        """
+        Marks every tile as clean and returns the current generation.
+
+        The generation can later be given to getTiles to find the tiles that
+        changed after this call.
+        """
+        self._clean = next(_clock)
+        return self._clean
+
+    def recolor(self, convert):
+        """
+        Returns this buffer, after changing every pixel by the given function.
+
+        The tiles are converted one at a time, and every tile becomes dirty.
+
+        Parameter convert: The function changing the pixels
+        Precondition: convert is a pointwise function from packed pixels to 
+        packed pixels (see PixelBuffer.recolor)
+        """
+        for index in range(len(self._tiles)):
+            tile = self._writable(index)
+            tile.data[:] = convert(tile.data)
+        return self
+
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this buffer.
+
+        This counts every tile. Copies of this buffer share the tiles they 
+        have not written, so give them the same seen to count those tiles 
+        only once.
+
+        Parameter seen: The ids of the objects already counted (see sizeof)
+        Precondition: seen is a set of ints, or None
+        """
+        seen = set() if seen is None else seen
+        result = PixelBuffer.nbytes(self,seen)+sizeof([self._tiles],seen)
+        for tile in self._tiles:
+            result = result+sizeof([tile,tile.__dict__,tile.data],seen)
+        return result
+
+    # HELPER METHODS
+    def _writable(self, index):
+        """
+        Returns the tile at index, ready to be written.
+
+        If the tile is shared with a copy, it is replaced with a copy of its
+        own first.  Either way the tile gets a new generation, as the caller 
+        is about to change it.
+
+        Parameter index: The tile position
+        Precondition: index is an int with 0 <= index < len(self._tiles)
+        """
+        tile = self._tiles[index]
+        if tile.shared:
+            tile = tile.copy()
+            self._tiles[index] = tile
+        tile.generation = next(_clock)
+        return tile
+
+    def _segments(self, start, stop):
+        """
+        Generates the pieces of the pixel span start..stop, one per tile row.
+
+        Each piece is a tuple (index, offset, count): the tile position, the 
+        byte offset in that tile, and the number of pixels.  The pieces are 
+        generated in order, so joining them gives the whole span.
+
+        Parameter start: The first pixel of the span
+        Precondition: start is an int with 0 <= start <= len(self)
+
+        Parameter stop: The pixel after the span
+        Precondition: stop is an int with start <= stop <= len(self)
+        """
+        size = self._size
+        pos = start
+        while pos < stop:
+            row, col = divmod(pos,self._width)
+            band, row = divmod(row,size)
+            end = min(stop-pos,self._width-col)+col
+            pos = pos+end-col
+            while col < end:
+                across, left = divmod(col,size)
+                index = band*self._across+across
+                width = self._tiles[index].width
+                count = min(end-col,width-left)
+                yield (index,3*(row*width+left),count)
+                col = col+count
+
+
+class _Tile(object):
+    """
+    A single tile of a TiledBuffer.
+
+    This is a simple record, so its attributes are not hidden.
+    """
+    # Attribute data: The packed RGB bytes of the tile, row by row
+    # Invariant: data is a bytearray of length 3*width*height
+    #
+    # Attribute width: The number of columns in the tile
+    # Invariant: width is an int > 0
+    #
+    # Attribute height: The number of rows in the tile
+    # Invariant: height is an int > 0
+    #
+    # Attribute generation: The generation of the last write to this tile
+    # Invariant: generation is an int >= 0
+    #
+    # Attribute shared: Whether this tile may be shared by several buffers
+    # Invariant: shared is a bool
+
+    def __init__(self, width, height):
+        """
+        Initializes an empty tile of the given size.
+
+        The tile data starts out empty, to be filled in by the caller.
+
+        Parameter width: The number of columns in the tile
+        Precondition: width is an int > 0
+
+        Parameter height: The number of rows in the tile
+        Precondition: height is an int > 0
+        """
+        self.data = bytearray()
+        self.width = width
+        self.height = height
+        self.generation = 0
+        self.shared = False
+
+    def copy(self):
+        """
+        Returns an unshared copy of this tile.
+        """
+        result = _Tile(self.width,self.height)
+        result.data = bytearray(self.data)
+        result.generation = self.generation
+        return result
+
+
+# The source of tile generations.  It only ever increases.
+_clock = count(1)
+
+
+def sizeof(objects, seen):
+    """
+    Returns the number of bytes of memory used by the given objects.
+
+    The size of an object is as reported by sys.getsizeof, which does not 
+    include the objects it refers to (such as the items of a list).  So the 
+    caller must list every object to count.  The size of a memoryview (or of a
+    NumPy array that does not own its memory) includes the memory it views.
+
+    Small ints (such as the colors of a pixel) and None are shared by all of 
+    Python, so they are never counted.  Neither is any object whose id is in 
+    seen, and the id of every object counted is added to seen.  So an object
+    listed twice, or shared by several images, is only counted once.
+
+    Parameter objects: The objects to count
+    Precondition: objects is an iterable of objects
+
+    Parameter seen: The ids of the objects already counted
+    Precondition: seen is a set of ints
+    """
+    result = 0
+    for item in objects:
+        if item is None or (type(item) is int and -5 <= item <= 256):
+            continue
+        key = id(item)
+        if key in seen:
+            continue
+        seen.add(key)
+        result = result+sys.getsizeof(item)
+        if isinstance(item,memoryview):
+            result = result+item.nbytes
+        elif numpy is not None and isinstance(item,numpy.ndarray) and not item.base is None:
+            result = result+item.nbytes
+    return result
+
+
+# HELPER FUNCTIONS
+def _is_writable(data):
+    """
+    Returns True if data is a writable array of bytes, False otherwise.
+
+    Parameter data: The data to check
+    Precondition: NONE (data can be anything)
+    """
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return False
+    return not view.readonly and view.format == 'B' and view.ndim == 1
+
+
+def _encode_runs(pixels):
+    """
+    Returns the runs of a row of pixels, as a pair (ends, colors).
+
+    See RunBuffer for the meaning of the pair.
+
+    Parameter pixels: The row of pixels
+    Precondition: pixels is a non-empty pixel list
+    """
+    ends = array('I')
+    colors = []
+    end = 0
+    for color, run in groupby(pixels):
+        end = end+sum(1 for _ in run)
+        ends.append(end)
+        colors.append(color)
+    return (ends,colors)
+
+
+def _unpack(data):
+    """
+    Returns the pixel list for the given packed bytes.
+
+    Parameter data: The packed bytes
+    Precondition: data is a sequence of ints in 0..255 whose length is
+    divisible by 3
+    """
+    return list(zip(data[0::3],data[1::3],data[2::3]))
@@ -0,0 +1,231 @@
+"""
+Drawing shapes for the imager application.
+
+A shape is drawn by filling spans.  A span is a tuple (row, col, width): the
+width pixels of the given row starting at col.  The functions in this module
+turn rectangles, lines, polylines, circles and polygons into spans, one row at
+a time, so that each span can be written as a single slice of the image (see
+the method fillSpans in Image).  That is much faster than setting each pixel.
+
+Points are tuples (row, col) of ints, just like the arguments of getPixel.
+Spans may lie partly (or completely) outside of an image.  Those parts are left
+out when the spans are filled, so shapes can be drawn over the edges.
+
+Aaron Baruch (amb565) Ilan Klimberg (idk7)
+10/17/2026
+"""
+import math
+
+
+def rectangle(row, col, height, width):
+    """
+    Returns the spans of a filled rectangle.
+
+    The rectangle has its top left corner at (row, col) and is height rows
+    tall and width columns wide, as in the method fill in Image.
+
+    Parameter row: The top row of the rectangle
+    Precondition: row is an int
+
+    Parameter col: The left column of the rectangle
+    Precondition: col is an int
+
+    Parameter height: The number of rows in the rectangle
+    Precondition: height is an int >= 0
+
+    Parameter width: The number of columns in the rectangle
+    Precondition: width is an int >= 0
+    """
+    assert height >= 0 and width >= 0, 'the rectangle cannot have a negative size'
+    if width == 0:
+        return []
+    return [(pos,col,width) for pos in range(row,row+height)]
+
+
+def line(start, end, thickness=1):
+    """
+    Returns the spans of a straight line from start to end.
+
+    The line has both ends.  Its pixels are chosen with Bresenham's algorithm,
+    so there is exactly one pixel in each row (or each column, for a line that
+    is closer to horizontal).  A thicker line puts a square of thickness x
+    thickness pixels, centered on each of those pixels.  The pixels in a row
+    are merged into spans.
+
+    Parameter start: The first end of the line
+    Precondition: start is a tuple (row, col) of ints
+
+    Parameter end: The other end of the line
+    Precondition: end is a tuple (row, col) of ints
+
+    Parameter thickness: The width of the line, in pixels
+    Precondition: thickness is an int > 0
+    """
+    assert type(thickness) == int and thickness > 0, repr(thickness)+' is not a valid thickness'
+    return _merge(_brush(_bresenham(start,end),thickness))
+
+
+def polyline(points, thickness=1):
+    """
+    Returns the spans of the lines joining each point to the next.
+
+    The lines are drawn as in the function line.  The polyline is not closed;
+    to close it, repeat the first point at the end.
+
+    Parameter points: The points to join
+    Precondition: points is a nonempty list of tuples (row, col) of ints
+
+    Parameter thickness: The width of the lines, in pixels
+    Precondition: thickness is an int > 0
+    """
+    assert len(points) > 0, 'a polyline needs a point'
+    assert type(thickness) == int and thickness > 0, repr(thickness)+' is not a valid thickness'
+    pixels = [points[0]]
+    for pos in range(1,len(points)):
+        pixels.extend(_bresenham(points[pos-1],points[pos]))
+    return _merge(_brush(pixels,thickness))
+
+
+def circle(center, radius, thickness=None):
+    """
+    Returns the spans of a circle.
+
+    A pixel is in the circle if its distance to the center is at most radius.
+    If thickness is None, the circle is filled.  Otherwise it is a ring: the
+    pixels are also more than radius-thickness away from the center.  Each
+    row of a filled circle is one span, and each row of a ring is at most two.
+
+    Parameter center: The center of the circle
+    Precondition: center is a tuple (row, col) of ints
+
+    Parameter radius: The radius of the circle
+    Precondition: radius is an int >= 0
+
+    Parameter thickness: The width of the ring, or None to fill the circle
+    Precondition: thickness is None or an int > 0
+    """
+    assert type(radius) == int and radius >= 0, repr(radius)+' is not a valid radius'
+    assert thickness is None or (type(thickness) == int and thickness > 0), \
+        repr(thickness)+' is not a valid thickness'
+    row, col = center
+    inner = -1 if thickness is None else radius-thickness
+    result = []
+    for dist in range(-radius,radius+1):
+        outer = math.isqrt(radius*radius-dist*dist)
+        if inner < abs(dist):
+            result.append((row+dist,col-outer,2*outer+1))
+            continue
+        # The pixels within inner of the center are left out
+        hole = math.isqrt(inner*inner-dist*dist)
+        result.append((row+dist,col-outer,outer-hole))
+        result.append((row+dist,col+hole+1,outer-hole))
+    return [span for span in result if span[2] > 0]
+
+
+def polygon(points):
+    """
+    Returns the spans of a filled polygon.
+
+    The polygon has the given points as its corners, in order, and the last
+    point is joined to the first.  A pixel is in the polygon if its center is
+    inside it (by the even-odd rule, so a polygon that crosses itself has
+    holes).  Every pixel is at its point (row, col), so a pixel exactly on
+    the bottom or right edge is left out.  That way polygons that share an
+    edge never both have the pixels along it.
+
+    The polygon is filled one row at a time, by finding where the row
+    crosses the edges.  Each pair of crossings, from the left, is a span.
+
+    Parameter points: The corners of the polygon
+    Precondition: points is a list of at least 3 tuples (row, col) of ints
+    """
+    assert len(points) >= 3, 'a polygon needs 3 corners'
+    edges = []
+    for pos in range(len(points)):
+        (row1, col1), (row2, col2) = points[pos-1], points[pos]
+        if row1 != row2:
+            if row1 > row2:
+                row1, col1, row2, col2 = row2, col2, row1, col1
+            edges.append((row1,row2,col1,(col2-col1)/(row2-row1)))
+
+    result = []
+    top = min(point[0] for point in points)
+    bottom = max(point[0] for point in points)
+    for row in range(top,bottom):
+        cross = sorted(col+(row-first)*slope for (first, last, col, slope) in edges
+                       if first <= row < last)
+        for pos in range(0,len(cross)-1,2):
+            left = math.ceil(cross[pos])
+            right = math.ceil(cross[pos+1])
+            if left < right:
+                result.append((row,left,right-left))
+    return result
+
+
+# HELPER FUNCTIONS
+def _bresenham(start, end):
+    """
+    Returns the pixels of the line from start to end, as a list of points.
+
+    Parameter start: The first end of the line
+    Precondition: start is a tuple (row, col) of ints
+
+    Parameter end: The other end of the line
+    Precondition: end is a tuple (row, col) of ints
+    """
+    row, col = start
+    row2, col2 = end
+    drow = abs(row2-row)
+    dcol = abs(col2-col)
+    srow = 1 if row < row2 else -1
+    scol = 1 if col < col2 else -1
+    error = dcol-drow
+    result = [(row,col)]
+    while row != row2 or col != col2:
+        double = 2*error
+        if double > -drow:
+            error = error-drow
+            col = col+scol
+        if double < dcol:
+            error = error+dcol
+            row = row+srow
+        result.append((row,col))
+    return result
+
+
+def _brush(points, thickness):
+    """
+    Returns the spans of a square brush of the given size at each point.
+
+    The brush is centered on each point (to the top left of the center, if
+    thickness is even).
+
+    Parameter points: The points of the brush
+    Precondition: points is a list of tuples (row, col) of ints
+
+    Parameter thickness: The size of the brush
+    Precondition: thickness is an int > 0
+    """
+    back = thickness//2
+    return [(row+step,col-back,thickness)
+            for (row, col) in points for step in range(-back,thickness-back)]
+
+
+def _merge(spans):
+    """
+    Returns the given spans, with overlapping spans in a row merged into one.
+
+    The result has each row at most once for each separate piece of that row,
+    sorted by row and then by column.
+
+    Parameter spans: The spans to merge
+    Precondition: spans is a list of tuples (row, col, width) of ints
+    """
+    result = []
+    for (row, col, width) in sorted(spans):
+        if result and result[-1][0] == row and col <= result[-1][1]+result[-1][2]:
+            last = result[-1]
+            result[-1] = (row,last[1],max(last[2],col+width-last[1]))
+        else:
+            result.append((row,col,width))
+    return result
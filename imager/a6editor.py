@@ -7,13 +7,28 @@ keeps track of all modifications of an original image.  It allows for
 edit history. The filter functions are in a subclass of this class so that 
 they can take advantage of the edit history.
 
+The history does not keep a full copy of every edit.  It keeps the current
+image, the image before the latest edit, and a record of each older edit: 
+either the method (and arguments) that made it, or the pixels it changed.
+
 Based on an original file by Dexter Kozen (dck10) and Walker White (wmw2)
 
 Author: Walker White (wmw2)
 Date:   October 29, 2019
 """
-# THIS FILE IS COMPLETE.  DO NOT MODIFY THIS FILE AT ALL
+import a6buffer
 import a6image
+from array import array
+from collections import deque
+from itertools import chain, count, islice
+import lzma
+import os
+import queue
+import struct
+import tempfile
+import threading
+import traceback
+import zlib
 
 
 class Editor(object):
@@ -29,21 +44,124 @@ class Editor(object):
     If the number of edits exceeds MAX_HISTORY, the oldest edit will be
     deleted.  
     
+    An edit starts with a call to increment, and then changes the current
+    image in place.  The edit is recorded when the next edit starts.  
+    
+    An edit made with apply (which names a method of this object, such as a 
+    filter) is recorded as that name and its arguments, which takes almost no
+    memory.  A full copy of the image (a checkpoint) is only kept for the first
+    of a series of such edits, and then every CHECKPOINT edits.  Undoing one 
+    of these edits copies the checkpoint before it and repeats the edits after
+    the checkpoint.  Any other edit is recorded as a delta (the pixels it 
+    changed), so a local edit (such as jail) costs only the rows it touched.
+    
+    Some edits can be undone exactly by another edit (for example, a rotation 
+    left by a rotation right).  Subclasses list these in INVERSES.  Such an 
+    edit made with apply does not copy the image at all: it is recorded as its
+    inverse, and undoing it runs the inverse on the current image in place.
+    
+    The names and arguments of the edits (see getLog) are also enough to 
+    repeat a whole session on the original image (see replay).
+    
+    Undone edits can be redone.  Undo keeps the pixels that it changed (as a
+    delta from the image before it), so redo never has to run a filter again,
+    except for an edit in INVERSES, which redo simply runs again in place. If
+    a new edit is made after an undo, the undone edits are not lost: they 
+    become a branch of the history, which can be restored later (see 
+    getBranches and checkout).  A branch only keeps the pixels that differ
+    from the edits before it, and any branches of its own.
+    
+    An editor can also be given a budget: the number of bytes of memory the 
+    older edits may use.  With a budget, a background thread compresses the 
+    pixels of each older edit (with the method named by COMPRESSION), and once
+    the budget is exceeded the oldest compressed edits are moved to files in a
+    temporary directory.  Undo reads them back when it needs them, so this 
+    does not change what the editor does, only where the pixels are kept.
+    The budget does not include the original, current and previous images.
+    
+    The method memoryUsage reports the memory used by the editor, for each 
+    edit and in total, and trim deletes the oldest edits to fit in a given 
+    amount of memory.  This can be used to choose MAX_HISTORY for a machine.
+    
     Attribute MAX_HISTORY: A CLASS ATTRIBUTE for the maximum number of edits
     Invariant: MAX_HISTORY is an int > 0
+    
+    Attribute CHECKPOINT: A CLASS ATTRIBUTE for the number of edits between checkpoints
+    Invariant: CHECKPOINT is an int > 0
+    
+    Attribute COMPRESSION: A CLASS ATTRIBUTE for the compression method
+    Invariant: COMPRESSION is 'zlib' (fast) or 'lzma' (smaller)
+    
+    Attribute INVERSES: A CLASS ATTRIBUTE for the edits that can be undone exactly
+    Invariant: INVERSES is a dict mapping the name of each such edit method to
+    the name of its inverse (which takes the same arguments)
     """
     # IMMUTABLE ATTRIBUTES (Fixed after initialization)
     # Attribute _original: The original image 
     # Invariant: _original is an Image object
     #
-    # Attribute _history: The edit history
-    # Invariant: _history is a non-empty list of Image objects. In addition, 
-    #the length of _history should never be longer than MAX_HISTORY.
+    # Attribute _current: The most recent edit
+    # Invariant: _current is an Image object
+    #
+    # Attribute _base: The image before the most recent edit
+    # Invariant: _base is an Image object or None. It is None if the current
+    # image is not being edited (it is the oldest image, or an edit was undone)
+    #
+    # Attribute _action: The name and arguments of the most recent edit
+    # Invariant: _action is a tuple (name, args) or None. It is None if _base is
+    # None, or if the edit was not made with apply.
+    #
+    # Attribute _history: The older edits, oldest first
+    # Invariant: _history is a deque of _Delta, _Action and _Inverse objects.  The last one
+    # records the edit that made the image before _base (or before _current if 
+    # _base is None), and so on.  The first _Action in any run of _Action 
+    # objects has a checkpoint. The number of images in the history,
+    # 1+len(_history) (plus 1 if _base is not None), is never more than
+    # MAX_HISTORY.
+    #
+    # Attribute _log: The name and arguments of every edit since the original
+    # Invariant: _log is a list of tuples (name, args). The name is None for an
+    # edit not made with apply.
+    #
+    # Attribute _future: The undone edits, which can be redone
+    # Invariant: _future is a list of _Redo objects. The last one redoes the 
+    # most recent undo.
+    #
+    # Attribute _branches: The branches of the history
+    # Invariant: _branches is a list of _Branch objects. Each one starts at an
+    # image on the path from the original to the current image (or through 
+    # the edits in _future).
+    #
+    # Attribute _budget: The bytes of memory the records in _history may use
+    # Invariant: _budget is an int >= 0, or None for no budget
+    #
+    # Attribute _lock: The lock for changing _history (or its records)
+    # Invariant: _lock is a threading.RLock
+    #
+    # Attribute _queue: The records waiting to be compressed
+    # Invariant: _queue is a queue.Queue, or None if the background thread is
+    # not running
+    #
+    # Attribute _worker: The background thread compressing the records
+    # Invariant: _worker is a threading.Thread, or None if _queue is None
+    #
+    # Attribute _folder: The directory for records spilled to disk
+    # Invariant: _folder is a tempfile.TemporaryDirectory, or None if nothing 
+    # has been spilled yet
     
     # The number of edits that we are allowed to keep track of.
     # (THIS GOES IN CLASS FOLDER)
     MAX_HISTORY = 20
     
+    # The number of edits (made with apply) between checkpoints
+    CHECKPOINT = 5
+    
+    # The compression method for edits with a budget
+    COMPRESSION = 'zlib'
+    
+    # The edits that can be undone by another edit (none in this class)
+    INVERSES = {}
+    
     # GETTERS
     def getOriginal(self):
         """
@@ -55,10 +173,61 @@ class Editor(object):
         """
         Returns the most recent edit
         """
-        return self._history[-1]
+        return self._current
+    
+    def getLog(self):
+        """
+        Returns the edits made since the original image, oldest first.
+        
+        Each edit is a tuple (name, args) of a method name and a tuple of its
+        arguments, as given to apply. Edits that were not made with apply have
+        the name None. Undone edits are not included, but edits too old to be 
+        undone are.
+        """
+        return list(self._log)
+    
+    def memoryUsage(self):
+        """
+        Returns a report of the bytes of memory used by this editor.
+        
+        The report is a dict with the following keys:
+            
+            'images':  the bytes used by the original and current images
+            'entries': a list with a tuple (name, bytes) for each edit that 
+                       can be undone, oldest first (name is as in getLog)
+            'names':   a dict mapping each name in entries to its total bytes
+            'redo':    the bytes used by the edits that can be redone, and by
+                       every branch (see getBranches)
+            'total':   the bytes used by all of the above
+        
+        Memory is counted as in Image.nbytes, so it is the real memory used by
+        the Python objects, and anything shared (such as the pixels of a copy) 
+        is counted only once: in the images if they share it, and otherwise in
+        the oldest entry sharing it. A compressed edit only counts its 
+        compressed bytes, and an edit spilled to disk counts almost nothing.
+        """
+        seen = set()
+        with self._lock:
+            images = self._original.nbytes(seen)+self._current.nbytes(seen)
+            end = len(self._log)-(not self._base is None)
+            names = [entry[0] for entry in self._log[end-len(self._history):end]]
+            entries = []
+            for name, record in zip(names,self._history):
+                entries.append((name,record.nbytes(seen)))
+            if not self._base is None:
+                entries.append((self._log[-1][0],self._base.nbytes(seen)))
+            redo = sum(item.nbytes(seen) for item in self._future)
+            redo = redo+sum(branch.nbytes(seen) for branch in self._branches)
+        
+        totals = {}
+        for name, size in entries:
+            totals[name] = totals.get(name,0)+size
+        total = images+sum(totals.values())+redo
+        return {'images': images, 'entries': entries, 'names': totals, 
+                'redo': redo, 'total': total}
     
     # INITIALIZER
-    def __init__(self,original):
+    def __init__(self,original,budget=None):
         """
         Initializes an edit history for the given image.
         
@@ -67,10 +236,21 @@ class Editor(object):
         
         Parameter original: The image to edit
         Precondition: original is an Image object
+        
+        Parameter budget: The bytes of memory the older edits may use
+        Precondition: budget is an int >= 0, or None for no budget
         """
         assert isinstance(original,a6image.Image), repr(original)+' is not an image'
+        assert budget is None or (isinstance(budget,int) and budget >= 0), \
+            repr(budget)+' is not a valid budget'
         self._original = original
-        self._history  = [original.copy()]
+        self._budget = budget
+        self._lock = threading.RLock()
+        self._queue = None
+        self._worker = None
+        self._folder = None
+        self._history = deque()
+        self.clear()
     
     # EDIT METHODS
     def undo(self):
@@ -82,10 +262,115 @@ class Editor(object):
         be empty.  If this method is called on an edit history of one element,
         this method returns False instead.
         """
-        if len(self._history) > 1:
-            self._history.pop()
-            return True
-        return False
+        if not self._base is None:
+            redo = _Redo(_Delta(self._current,self._base),None,self._action)
+            self._current = self._base
+            self._base = None
+            self._action = None
+        elif len(self._history) == 0:
+            return False
+        elif isinstance(self._history[-1],_Inverse):
+            record = self._discard(self._history.pop)
+            getattr(self,record.inverse)(*record.args)
+            redo = _Redo(None,record,None)
+        elif isinstance(self._history[-1],_Action):
+            image = self._rebuild(len(self._history)-1)
+            record = self._discard(self._history.pop)
+            redo = _Redo(_Delta(self._current,image),record,None)
+            self._current = image
+        else:
+            before = self._current.copy()
+            record = self._discard(self._history.pop)
+            self._current = record.apply(self._current)
+            redo = _Redo(_Delta(before,self._current),record,None)
+        redo.entry = self._log.pop()
+        self._future.append(redo)
+        return True
+    
+    def redo(self):
+        """
+        Returns True if the latest undo can be redone, False otherwise.
+        
+        This method restores the image from before the latest undo, without 
+        running the edit again (unless it is in INVERSES).  Undone edits can 
+        be redone until a new edit is made.
+        
+        The edits before an undone action may have been deleted since (see 
+        trim), so an action that can no longer be rebuilt from the history
+        gets the current image as its checkpoint.  The record goes back to 
+        the background thread to be compressed, just like a new edit.
+        """
+        if len(self._future) == 0:
+            return False
+        
+        redo = self._future.pop()
+        record = redo.record
+        if isinstance(record,_Action) and not record.hasCheckpoint():
+            if len(self._history) == 0 or not isinstance(self._history[-1],_Action):
+                record.setPayload(self._current.copy())
+        if record is None:
+            self._base = self._current
+            self._current = redo.forward.apply(self._current.copy())
+            self._action = redo.action
+        elif redo.forward is None:
+            getattr(self,record.name)(*record.args)
+        else:
+            self._current = redo.forward.apply(self._current)
+        if not record is None:
+            record.alive = True
+            with self._lock:
+                self._history.append(record)
+            self._compress(record)
+        self._log.append(redo.entry)
+        self._limit()
+        return True
+    
+    def getBranches(self):
+        """
+        Returns the branches of the edit history.
+        
+        A branch is a series of edits that were undone and then replaced by a
+        new edit.  Each branch is described by a tuple (depth, names), where 
+        depth is the number of edits (since the original) before the branch 
+        starts, and names is the list of the names of its edits (None for an 
+        edit not made with apply).  The position of a branch in this list is
+        what you give to checkout.
+        """
+        return [(branch.depth,[redo.entry[0] for redo in reversed(branch.future)])
+                for branch in self._branches]
+    
+    def checkout(self, index):
+        """
+        Returns True if the editor switched to the given branch, False otherwise.
+        
+        This method undoes edits until it reaches the start of the branch, and 
+        then redoes every edit in the branch.  The edits that were undone (and 
+        any that could have been redone) become a new branch, so nothing is 
+        lost. The branch that was restored is no longer a branch, and the other
+        branches may be renumbered.
+        
+        This method returns False (and does nothing) if the start of the 
+        branch is too old to be reached by undo.
+        
+        Parameter index: The position of the branch
+        Precondition: index is a valid position in the list from getBranches
+        """
+        branch = self._branches[index]
+        while len(self._log) < branch.depth and self.redo():
+            pass
+        undoable = len(self._history)+(not self._base is None)
+        if len(self._log)-branch.depth > undoable:
+            return False
+        while len(self._log) > branch.depth:
+            self.undo()
+        
+        self._branches.remove(branch)
+        self._stash()
+        self._future = branch.future
+        self._branches.extend(branch.children)
+        while self.redo():
+            pass
+        return True
     
     def clear(self):
         """
@@ -94,7 +379,14 @@ class Editor(object):
         When this method completes, the object should have the same values that 
         it did once it was first initialized.
         """
-        self._history = [self._original.copy()]
+        self._current = self._original.copy()
+        self._base = None
+        self._action = None
+        while len(self._history) > 0:
+            self._discard(self._history.pop)
+        self._log = []
+        self._future = []
+        self._branches = []
     
     def increment(self):
         """
@@ -103,8 +395,1000 @@ class Editor(object):
         This method copies the current most recent edit and adds it to the 
         end of the history.  If this causes the history to grow to larger 
         (greater than MAX_HISTORY), this method deletes the oldest edit.
+        
+        The edit before the current one is finished, so it is recorded as an
+        action or a delta.
+        """
+        self._stash()
+        self._finish()
+        self._base = self._current.copy()
+        self._log.append((None,()))
+        self._limit()
+    
+    def apply(self, name, *args):
+        """
+        Returns the result of the edit method name, called as a new edit.
+        
+        This method calls increment and then the method with the given name 
+        and arguments.  For example, apply('monochromify',True) is the same as
+        
+            increment()
+            monochromify(True)
+        
+        except that the edit is recorded as an action, which can be repeated 
+        later (see replay).  So the method must always do the same thing for
+        the same image and arguments.
+        
+        If the method is in INVERSES, the image is not copied at all.  The 
+        edit is recorded as its inverse, and the method changes the current 
+        image in place.
+        
+        Parameter name: The name of the edit method
+        Precondition: name is a string naming a method of this object
+        
+        Parameter args: The arguments of the edit method
+        Precondition: args are valid arguments for that method
+        """
+        assert callable(getattr(self,name,None)), repr(name)+' is not a method'
+        if name in self.INVERSES:
+            self._stash()
+            self._finish()
+            with self._lock:
+                self._history.append(_Inverse(name,args,self.INVERSES[name]))
+            self._log.append((name,args))
+            self._limit()
+        else:
+            self.increment()
+            self._action = (name,args)
+            self._log[-1] = self._action
+        return getattr(self,name)(*args)
+    
+    def replay(self, log):
+        """
+        Repeats the given edits, starting over from the original image.
+        
+        This method clears the edit history and then applies every edit in 
+        log, in order. The log is a list as returned by getLog.
+        
+        Parameter log: The edits to repeat
+        Precondition: log is a list of tuples (name, args), where each name is 
+        a string naming a method of this object (and not None)
+        """
+        self.clear()
+        for name, args in log:
+            assert not name is None, 'the log has an edit that cannot be repeated'
+            self.apply(name,*args)
+    
+    def flush(self):
+        """
+        Waits until the background thread has compressed every older edit.
+        
+        This method returns at once if the editor does not have a budget.
+        """
+        if not self._queue is None:
+            self._queue.join()
+            self._trim()
+    
+    def close(self):
+        """
+        Stops the background thread, once it has compressed every older edit.
+        
+        This should be called when the editor is no longer needed, as the 
+        thread would otherwise run until the program ends.  The editor can 
+        still be used; the thread is started again when it is needed.
+        """
+        if not self._queue is None:
+            self._queue.put(None)
+            self._worker.join()
+            self._queue = None
+            self._worker = None
+    
+    def trim(self, size):
+        """
+        Returns the bytes of memory used, after deleting edits to fit in size.
+        
+        This method deletes the oldest edits (so they can no longer be undone)
+        until the total in memoryUsage is at most size, or until there is no 
+        edit left to delete.  The edits that can be redone, and the branches, 
+        are never deleted.
+        
+        Deleting the oldest action may give the next one a checkpoint (see 
+        increment), which is included in the result.  So may deleting the last
+        edit before one that can be redone.
+        
+        Parameter size: The bytes of memory the editor may use
+        Precondition: size is an int >= 0
+        """
+        assert isinstance(size,int) and size >= 0, repr(size)+' is not a valid size'
+        usage = self.memoryUsage()
+        total = usage['total']
+        sizes = deque(entry[1] for entry in usage['entries'])
+        while total > size and len(sizes) > 0:
+            total = total-sizes.popleft()
+            if len(self._history) == 0:
+                self._base = None
+                self._action = None
+                continue
+            
+            after = self._history[1] if len(self._history) > 1 else None
+            checkpoint = isinstance(after,_Action) and after.hasCheckpoint()
+            redo = self._future[-1].record if len(self._future) > 0 else None
+            ready = not isinstance(redo,_Action) or redo.hasCheckpoint()
+            self._evict()
+            if isinstance(after,_Action) and not checkpoint:
+                with self._lock:
+                    extra = after.nbytes()
+                total = total+extra
+                sizes[0] = sizes[0]+extra
+            elif not ready and redo.hasCheckpoint():
+                # The checkpoint mostly shares its pixels with the current image
+                total = self.memoryUsage()['total']
+        return total
+    
+    # HELPER METHODS
+    def _finish(self):
+        """
+        Records the most recent edit, if it is still being made.
+        
+        When this method is done, there is no image before the most recent 
+        edit (_base is None), as that edit is in the history.
+        """
+        if not self._base is None:
+            record = self._record()
+            with self._lock:
+                self._history.append(record)
+            self._compress(record)
+        self._base = None
+        self._action = None
+    
+    def _stash(self):
+        """
+        Turns the edits that can be redone into a branch.
+        
+        Any branch that starts in those edits becomes a branch of the new 
+        branch. This method does nothing if there is nothing to redo.
+        """
+        if len(self._future) == 0:
+            return
+        depth = len(self._log)
+        children = [branch for branch in self._branches if branch.depth > depth]
+        self._branches = [branch for branch in self._branches if branch.depth <= depth]
+        self._branches.append(_Branch(depth,self._future,children))
+        self._future = []
+    
+    def _limit(self):
+        """
+        Deletes the oldest edits until the history fits in MAX_HISTORY and the budget.
+        """
+        while 1+len(self._history)+(not self._base is None) > self.MAX_HISTORY:
+            if len(self._history) > 0:
+                self._evict()
+            else:
+                self._base = None
+        self._trim()
+    
+    def _record(self):
+        """
+        Returns the record of the most recent edit, which is now finished.
+        
+        The record is an _Action if the edit was made with apply, and a _Delta
+        otherwise.  An action gets a checkpoint (the image before it) if it is 
+        the first action in a run, or if it is CHECKPOINT actions after the 
+        last checkpoint.
+        """
+        if self._action is None:
+            return _Delta(self._base,self._current)
+        
+        result = _Action(self._action[0],self._action[1])
+        count = 0
+        for record in reversed(self._history):
+            if not isinstance(record,_Action):
+                break
+            count = count+1
+            if record.hasCheckpoint():
+                break
+        if count == 0 or count >= self.CHECKPOINT:
+            result.setPayload(self._base)
+        return result
+    
+    def _rebuild(self, index):
+        """
+        Returns the image before the action at position index of the history.
+        
+        This method copies the nearest checkpoint (at or before index) and 
+        repeats the actions from that checkpoint up to index.
+        
+        Parameter index: The position of the action
+        Precondition: index is a valid position in _history of an _Action
+        """
+        start = index
+        while not self._history[start].hasCheckpoint():
+            start = start-1
+        actions = list(islice(self._history,start,index))
+        return self._replay(self._history[start].getPayload(),actions)
+    
+    def _replay(self, image, actions):
+        """
+        Returns the result of repeating actions on a copy of image.
+        
+        The actions are repeated by a new editor of the same class as this one,
+        so they do not change this edit history.
+        
+        Parameter image: The image to start from
+        Precondition: image is an Image object
+        
+        Parameter actions: The actions to repeat
+        Precondition: actions is a list of _Action objects
+        """
+        editor = type(self)(image)
+        for action in actions:
+            getattr(editor,action.name)(*action.args)
+        return editor.getCurrent()
+    
+    def _evict(self):
+        """
+        Deletes the oldest record in the history.
+        
+        If the next record is an action without a checkpoint, it gets one 
+        (made by repeating the deleted action), since it is now the first 
+        action of its run.  If the history is now empty, the next record is
+        the first one that can be redone, and its checkpoint is the current 
+        image.
+        """
+        record = self._discard(self._history.popleft)
+        if len(self._history) > 0 and isinstance(record,_Action):
+            after = self._history[0]
+            if isinstance(after,_Action) and not after.hasCheckpoint():
+                after.setPayload(self._replay(record.getPayload(),[record]))
+                self._compress(after)
+        elif len(self._history) == 0 and len(self._future) > 0:
+            after = self._future[-1].record
+            if isinstance(after,_Action) and not after.hasCheckpoint():
+                after.setPayload(self._current.copy())
+    
+    def _discard(self, pop):
+        """
+        Returns a record removed from the history, after discarding it.
+        
+        The record is removed by calling pop (while holding the lock), so that 
+        the background thread never compresses a record as it is removed. 
+        
+        Parameter pop: The method removing the record
+        Precondition: pop is the pop or popleft method of _history
+        """
+        with self._lock:
+            record = pop()
+            record.discard()
+        return record
+    
+    def _compress(self, record):
+        """
+        Asks the background thread to compress the given record.
+        
+        This method does nothing if the editor does not have a budget, or if
+        the record has no payload.  The payload is encoded here (see encode), 
+        so the thread never reads it.  The thread is started the first time 
+        it is needed.
+        
+        Parameter record: The record to compress
+        Precondition: record is a _Record object in the history
+        """
+        if self._budget is None:
+            return
+        data = record.encode()
+        if data is None:
+            return
+        if self._queue is None:
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=_compress_records,
+                                            args=(self._queue,self._lock,self.COMPRESSION),
+                                            daemon=True)
+            self._worker.start()
+        self._queue.put((record,data))
+    
+    def _trim(self):
+        """
+        Spills the oldest records to disk until the history fits in the budget.
+        
+        Only compressed records are spilled, so a record waiting for the 
+        background thread stays in memory until the next call.
+        """
+        if self._budget is None:
+            return
+        with self._lock:
+            total = sum(record.getSize() for record in self._history)
+            for record in self._history:
+                if total <= self._budget:
+                    break
+                if not record.blob is None:
+                    if self._folder is None:
+                        self._folder = tempfile.TemporaryDirectory(prefix='a6history')
+                    total = total-record.getSize()
+                    record.spill(os.path.join(self._folder.name,str(next(_names))))
+
+
+class _Redo(object):
+    """
+    A record of an undone edit, which can be redone.
+    
+    This is a simple record, so its attributes are not hidden.
+    """
+    # Attribute forward: The delta turning the image after the undo back into
+    # the image before it
+    # Invariant: forward is a _Delta, or None if record is an _Inverse
+    #
+    # Attribute record: The history record removed by the undo
+    # Invariant: record is a _Record, or None if the edit was still being made
+    #
+    # Attribute action: The name and arguments of an edit still being made
+    # Invariant: action is a tuple (name, args) or None
+    #
+    # Attribute entry: The entry for the edit in the log (see getLog)
+    # Invariant: entry is a tuple (name, args)
+    
+    def __init__(self, forward, record, action):
+        """
+        Initializes a record of an undone edit, with no log entry.
+        
+        Parameter forward: The delta redoing the edit
+        Precondition: forward is a _Delta, or None if record is an _Inverse
+        
+        Parameter record: The history record removed by the undo
+        Precondition: record is a _Record or None
+        
+        Parameter action: The name and arguments of an edit still being made
+        Precondition: action is a tuple (name, args) or None
+        """
+        self.forward = forward
+        self.record = record
+        self.action = action
+        self.entry = None
+    
+    def nbytes(self, seen):
+        """
+        Returns the number of bytes of memory used by this record.
+        
+        Parameter seen: The ids of the objects already counted
+        Precondition: seen is a set of ints (see a6buffer.sizeof)
+        """
+        result = a6buffer.sizeof([self,self.__dict__,self.entry],seen)
+        for record in [self.forward,self.record]:
+            if not record is None:
+                result = result+record.nbytes(seen)
+        return result
+
+
+class _Branch(object):
+    """
+    A branch of an edit history: a series of undone edits.
+    
+    This is a simple record, so its attributes are not hidden.
+    """
+    # Attribute depth: The number of edits (since the original) before the branch
+    # Invariant: depth is an int >= 0
+    #
+    # Attribute future: The edits of the branch, as they would be redone
+    # Invariant: future is a list of _Redo objects, the last one redone first
+    #
+    # Attribute children: The branches that start in this branch
+    # Invariant: children is a list of _Branch objects
+    
+    def __init__(self, depth, future, children):
+        """
+        Initializes a branch.
+        
+        Parameter depth: The number of edits before the branch
+        Precondition: depth is an int >= 0
+        
+        Parameter future: The edits of the branch
+        Precondition: future is a list of _Redo objects
+        
+        Parameter children: The branches that start in this branch
+        Precondition: children is a list of _Branch objects
+        """
+        self.depth = depth
+        self.future = future
+        self.children = children
+    
+    def nbytes(self, seen):
+        """
+        Returns the number of bytes of memory used by this branch.
+        
+        This includes the branches that start in this one.
+        
+        Parameter seen: The ids of the objects already counted
+        Precondition: seen is a set of ints (see a6buffer.sizeof)
+        """
+        result = a6buffer.sizeof([self,self.__dict__,self.future,self.children],seen)
+        result = result+sum(redo.nbytes(seen) for redo in self.future)
+        return result+sum(branch.nbytes(seen) for branch in self.children)
+
+
+class _Record(object):
+    """
+    The base class for the records in an edit history.
+    
+    A record may hold pixels (its payload), such as the image before an edit.
+    To save memory, the payload can be compressed (see pack and store), and 
+    the compressed bytes can be moved to a file (see spill).  The method 
+    getPayload always returns the original payload, decompressing it if 
+    necessary, so the rest of the editor never has to know where it is.
+    
+    The payload is compressed by one thread while another reads it.  The 
+    thread reading it is the only one that touches the payload itself (even
+    reading an image can change how it is stored), so it turns the payload
+    into bytes (see encode) and the other thread only compresses those bytes.
+    Storing the result is safe because only where the data is kept changes.
+    Each step puts the data in its new place before removing it from the old
+    one, and getPayload looks in the same order.
+    
+    This is a simple record, so its attributes are not hidden.  Subclasses 
+    must implement _encode and _decode to turn the payload into bytes and back.
+    """
+    # Attribute payload: The pixels of this record, if they are not compressed
+    # Invariant: payload is None, or whatever the subclass stores
+    #
+    # Attribute blob: The compressed payload, if it is in memory
+    # Invariant: blob is a bytes object or None
+    #
+    # Attribute file: The file with the compressed payload, if it was spilled
+    # Invariant: file is a string (a path) or None
+    #
+    # Attribute codec: The name of the compression method
+    # Invariant: codec is a key of _CODECS, or None if nothing is compressed
+    #
+    # Attribute alive: Whether the record is still in an edit history
+    # Invariant: alive is a bool
+    #
+    # Attribute size: The number of bytes of the payload as bytes (see _encode)
+    # Invariant: size is an int >= 0, and 0 if payload is None
+    
+    def __init__(self, payload):
+        """
+        Initializes a record with an uncompressed payload.
+        
+        Parameter payload: The pixels of this record
+        Precondition: payload is None, or whatever the subclass stores
+        """
+        self.blob = None
+        self.file = None
+        self.codec = None
+        self.alive = True
+        self.setPayload(payload)
+    
+    def setPayload(self, payload):
+        """
+        Sets the uncompressed payload of this record, and measures it.
+        
+        The size of the payload as bytes is found without encoding it (see 
+        _measure), so that checking the budget is cheap.
+        
+        Parameter payload: The pixels of this record
+        Precondition: payload is None, or whatever the subclass stores
+        """
+        self.size = 0 if payload is None else self._measure(payload)
+        self.payload = payload
+    
+    def getPayload(self):
+        """
+        Returns the payload of this record, decompressing it if necessary.
+        
+        A decompressed payload is not kept (the record stays compressed), so 
+        each call returns a new copy of it.
+        """
+        payload = self.payload
+        if not payload is None:
+            return payload
+        blob = self.blob
+        if blob is None and not self.file is None:
+            with open(self.file,'rb') as handle:
+                blob = handle.read()
+        if blob is None:
+            return None
+        return self._decode(_CODECS[self.codec][1](blob))
+    
+    def getSize(self):
+        """
+        Returns the number of bytes of memory used by the payload.
+        
+        This is 0 for a payload that was spilled to a file.
+        """
+        if not self.file is None:
+            return 0
+        elif not self.blob is None:
+            return len(self.blob)
+        return self.size
+    
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this record.
+        
+        Unlike getSize, which is the size of the payload as bytes, this is the
+        real memory used by the record and its payload (see Image.nbytes).
+        
+        Parameter seen: The ids of the objects already counted
+        Precondition: seen is a set of ints (see a6buffer.sizeof), or None
+        """
+        seen = set() if seen is None else seen
+        result = a6buffer.sizeof([self,self.__dict__,self.blob],seen)
+        if isinstance(self.payload,a6image.Image):
+            return result+self.payload.nbytes(seen)
+        return result+a6buffer.sizeof([self.payload],seen)
+    
+    def encode(self):
+        """
+        Returns the uncompressed payload as bytes, or None if there is not one.
+        
+        This method does not change the record, but it reads the payload, so 
+        it must be called by the thread that owns the editor.
+        """
+        payload = self.payload
+        if payload is None:
+            return None
+        return self._encode(payload)
+    
+    def pack(self, codec, data=None):
+        """
+        Returns the compressed payload, or None if there is nothing to compress.
+        
+        If data is given, only data is compressed and the payload is never 
+        read, so any thread can call this method.  It does not change the 
+        record (see store).
+        
+        Parameter codec: The name of the compression method
+        Precondition: codec is a key of _CODECS
+        
+        Parameter data: The payload as bytes, or None to encode it now
+        Precondition: data is None or the result of encode
+        """
+        data = self.encode() if data is None else data
+        if data is None:
+            return None
+        return _CODECS[codec][0](data)
+    
+    def store(self, blob, codec):
+        """
+        Replaces the payload with its compressed bytes.
+        
+        Parameter blob: The compressed payload
+        Precondition: blob is the result of pack(codec)
+        
+        Parameter codec: The name of the compression method
+        Precondition: codec is a key of _CODECS
+        """
+        self.codec = codec
+        self.blob = blob
+        self.payload = None
+    
+    def spill(self, file):
+        """
+        Moves the compressed payload to the given file.
+        
+        Parameter file: The file to write
+        Precondition: file is a path to a new file, and the payload is compressed
+        """
+        with open(file,'wb') as handle:
+            handle.write(self.blob)
+        self.file = file
+        self.blob = None
+    
+    def discard(self):
+        """
+        Marks this record as no longer in a history, deleting any spilled file.
+        
+        A spilled payload is read back into memory first, so the record can 
+        still be used (for example, to undo it).
+        """
+        self.alive = False
+        if not self.file is None:
+            with open(self.file,'rb') as handle:
+                self.blob = handle.read()
+            os.remove(self.file)
+            self.file = None
+    
+    def _encode(self, payload):
+        """
+        Returns the payload as bytes.
+        
+        Parameter payload: The payload to encode
+        Precondition: payload is not None
+        """
+        raise NotImplementedError('_encode is not implemented')
+    
+    def _decode(self, data):
+        """
+        Returns the payload for the given bytes.
+        
+        Parameter data: The bytes from _encode
+        Precondition: data is a bytes object
+        """
+        raise NotImplementedError('_decode is not implemented')
+    
+    def _measure(self, payload):
+        """
+        Returns the number of bytes that _encode would return for the payload.
+        
+        Parameter payload: The payload to measure
+        Precondition: payload is not None
+        """
+        raise NotImplementedError('_measure is not implemented')
+
+
+class _Action(_Record):
+    """
+    A record of an edit made by calling a method of the editor.
+    
+    The payload is the image before the edit (a checkpoint), if it was kept.
+    
+    This is a simple record, so its attributes are not hidden.
+    """
+    # Attribute name: The name of the edit method
+    # Invariant: name is a string
+    #
+    # Attribute args: The arguments of the edit method
+    # Invariant: args is a tuple
+    
+    def __init__(self, name, args):
+        """
+        Initializes an action with no checkpoint.
+        
+        Parameter name: The name of the edit method
+        Precondition: name is a string
+        
+        Parameter args: The arguments of the edit method
+        Precondition: args is a tuple
+        """
+        _Record.__init__(self,None)
+        self.name = name
+        self.args = args
+    
+    def hasCheckpoint(self):
+        """
+        Returns True if this action has a checkpoint (in any form).
+        """
+        return not (self.payload is None and self.blob is None and self.file is None)
+    
+    def _encode(self, payload):
+        """
+        Returns the checkpoint as bytes.
+        
+        Parameter payload: The checkpoint
+        Precondition: payload is an Image object
+        """
+        return _dump_image(payload)
+    
+    def _measure(self, payload):
+        """
+        Returns the number of bytes of the checkpoint as bytes.
+        
+        Parameter payload: The checkpoint
+        Precondition: payload is an Image object
+        """
+        return _WIDTH.size+3*len(payload)
+    
+    def _decode(self, data):
+        """
+        Returns the checkpoint for the given bytes.
+        
+        Parameter data: The bytes from _encode
+        Precondition: data is a bytes object
+        """
+        return _load_image(data)
+
+
+class _Inverse(_Record):
+    """
+    A record of an edit that is undone by another edit.
+    
+    The record has no payload, since undoing the edit does not need any pixels.
+    
+    This is a simple record, so its attributes are not hidden.
+    """
+    # Attribute name: The name of the edit method
+    # Invariant: name is a string
+    #
+    # Attribute args: The arguments of the edit method (and of its inverse)
+    # Invariant: args is a tuple
+    #
+    # Attribute inverse: The name of the method undoing the edit
+    # Invariant: inverse is a string
+    
+    def __init__(self, name, args, inverse):
+        """
+        Initializes a record of an invertible edit.
+        
+        Parameter name: The name of the edit method
+        Precondition: name is a string
+        
+        Parameter args: The arguments of the edit method
+        Precondition: args is a tuple
+        
+        Parameter inverse: The name of the method undoing the edit
+        Precondition: inverse is a string
         """
-        self._history.append(self.getCurrent().copy())
-        if len(self._history) > self.MAX_HISTORY:
-            self._history.pop(0)
+        _Record.__init__(self,None)
+        self.name = name
+        self.args = args
+        self.inverse = inverse
+
 
+class _Delta(_Record):
+    """
+    A record of how to turn an image back into the image before an edit.
+    
+    Most edits only change some of the pixels, so the delta keeps the old
+    pixels of each span of a row that changed. Spans closer than BLOCK pixels
+    are kept as one span.  If an edit changed most of the image (or its size),
+    it is cheaper to keep the old image itself.
+    
+    The payload is either a list of spans or the old image.  A span is a tuple
+    (pos, data), where pos is the position of the first pixel and data is the 
+    packed bytes of the pixels (which all lie in one row).
+    
+    This is a simple record, so its attributes are not hidden.
+    """
+    # Attribute width: The width of the old image
+    # Invariant: width is an int >= 0
+    
+    # The smallest number of pixels searched for changes
+    BLOCK = 16
+    
+    def __init__(self, before, after):
+        """
+        Initializes a delta turning after back into before.
+        
+        Parameter before: The image before the edit
+        Precondition: before is an Image object
+        
+        Parameter after: The image after the edit
+        Precondition: after is an Image object
+        """
+        _Record.__init__(self,before)
+        self.width = before.getWidth()
+        if len(before) != len(after) or len(before) == 0:
+            return
+        
+        old = before.tobytes()
+        new = after.tobytes()
+        spans = []
+        size = 0
+        step = 3*self.width
+        if old != new:
+            for pos in range(0,len(old),step):
+                line1 = old[pos:pos+step]
+                line2 = new[pos:pos+step]
+                if line1 != line2:
+                    for left, right in _changes(line1,line2,self.BLOCK):
+                        spans.append(((pos//3)+left,line1[3*left:3*right]))
+                        size = size+3*(right-left)
+                    if 2*size > len(old):
+                        return
+        self.setPayload(spans)
+    
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this delta.
+        
+        For a list of spans, this counts each span and its bytes.
+        
+        Parameter seen: The ids of the objects already counted
+        Precondition: seen is a set of ints (see a6buffer.sizeof), or None
+        """
+        seen = set() if seen is None else seen
+        result = _Record.nbytes(self,seen)
+        payload = self.payload
+        if isinstance(payload,list):
+            result = result+a6buffer.sizeof(chain(payload,chain.from_iterable(payload)),seen)
+        return result
+    
+    def apply(self, image):
+        """
+        Returns the old image, made by undoing the edit to image.
+        
+        The result may be image itself, changed in place. It never shares 
+        anything with this delta that it could change, so the delta can be 
+        applied again.
+        
+        Parameter image: The image after the edit
+        Precondition: image is an Image object equal to the one after the edit
+        """
+        payload = self.getPayload()
+        if isinstance(payload,a6image.Image):
+            return payload.copy()
+        
+        if image.getWidth() != self.width:
+            image.setWidth(self.width)
+        for pos, data in payload:
+            row, col = divmod(pos,self.width)
+            pixels = list(zip(data[0::3],data[1::3],data[2::3]))
+            image.setRegion(row,col,1,len(pixels),pixels)
+        return image
+    
+    def _encode(self, payload):
+        """
+        Returns the spans or the old image as bytes.
+        
+        Parameter payload: The spans or image
+        Precondition: payload is a list of spans or an Image object
+        """
+        if isinstance(payload,a6image.Image):
+            return b'I'+_dump_image(payload)
+        places = array('Q',[pos for pos, data in payload])
+        sizes  = array('Q',[len(data) for pos, data in payload])
+        head = _SPANS.pack(b'S',len(payload))
+        return b''.join([head,places.tobytes(),sizes.tobytes()]+[data for pos, data in payload])
+    
+    def _decode(self, data):
+        """
+        Returns the spans or the old image for the given bytes.
+        
+        Parameter data: The bytes from _encode
+        Precondition: data is a bytes object
+        """
+        if data[:1] == b'I':
+            return _load_image(data[1:])
+        count = _SPANS.unpack_from(data)[1]
+        places = array('Q')
+        sizes  = array('Q')
+        start = _SPANS.size
+        places.frombytes(data[start:start+8*count])
+        sizes.frombytes(data[start+8*count:start+16*count])
+        start = start+16*count
+        result = []
+        for pos, size in zip(places,sizes):
+            result.append((pos,data[start:start+size]))
+            start = start+size
+        return result
+    
+    def _measure(self, payload):
+        """
+        Returns the number of bytes of the spans or the old image as bytes.
+        
+        Parameter payload: The spans or image
+        Precondition: payload is a list of spans or an Image object
+        """
+        if isinstance(payload,a6image.Image):
+            return 1+_WIDTH.size+3*len(payload)
+        return _SPANS.size+16*len(payload)+sum(len(data) for pos, data in payload)
+
+
+# The names of the files for spilled records
+_names = count(1)
+
+# The compression methods for history records: the functions to compress
+# and to decompress
+_CODECS = {'zlib': (lambda data: zlib.compress(data,1), zlib.decompress),
+           'lzma': (lzma.compress, lzma.decompress)}
+
+# The header of the encoded spans of a delta: a tag and the number of spans
+_SPANS = struct.Struct('<cQ')
+
+# The header of an encoded image: the width
+_WIDTH = struct.Struct('<Q')
+
+
+# HELPER FUNCTIONS
+def _compress_records(records, lock, codec):
+    """
+    Compresses the records put in the given queue, until it gets None.
+    
+    This is the function run by the background thread of an editor.  Each
+    record comes with its payload as bytes (see _Record.encode), which are 
+    compressed without holding the lock, and the result is only stored 
+    (holding the lock) if the record is still in the history.
+    
+    Parameter records: The records to compress
+    Precondition: records is a queue.Queue of tuples (record, data) of a
+    _Record object and its payload as bytes, and then None (see Editor.close)
+    
+    Parameter lock: The lock of the edit history
+    Precondition: lock is a threading.RLock
+    
+    Parameter codec: The name of the compression method
+    Precondition: codec is a key of _CODECS
+    """
+    while True:
+        item = records.get()
+        if item is None:
+            records.task_done()
+            return
+        record, data = item
+        try:
+            if record.alive and record.blob is None and record.file is None:
+                blob = record.pack(codec,data)
+                with lock:
+                    if record.alive and not blob is None:
+                        record.store(blob,codec)
+        except:
+            traceback.print_exc()
+        records.task_done()
+
+
+def _dump_image(image):
+    """
+    Returns the given image as bytes (its width and then its pixels).
+    
+    Parameter image: The image to encode
+    Precondition: image is an Image object
+    """
+    return _WIDTH.pack(image.getWidth())+image.tobytes()
+
+
+def _load_image(data):
+    """
+    Returns the image for the given bytes.
+    
+    The image is stored in a a6buffer.PackedBuffer.
+    
+    Parameter data: The bytes from _dump_image
+    Precondition: data is a bytes object
+    """
+    width = _WIDTH.unpack_from(data)[0]
+    pixels = bytearray(data[_WIDTH.size:])
+    if width == 0:
+        return a6image.Image([],1)
+    return a6image.frombytes(width,len(pixels)//(3*width),pixels)
+
+
+def _changes(data1, data2, block):
+    """
+    Returns the spans of pixels where data1 and data2 differ.
+
+    Each span is a tuple (left, right) of the first pixel that changed and the
+    pixel after the last one, in order.  The search splits the data in halves,
+    skipping any half that did not change, down to block pixels.  Spans that
+    are less than block pixels apart are joined.
+
+    Parameter data1: The first packed pixels
+    Precondition: data1 is a bytes object whose length is divisible by 3
+
+    Parameter data2: The second packed pixels
+    Precondition: data2 is a bytes object of the same length as data1
+
+    Parameter block: The smallest number of pixels to split
+    Precondition: block is an int > 0
+    """
+    result = []
+    todo = [(0,len(data1)//3)]
+    while len(todo) > 0:
+        left, right = todo.pop()
+        part1 = data1[3*left:3*right]
+        part2 = data2[3*left:3*right]
+        if part1 == part2:
+            pass
+        elif right-left > block:
+            middle = (left+right)//2
+            todo.append((middle,right))
+            todo.append((left,middle))
+        else:
+            start = left+_common(part1,part2)//3
+            stop  = right-_common(part1[::-1],part2[::-1])//3
+            if len(result) > 0 and start-result[-1][1] < block:
+                result[-1] = (result[-1][0],stop)
+            else:
+                result.append((start,stop))
+    return result
+
+
+def _common(data1, data2):
+    """
+    Returns the length of the longest common prefix of data1 and data2.
+    
+    This uses a binary search, comparing slices (which is done in C), rather
+    than comparing the bytes one at a time.
+    
+    Parameter data1: The first bytes
+    Precondition: data1 is a bytes object
+    
+    Parameter data2: The second bytes
+    Precondition: data2 is a bytes object of the same length as data1
+    """
+    low  = 0
+    high = len(data1)
+    while low < high:
+        mid = (low+high+1)//2
+        if data1[:mid] == data2[:mid]:
+            low = mid
+        else:
+            high = mid-1
+    return low
@@ -15,7 +15,18 @@ Based on an original file by Dexter Kozen (dck10) and Walker White (wmw2)
 Aaron Baruch (amb565) Ilan Klimberg (idk7)
 11/15/2022
 """
+import a6area
 import a6editor
+import a6draw
+import a6lut
+from array import array
+import functools
+from itertools import chain
+
+try:
+    import numpy
+except ImportError:     # NumPy is optional
+    numpy = None
 
 
 class Filter(a6editor.Editor):
@@ -34,93 +45,92 @@ class Filter(a6editor.Editor):
     
     Each one of the non-hidden functions should edit the most recent image 
     in the edit history (which is inherited from Editor).
+    
+    When NumPy is installed and the current image can be viewed as an array 
+    (see the method asarray in Image), some of these methods process the 
+    whole array at once instead of looping over the pixels. The result is 
+    the same either way.  The pointwise filters (invert and monochromify) 
+    use lookup tables instead (see a6lut), for any kind of image.
+    
+    The edits that can be undone exactly by another edit are listed in 
+    INVERSES (see Editor), so undoing them never needs a copy of the image.
+    
+    The drawing methods (drawRect, drawLine, drawPolyline, drawCircle and 
+    drawPolygon) turn a shape into spans of pixels (see a6draw), and fill each
+    span as a single slice of the image.
     """
+    # The edits undone by another edit, and the edits undoing them
+    INVERSES = {'invert': 'invert', 'reflectHori': 'reflectHori', 
+                'reflectVert': 'reflectVert', 'transpose': 'transpose', 
+                'rotateLeft': 'rotateRight', 'rotateRight': 'rotateLeft'}
+    
+    # The executor of every filter without its own (see setExecutor)
+    EXECUTOR = None
+    
+    # Edits are run in this thread unless an executor is set (see setExecutor)
+    _executor = None
+    
+    # The lookup tables of the pointwise filters
+    _INVERT = a6lut.Table(lambda value: 255-value)
+    _GREY   = a6lut.Mixer((0.3,0.6,0.1))
+    _SEPIA  = a6lut.Mixer((0.3,0.6,0.1),(1,0.6,0.4))
     
     # PROVIDED ACTIONS (STUDY THESE)
     def invert(self):
         """
         Inverts the current image, replacing each element with its color complement
+        
+        Each color value v becomes 255-v, which is a lookup table (see a6lut).
         """
-        current = self.getCurrent()
-        for pos in range(len(current)): # We can do this because of __len__
-            rgb = current[pos]          # We can do this because of __getitem__
-            red   = 255 - rgb[0]
-            green = 255 - rgb[1]
-            blue  = 255 - rgb[2]
-            rgb = (red,green,blue)      # New pixel value
-            current[pos] = rgb          # We can do this because of __setitem__
+        self.getCurrent().recolor(self._INVERT)
     
     def transpose(self):
         """
         Transposes the current image
         
         Transposing is tricky, as it is hard to remember which values have been 
-        changed and which have not.  To simplify the process, we copy the 
-        current image and use that as a reference.  So we change the current 
-        image with setPixel, but read (with getPixel) from the copy.
+        changed and which have not.  So no pixels are moved yet: the image just
+        changes its orientation (see Image.reorient). The pixels are moved in
+        place once they are needed in order (see Image.transpose).
         """
-        current  = self.getCurrent()
-        original = current.copy()
-        current.setWidth(current.getHeight())
-        
-        for row in range(current.getHeight()):      # Loop over the rows
-            for col in range(current.getWidth()):   # Loop over the columnns
-                current.setPixel(row,col,original.getPixel(col,row))
+        self.getCurrent().reorient('transpose')
     
     def reflectHori(self):
         """
         Reflects the current image around the horizontal middle.
+        
+        Like transpose, this only changes the orientation of the image.
         """
-        current = self.getCurrent()
-        for h in range(current.getWidth()//2):      # Loop over the columnns
-            for row in range(current.getHeight()):  # Loop over the rows
-                k = current.getWidth()-1-h
-                current.swapPixels(row,h,row,k)
+        self.getCurrent().reorient('reflectHori')
     
     def rotateRight(self):
         """
-        Rotates the current image left by 90 degrees.
+        Rotates the current image right by 90 degrees.
         
-        Technically, we can implement this via a transpose followed by a 
-        vertical reflection. However, this is slow, so we use the faster 
-        strategy below.
+        This is a transpose followed by a horizontal reflection, so it only 
+        changes the orientation of the image.  A sequence of rotations and 
+        reflections moves the pixels at most once.
         """
-        current  = self.getCurrent()
-        original = current.copy()
-        current.setWidth(current.getHeight())
-        
-        for row in range(current.getHeight()):      # Loop over the rows
-            for col in range(current.getWidth()):   # Loop over the columnns
-                current.setPixel(row,col,original.getPixel\
-                    (original.getHeight()-col-1,row))
+        self.getCurrent().reorient('rotateRight')
     
     def rotateLeft(self):
         """
         Rotates the current image left by 90 degrees.
         
-        Technically, we can implement this via a transpose followed by a 
-        vertical reflection. However, this is slow, so we use the faster 
-        strategy below.
+        This is a transpose followed by a vertical reflection, so it only 
+        changes the orientation of the image.  A sequence of rotations and 
+        reflections moves the pixels at most once.
         """
-        current  = self.getCurrent()
-        original = current.copy()
-        current.setWidth(current.getHeight())
-        
-        for row in range(current.getHeight()):      # Loop over the rows
-            for col in range(current.getWidth()):   # Loop over the columnns
-                current.setPixel(row,col,original.getPixel\
-                    (col,original.getWidth()-row-1))
+        self.getCurrent().reorient('rotateLeft')
     
     # ASSIGNMENT METHODS (IMPLEMENT THESE)
     def reflectVert(self):
         """ 
         Reflects the current image around the vertical middle.
+        
+        Like transpose, this only changes the orientation of the image.
         """
-        current = self.getCurrent()
-        for h in range(current.getHeight()//2):      # Loop over the rows
-            for col in range(current.getWidth()):  # Loop over the columns
-                k = current.getHeight()-1-h
-                current.swapPixels(h,col,k,col)
+        self.getCurrent().reorient('reflectVert')
     
     def monochromify(self, sepia):
         """
@@ -135,35 +145,21 @@ class Filter(a6editor.Editor):
         If sepia is True, it makes the same computations as before but sets 
         green to 0.6 * brightness and blue to 0.4 * brightness.
         
+        A greyscale result is stored in greyscale mode (see Image.compact).
+        
+        The values are truncated to ints exactly as above, but they are found 
+        in lookup tables, computed once for every brightness (see a6lut.Mixer).
+        
         Parameter sepia: Whether to use sepia tone instead of greyscale.
         Precondition: sepia is a bool
         """
         assert isinstance(sepia,bool)
         current = self.getCurrent()
+        current.recolor(self._SEPIA if sepia else self._GREY)
+        
+        # A greyscale image only needs 1 byte a pixel
         if sepia == False:
-            for pos in range(len(current)): 
-                rgb = current[pos]          
-                red = current[pos][0]
-                green = current[pos][1]
-                blue = current[pos][2]
-                brightness = 0.3 * red + 0.6 * green + 0.1 * blue
-                red = int(brightness)
-                green = int(brightness)
-                blue = int(brightness)
-                rgb = (red,green,blue)      
-                current[pos] = rgb
-        else:    
-            for pos in range(len(current)): 
-                rgb = current[pos]          
-                red = current[pos][0]
-                green = current[pos][1]
-                blue = current[pos][2]
-                brightness = 0.3 * red + 0.6 * green + 0.1 * blue
-                red = int(brightness)
-                green = int(0.6*brightness)
-                blue  = int(0.4*brightness)
-                rgb = (red,green,blue)      
-                current[pos] = rgb    
+            current.compact()
     
     def jail(self):
         """
@@ -179,6 +175,8 @@ class Filter(a6editor.Editor):
         not counting the two bars on the outside.
         
         The n+2 vertical bars should be as evenly spaced as possible.
+        
+        Each bar is a rectangle (see drawRect), so it is filled a row at a time.
         """
         current = self.getCurrent()
         self._drawHBar(0,(255,0,0))
@@ -194,6 +192,219 @@ class Filter(a6editor.Editor):
             self._drawVBar(int(round(col)),(255,0,0))
             col = col + 4
         
+    def pixellate(self, step):
+        """
+        Pixellates the current image to give it a blocky feel.
+        
+        To pixellate an image, start with the top left corner (e.g. the first 
+        row and column).  Average the colors of the step x step block to the 
+        right and down from this corner (if there are less than step rows or
+        step columns, go to the edge of the image).  Then assign that average
+        to ALL of the pixels in that block.  Each channel of the average is 
+        rounded down to an int.
+        
+        When you are done, skip over step rows and step columns to go to the 
+        next corner pixel.  Repeat this process again.  The result will be a 
+        pixellated image.
+        
+        The sums of the blocks come from a summed area table (see a6area), so 
+        each block costs the same no matter how large step is.
+        
+        Parameter step: The number of pixels in a pixellated block
+        Precondition: step is an int > 0
+        """
+        assert type(step) == int and step > 0, repr(step)+' is not a valid step'
+        _pixellate(self.getCurrent(),step)
+    
+    def blur(self, radius):
+        """
+        Blurs the current image with a box blur.
+        
+        Each pixel becomes the average of the square of pixels that are at 
+        most radius rows and radius columns away from it (near the edges, just
+        the part of the square inside the image).  Like pixellate, this uses a
+        summed area table, so a large radius is no slower than a small one.
+        
+        Parameter radius: The radius of the square
+        Precondition: radius is an int >= 0
+        """
+        current = self.getCurrent()
+        pixels = a6area.Integral(current).blur(radius)
+        current.setRegion(0,0,current.getHeight(),current.getWidth(),pixels)
+    
+    def applyChain(self, steps):
+        """
+        Applies a sequence of edits to the current image, fusing what it can.
+        
+        Each step is the name of an edit method, or a tuple of the name and 
+        the arguments, such as ('monochromify',True).  The result is the same
+        as calling the methods one after the other.  But the pointwise edits 
+        (invert and monochromify) and vignette, which only multiplies each 
+        pixel by a factor for its position, are done together.  A run of such
+        steps reads and writes each pixel just once: the lookup tables are 
+        combined where possible (see a6lut.compose), and the vignette factors
+        are applied to the converted pixels before they are written.  Any 
+        other step ends the run, and is called on its own.
+        
+        Called through apply, as in apply('applyChain',steps), the whole chain
+        is a single entry in the edit history, so it is only copied once.
+        
+        Parameter steps: The edits to apply, in order
+        Precondition: steps is a list (or tuple) whose elements are the names 
+        of edit methods or tuples (name, arg1, arg2, ...), with valid arguments
+        """
+        assert type(steps) in (list,tuple), repr(steps)+' is not a list of steps'
+        kernels = []
+        for step in steps:
+            if type(step) == str:
+                name, args = step, ()
+            else:
+                name, args = step[0], tuple(step[1:])
+            assert callable(getattr(self,name,None)), repr(name)+' is not a method'
+            current = self.getCurrent()
+            kernel = _kernel(name,args,current.getWidth(),current.getHeight())
+            if kernel is None:
+                self._fuse(kernels)
+                kernels = []
+                getattr(self,name)(*args)
+            else:
+                kernels.append(kernel)
+        self._fuse(kernels)
+    
+    def getExecutor(self):
+        """
+        Returns the executor running the edits given to parallel, or None.
+        
+        This is the executor set by setExecutor, or EXECUTOR if there is none.
+        """
+        return self.EXECUTOR if self._executor is None else self._executor
+    
+    def setExecutor(self, executor):
+        """
+        Sets the executor running the edits given to parallel.
+        
+        An executor splits an edit over several processes or threads (such as
+        a a6parallel.ProcessPool or a6parallel.ThreadPool).  If it is None, this
+        filter uses the class attribute EXECUTOR, which sets the executor of
+        every filter at once.  If that is None too, parallel just calls the edit.
+        
+        Parameter executor: The executor for parallel edits
+        Precondition: executor is None, or an object with the methods supports
+        and run (see a6parallel.BandPool)
+        """
+        self._executor = executor
+    
+    def parallel(self, name, *args, executor=None):
+        """
+        Applies the edit name to the current image, with an executor.
+        
+        The result is the same as calling the method name with args.  If there
+        is no executor, or it cannot split that edit, the method is called in 
+        this thread.  Called through apply, as in apply('parallel','invert'), 
+        the edit is a single entry in the edit history.
+        
+        The executor is the one given for just this call, if any, and otherwise
+        the one from getExecutor.  As apply only passes args, an executor for 
+        one call is given when calling this method directly (after increment).
+        
+        Parameter name: The name of the edit method
+        Precondition: name is a string naming a method of this object
+        
+        Parameter args: The arguments of the edit method
+        Precondition: args are valid arguments for that method
+        
+        Parameter executor: The executor for this edit (or None for the usual one)
+        Precondition: executor is None, or an object with the methods supports
+        and run (see a6parallel.BandPool)
+        """
+        assert callable(getattr(self,name,None)), repr(name)+' is not a method'
+        executor = self.getExecutor() if executor is None else executor
+        if executor is None or not executor.supports(name):
+            getattr(self,name)(*args)
+        else:
+            executor.run(self.getCurrent(),name,args)
+    
+    # DRAWING METHODS
+    def drawRect(self, rect, pixel):
+        """
+        Draws a filled rectangle on the current image.
+        
+        The rectangle is a tuple (row, col, height, width), as in Image.fill,
+        but it may lie partly outside the image.
+        
+        Parameter rect: The rectangle to draw
+        Precondition: rect is a 4-element tuple (row, col, height, width) of 
+        ints, with height >= 0 and width >= 0
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        """
+        assert type(rect) == tuple and len(rect) == 4, repr(rect)+' is not a rectangle'
+        self.getCurrent().fillSpans(a6draw.rectangle(*rect),pixel)
+    
+    def drawLine(self, start, end, pixel, thickness=1):
+        """
+        Draws a straight line on the current image (see a6draw.line).
+        
+        Parameter start: The first end of the line
+        Precondition: start is a tuple (row, col) of ints
+        
+        Parameter end: The other end of the line
+        Precondition: end is a tuple (row, col) of ints
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        
+        Parameter thickness: The width of the line, in pixels
+        Precondition: thickness is an int > 0
+        """
+        self.getCurrent().fillSpans(a6draw.line(start,end,thickness),pixel)
+    
+    def drawPolyline(self, points, pixel, thickness=1):
+        """
+        Draws lines joining each point to the next on the current image.
+        
+        Parameter points: The points to join (see a6draw.polyline)
+        Precondition: points is a nonempty list of tuples (row, col) of ints
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        
+        Parameter thickness: The width of the lines, in pixels
+        Precondition: thickness is an int > 0
+        """
+        self.getCurrent().fillSpans(a6draw.polyline(points,thickness),pixel)
+    
+    def drawCircle(self, center, radius, pixel, thickness=None):
+        """
+        Draws a circle on the current image (see a6draw.circle).
+        
+        Parameter center: The center of the circle
+        Precondition: center is a tuple (row, col) of ints
+        
+        Parameter radius: The radius of the circle
+        Precondition: radius is an int >= 0
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        
+        Parameter thickness: The width of the ring, or None to fill the circle
+        Precondition: thickness is None or an int > 0
+        """
+        self.getCurrent().fillSpans(a6draw.circle(center,radius,thickness),pixel)
+    
+    def drawPolygon(self, points, pixel):
+        """
+        Draws a filled polygon on the current image (see a6draw.polygon).
+        
+        Parameter points: The corners of the polygon
+        Precondition: points is a list of at least 3 tuples (row, col) of ints
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        """
+        self.getCurrent().fillSpans(a6draw.polygon(points),pixel)
+    
     def vignette(self):
         """
         Modifies the current image to simulates vignetting (corner darkening).
@@ -209,24 +420,78 @@ class Filter(a6editor.Editor):
         hfD (for half diagonal) is the distance from the center of the image 
         to any of the corners.  The values d and hfD should be left as floats
         and not converted to ints.
+        
+        The square of d is the sum of a term for the row and a term for the 
+        column, which only depend on the size of the image.  Those terms are
+        computed once for each size and kept (see the function _vignette_terms),
+        and the factors are added up from them a band of rows at a time, as 
+        each band is multiplied (see _vignette_factors).  So the factors of 
+        the whole image are never in memory at once.
         """
         current = self.getCurrent()
-        center_x = current.getWidth()/2
-        center_y = current.getHeight()/2
-        hfD = ((current.getWidth()**2 + current.getHeight()**2)**0.5)/2
-        for row in range(current.getHeight()):
-            for col in range(current.getWidth()):
-                pixel = current.getPixel(row,col)
-                pixel_x = col
-                pixel_y = row
-                d = ((pixel_x - center_x)**2 + (pixel_y - center_y)**2)**0.5
-                red = int(pixel[0]*(1 - (d**2 / hfD**2)))
-                green = int(pixel[1]*(1 - (d**2 / hfD**2)))
-                blue = int(pixel[2]*(1 - (d**2 / hfD**2)))
-                pixel = (red,green,blue)
-                current.setPixel(row,col,pixel)
+        width = current.getWidth()
+        height = current.getHeight()
+        terms = _vignette_terms(width,height)
+        array = current.asarray()
+        if not array is None:
+            step = max(_BAND//max(width,1),1)
+            for top in range(0,height,step):
+                band = array[top:top+step]
+                factor = _vignette_factors(terms,top*width,(top+len(band))*width)
+                band[...] = band * factor.reshape(len(band),width,1)
+            return
+        
+        for row in range(height):
+            factors = _vignette_factors(terms,row*width,(row+1)*width)
+            pixels = current.getRow(row)
+            current.setRow(row,[(int(red*factor),int(green*factor),int(blue*factor)) 
+                                for (red,green,blue), factor in zip(pixels,factors)])
 
     # HELPER METHODS
+    def _fuse(self, kernels):
+        """
+        Applies the given kernels to the current image in a single pass.
+        
+        The filters in a row are combined first (see a6lut.compose).  If there
+        are only filters, the image converts its pixels with recolor.  
+        Otherwise the pixels are converted and multiplied by the factors in 
+        memory (a band of rows at a time with NumPy, or else a row at a time),
+        and then written back.
+        
+        A greyscale result is compacted, as in monochromify.
+        
+        Parameter kernels: The kernels to apply, in order
+        Precondition: kernels is a list of values returned by the function _kernel
+        """
+        if len(kernels) == 0:
+            return
+        stages = []
+        for kernel in kernels:
+            if isinstance(kernel,tuple) or len(stages) == 0 or isinstance(stages[-1],tuple):
+                stages.append(kernel)
+            else:
+                stages[-1] = a6lut.compose(stages[-1],kernel)
+        
+        current = self.getCurrent()
+        if len(stages) == 1 and not isinstance(stages[0],tuple):
+            current.recolor(stages[0])
+        else:
+            width = current.getWidth()
+            pixels = current.asarray()
+            if not pixels is None:
+                step = max(_BAND//max(width,1),1)
+                for top in range(0,current.getHeight(),step):
+                    band = pixels[top:top+step]
+                    data = _run_stages(stages,band.tobytes(),top*width,(top+len(band))*width)
+                    band[...] = numpy.frombuffer(data,dtype=numpy.uint8).reshape(band.shape)
+            else:
+                for row in range(current.getHeight()):
+                    data = bytes(chain.from_iterable(current.getRow(row)))
+                    data = _run_stages(stages,data,row*width,(row+1)*width)
+                    current.setRow(row,list(zip(data[0::3],data[1::3],data[2::3])))
+        if self._GREY in kernels:
+            current.compact()
+    
     def _drawHBar(self, row, pixel):
         """
         Draws a horizontal bar on the current image at the given row.
@@ -242,11 +507,7 @@ class Filter(a6editor.Editor):
         Parameter pixel: The pixel color to use
         Precondition: pixel is a 3-element tuple (r,b,g) of ints in 0..255
         """
-        current = self.getCurrent()
-        for col in range(current.getWidth()):
-            current.setPixel(row,   col, pixel)
-            current.setPixel(row+1, col, pixel)
-            current.setPixel(row+2, col, pixel)
+        self.drawRect((row,0,3,self.getCurrent().getWidth()),pixel)
 
     def _drawVBar(self, col, pixel):
         """
@@ -263,9 +524,154 @@ class Filter(a6editor.Editor):
         Parameter pixel: The pixel color to use
         Precondition: pixel is a 3-element tuple (r,b,g) of ints in 0..255
         """
-        current = self.getCurrent()
-        for row in range(current.getHeight()):
-            current.setPixel(row, col, pixel)
-            current.setPixel(row, col+1, pixel)
-            current.setPixel(row, col+2, pixel)
-            current.setPixel(row, col+3, pixel)
\ No newline at end of file
+        self.drawRect((0,col,self.getCurrent().getHeight(),4),pixel)
+
+
+# The number of pixels vignetted at a time, so the arrays of floats stay small
+_BAND = 1 << 16
+
+
+# HELPER FUNCTIONS
+@functools.lru_cache(maxsize=8)
+def _vignette_terms(width, height):
+    """
+    Returns the terms of the vignette factors of an image of the given size.
+    
+    The factor of the pixel at (row, col) is 1 - (d / hfD)^2 (see vignette).
+    As d^2 is the sum of a term for the row and a term for the column, only 
+    those terms are kept: the result is a tuple (rows, cols, scale) of the
+    term of each row, the term of each column, and hfD^2.  The factors are 
+    added up from the terms by _vignette_factors.  The terms take very little
+    memory, so the last few sizes are cached, and vignetting a batch of photos
+    of the same size computes them just once.  As every caller gets the same 
+    terms, rows and cols are read-only memoryviews of floats (format 'd').
+    
+    Parameter width: The image width
+    Precondition: width is an int >= 0
+    
+    Parameter height: The image height
+    Precondition: height is an int >= 0
+    """
+    hfD = ((width**2 + height**2)**0.5)/2
+    cols = array('d',[(col - width/2)**2 for col in range(width)])
+    rows = array('d',[(row - height/2)**2 for row in range(height)])
+    return (memoryview(rows).toreadonly(),memoryview(cols).toreadonly(),hfD**2)
+
+
+def _vignette_factors(terms, start, stop):
+    """
+    Returns the vignette factors of the pixels at positions start..stop-1.
+    
+    The position of the pixel at (row, col) is row*width+col.  The factors 
+    are a NumPy array of floats if NumPy is installed, and a list otherwise.
+    
+    Parameter terms: The terms of the factors
+    Precondition: terms is the result of _vignette_terms
+    
+    Parameter start: The position of the first pixel
+    Precondition: start is an int >= 0
+    
+    Parameter stop: The position after the last pixel
+    Precondition: stop is an int >= start, at most the number of pixels
+    """
+    rows, cols, scale = terms
+    width = len(cols)
+    if stop == start:
+        return [] if numpy is None else numpy.zeros(0)
+    top = start//width
+    bottom = -(-stop//width)
+    skip = start-top*width
+    if not numpy is None:
+        sums = numpy.add.outer(numpy.frombuffer(rows,dtype=numpy.float64)[top:bottom],
+                               numpy.frombuffer(cols,dtype=numpy.float64))
+        return (1 - sums / scale).ravel()[skip:skip+stop-start]
+    
+    result = []
+    for term in rows[top:bottom]:
+        result.extend([1 - (term + col) / scale for col in cols])
+    return result[skip:skip+stop-start]
+
+
+def _kernel(name, args, width, height):
+    """
+    Returns the fusable form of an edit, or None if it cannot be fused.
+    
+    A pointwise edit is its filter (see a6lut), and vignette is the terms of 
+    its factors for an image of the given size (see _vignette_terms).  These
+    are the stages of _run_stages.
+    
+    Parameter name: The name of the edit method
+    Precondition: name is a string naming a method of Filter
+    
+    Parameter args: The arguments of the edit method
+    Precondition: args is a tuple of valid arguments for that method
+    
+    Parameter width: The image width
+    Precondition: width is an int >= 0
+    
+    Parameter height: The image height
+    Precondition: height is an int >= 0
+    """
+    if name == 'invert' and args == ():
+        return Filter._INVERT
+    if name == 'monochromify' and len(args) == 1:
+        assert isinstance(args[0],bool)
+        return Filter._SEPIA if args[0] else Filter._GREY
+    if name == 'vignette' and args == ():
+        return _vignette_terms(width,height)
+    return None
+
+
+def _pixellate(image, step):
+    """
+    Pixellates the given image in place (see the method pixellate in Filter).
+    
+    Parameter image: The image to pixellate
+    Precondition: image is an Image object
+    
+    Parameter step: The number of pixels in a pixellated block
+    Precondition: step is an int > 0
+    """
+    averages = iter(a6area.Integral(image).grid(step))
+    width = image.getWidth()
+    height = image.getHeight()
+    for row in range(0,height,step):
+        for col in range(0,width,step):
+            rect = (row,col,min(step,height-row),min(step,width-col))
+            image.fill(rect,next(averages))
+
+
+def _run_stages(stages, data, start, stop):
+    """
+    Returns the packed pixels data after each stage, as a bytes object.
+    
+    A stage is a pointwise filter, or the terms of vignette factors (see 
+    _vignette_terms).  The pixels are those at positions start..stop-1 of the
+    image, so they are multiplied by the factors at those positions.  Each
+    channel is rounded down, as in vignette.
+    
+    Parameter stages: The stages to apply, in order
+    Precondition: stages is a nonempty list of pointwise filters and results
+    of _vignette_terms
+    
+    Parameter data: The packed pixels
+    Precondition: data is a bytes object of 3*(stop-start) bytes
+    
+    Parameter start: The position of the first pixel
+    Precondition: start is an int >= 0
+    
+    Parameter stop: The position after the last pixel
+    Precondition: stop is an int >= start
+    """
+    for stage in stages:
+        if not isinstance(stage,tuple):
+            data = stage(data)
+        elif not numpy is None:
+            factor = _vignette_factors(stage,start,stop)
+            pixels = numpy.frombuffer(data,dtype=numpy.uint8).reshape(-1,3)
+            data = (pixels * factor[:,numpy.newaxis]).astype(numpy.uint8).tobytes()
+        else:
+            factors = _vignette_factors(stage,start,stop)
+            data = bytes(int(value*factor) for (value, factor) 
+                         in zip(data,chain.from_iterable(zip(factors,factors,factors))))
+    return bytes(data)
@@ -4,11 +4,26 @@ The main class for our imager application.
 This modules contains a single class.  Instances of this class support an image that can 
 be modified.  This is the main class needed to display images in the viewer.
 
+It also has functions to save an image as a raw file and to open a raw file as a 
+memory-mapped image. That allows us to work with images that are too large to load.
+
 Based on an original file by Dexter Kozen (dck10) and Walker White (wmw2)
 
 Aaron Baruch (amb565) Ilan Klimberg (idk7)
 11/15/2022
 """
+import a6buffer
+from itertools import chain
+import io
+import math
+import os.path
+import struct
+
+# The header of a raw image file: a magic string, the width and the height
+RAW_HEADER = struct.Struct('<8sQQ')
+# The magic string identifying a raw image file
+RAW_MAGIC = b'A6PIXELS'
+
 
 def _is_pixel(item):
     """
@@ -37,17 +52,45 @@ def _is_pixel_list(data):
     A pixel list is a 1-dimensional list of pixels where a pixel is a tuple
     of 3 ints in the range 0..255
     
+    This function checks the whole list at once (with map and set, which 
+    loop in C) rather than calling _is_pixel on each pixel. It gives the same
+    answer, but is several times faster on a large image.
+    
     Parameter data: The data to check
     Precondition: NONE (data can be anything)
     """
     if not isinstance(data,list):
         return False
+    
+    if not set(map(type,data)) <= {tuple} or not set(map(len,data)) <= {3}:
+        return False
+    
+    if not set(map(type,chain.from_iterable(data))) <= {int}:
+        return False
+    
+    values = set(chain.from_iterable(data))
+    return len(values) == 0 or (min(values) >= 0 and max(values) <= 255)
 
-    for i in range(len(data)):
-        if _is_pixel(data[i]) != True:
-            return False
 
-    return True
+def _trusted_image(data, width):
+    """
+    Returns an Image for the given data, without checking the data.
+    
+    The initializer for Image checks that data is a pixel list, which means
+    looking at every pixel. That is a waste of time when data is known to be
+    valid, such as when we copy an image. This function skips that check; it
+    only checks the width.
+    
+    Parameter data: The image data
+    Precondition: data is a pixel list or a pixel buffer
+    
+    Parameter width: The image width
+    Precondition: width is an int > 0 and evenly divides the length of pixels
+    """
+    result = Image.__new__(Image)
+    result._data = data
+    result.setWidth(width)
+    return result
 
 
 # TASK 1: IMPLEMENT THIS CLASS
@@ -77,10 +120,44 @@ class Image(object):
         image.__setitem__(pos, (255,0,0))
     
      These operations are used by the greyscale filters and the stenography methods.
+    
+    The pixels do not have to be stored in a pixel list.  If you give the
+    initializer a pixel buffer (from the module a6buffer) instead, the image
+    uses that buffer for storage.  For example
+        
+        Image(a6buffer.PackedBuffer(data),width)
+    
+    stores the pixels as 3 bytes each. All of the methods of this class work 
+    exactly the same way for either kind of storage.
+    
+    Greyscale and palette buffers (a6buffer.GreyBuffer and PaletteBuffer) 
+    store 1 byte a pixel, but cannot hold every color. If you write a color 
+    that such a buffer cannot hold, the image switches to RGB storage first, 
+    so you never have to worry about the mode. The method compact switches an
+    image to the smallest mode that holds its pixels.
+    
+    Rotating, transposing or reflecting an image (see reorient) does not move
+    any pixels at first. The image just remembers its new orientation, and 
+    getPixel, setPixel and [] find each pixel where it is stored. The pixels
+    are only moved, once, when a method needs them in order (such as getRow 
+    or tobytes). So a whole sequence of rotations costs almost nothing.
     """
     # IMMUTABLE ATTRIBUTES (Fixed after initialization)
     # Attribute _data: The underlying list of pixels 
-    # Invariant: _data is a pixel list (see _is_pixel_list)
+    # Invariant: _data is a pixel list (see _is_pixel_list) or a pixel buffer
+    # (see a6buffer.PixelBuffer). The contents only change through the methods
+    # of this class, but _data is replaced by a copy if _shared is True.
+    #
+    # Attribute _shared: Whether _data may be shared with a copy of this image
+    # Invariant: _shared is a bool. If it is True, _data must be copied before
+    # any pixel is written.
+    #
+    # Attribute _orient: How the pixels in _data are oriented (see reorient)
+    # Invariant: _orient is an int in 0..7, whose bits are TRANSPOSED, 
+    # FLIP_ROWS and FLIP_COLS. The pixel at (row, col) is found by swapping 
+    # row and col if TRANSPOSED, and then counting the row from the bottom of
+    # _data if FLIP_ROWS and the col from the right if FLIP_COLS.  _width and 
+    # _height are those of _data, so they are swapped if TRANSPOSED.
     #
     # MUTABLE ATTRIBUTES (Can be changed at any time, via the setters)
     # Attribute _width:  The image width, which is the number of columns
@@ -92,6 +169,24 @@ class Image(object):
     # height = 0 only if len(_data) = 0
     # Note that if you change width, you must change height (to satisfy the invariant)
     
+    # The largest number of pixels shown by __str__
+    STR_LIMIT = 10000
+    
+    # The number of pixels compact looks at before counting the colors
+    COMPACT_CHUNK = 4096
+    
+    # The size of the square blocks of pixels swapped by transpose
+    BLOCK = 64
+    
+    # The bits of an orientation (see reorient)
+    TRANSPOSED = 1
+    FLIP_ROWS  = 2
+    FLIP_COLS  = 4
+    
+    # Images start out owning their data (see copy), in their stored orientation
+    _shared = False
+    _orient = 0
+    
     # PART A
     # GETTERS AND SETTERS
     def getData(self):
@@ -101,6 +196,7 @@ class Image(object):
         The image data is a 1-dimensional list of 3-element tuples.  The list
         returned by this method is a copy of the one managed by this object.
         """
+        self._settle()
         return self._data[:]
     
     def getWidth(self):
@@ -110,6 +206,8 @@ class Image(object):
         A value width is an int evenly dividing the number of pixels in the 
         image. Width can only be 0 if the image is empty.
         """
+        if self._orient & self.TRANSPOSED:
+            return int(self._height)
         return int(self._width)
     
     def setWidth(self,value):
@@ -128,9 +226,12 @@ class Image(object):
         """
         assert isinstance(value,int) and len(self._data) % value == 0 \
             and value >= 0
+        self._settle()
         self._width = value
         num_pixels = len(self._data)
-        self._height = num_pixels / self._width
+        self._height = num_pixels // self._width
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            self._reshape()
     
     def getHeight(self):
         """
@@ -139,6 +240,8 @@ class Image(object):
         A value height is an int evenly dividing the number of pixels in the 
         image. Height can only be 0 if the image is empty.
         """
+        if self._orient & self.TRANSPOSED:
+            return int(self._width)
         return int(self._height)
     
     def setHeight(self,value):
@@ -157,9 +260,12 @@ class Image(object):
         """
         assert isinstance(value,int) and len(self._data) % value == 0 \
             and value >= 0
+        self._settle()
         self._height = value
         num_pixels = len(self._data)
-        self._width = num_pixels / self._height
+        self._width = num_pixels // self._height
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            self._reshape()
     
     # INITIALIZER
     def __init__(self, data, width):
@@ -183,13 +289,16 @@ class Image(object):
         does not copy it. So changes to the image will change the data
         parameter as well.
         
+        The data may also be a pixel buffer (see a6buffer.PixelBuffer). In that
+        case the image stores its pixels in that buffer instead.
+        
         Parameter data: The image data as a pixel list
-        Precondition: data is a pixel list
+        Precondition: data is a pixel list or a pixel buffer
         
         Parameter width: The image width
         Precondition: width is an int > 0 and evenly divides the length of pixels
         """
-        assert _is_pixel_list(data)
+        assert _is_pixel_list(data) or isinstance(data,a6buffer.PixelBuffer)
         self._data = data
         self.setWidth(width)
   
@@ -220,6 +329,8 @@ class Image(object):
         Precondition: pos is an int and a valid position >= 0 in the pixel list.
         """
         assert isinstance(pos,int) and (pos >= 0 and pos < len(self._data))
+        if self._orient:
+            pos = self._locate(*divmod(pos,self.getWidth()))
         return self._data[pos]
     
     def __setitem__(self, pos, pixel):
@@ -237,7 +348,11 @@ class Image(object):
         """
         assert isinstance(pos,int) and (pos >= 0 and pos < len(self._data))
         assert _is_pixel(pixel)
-        self._data[pos] = pixel
+        if self._shared:
+            self._unshare()
+        if self._orient:
+            pos = self._locate(*divmod(pos,self.getWidth()))
+        self._store(pos,pixel)
 
     # PART C
     # TWO-DIMENSIONAL ACCESS METHODS
@@ -256,8 +371,10 @@ class Image(object):
         Parameter col: The pixel column
         Precondition: col is an int >= 0 and < width
         """
-        assert isinstance(row,int) and (row >= 0 and row < self._height)
-        assert isinstance(col,int) and (col >= 0 and col < self._width)
+        assert isinstance(row,int) and (row >= 0 and row < self.getHeight())
+        assert isinstance(col,int) and (col >= 0 and col < self.getWidth())
+        if self._orient:
+            return self._data[self._locate(row,col)]
         pos = (row*self._width) + col
         return self._data[pos]
 
@@ -277,12 +394,172 @@ class Image(object):
         Parameter pixel: The pixel value
         Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
         """
-        assert isinstance(row,int) and (row >= 0 and row < self._height)
-        assert isinstance(col,int) and (col >= 0 and col < self._width)
+        assert isinstance(row,int) and (row >= 0 and row < self.getHeight())
+        assert isinstance(col,int) and (col >= 0 and col < self.getWidth())
         assert _is_pixel(pixel)
-        pos = (row*self._width) + col
-        self._data[pos] = pixel
+        if self._shared:
+            self._unshare()
+        if self._orient:
+            pos = self._locate(row,col)
+        else:
+            pos = (row*self._width) + col
+        self._store(pos,pixel)
+        
+    # BULK ACCESS METHODS
+    def getRow(self, row):
+        """
+        Returns a copy of the pixels in the given row, as a pixel list.
+        
+        The list has one pixel for each column, from left to right. This is 
+        much faster than calling getPixel for each column, as the bounds are 
+        checked only once.
+        
+        Parameter row: The pixel row
+        Precondition: row is an int >= 0 and < height
+        """
+        assert isinstance(row,int) and (row >= 0 and row < self.getHeight())
+        self._settle()
+        width = self.getWidth()
+        return self._data[row*width:(row+1)*width]
+    
+    def setRow(self, row, pixels):
+        """
+        Sets the pixels in the given row to (a copy of) pixels.
+        
+        Parameter row: The pixel row
+        Precondition: row is an int >= 0 and < height
+        
+        Parameter pixels: The new pixels, from left to right
+        Precondition: pixels is a pixel list whose length is the image width
+        """
+        assert isinstance(row,int) and (row >= 0 and row < self.getHeight())
+        width = self.getWidth()
+        assert _is_pixel_list(pixels) and len(pixels) == width
+        self._settle()
+        if self._shared:
+            self._unshare()
+        self._store(slice(row*width,(row+1)*width),pixels)
+    
+    def getRegion(self, row, col, height, width):
+        """
+        Returns a copy of the pixels in the given rectangle, as a pixel list.
+        
+        The rectangle has its top left corner at (row, col) and is height rows
+        tall and width columns wide. The pixels are listed in row-major order,
+        so the result is itself the pixel list of a width-wide image.
+        
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+        
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+        
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+        
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+        """
+        assert self._isRegion(row,col,height,width)
+        self._settle()
+        span = self.getWidth()
+        result = []
+        for pos in range(row*span+col,(row+height)*span,span):
+            result.extend(self._data[pos:pos+width])
+        return result
+    
+    def setRegion(self, row, col, height, width, pixels):
+        """
+        Sets the pixels in the given rectangle to (a copy of) pixels.
+        
+        The rectangle has its top left corner at (row, col) and is height rows
+        tall and width columns wide. The pixels are given in row-major order, 
+        just as they are returned by getRegion.
+        
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+        
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+        
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+        
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+        
+        Parameter pixels: The new pixels
+        Precondition: pixels is a pixel list of length height*width
+        """
+        assert self._isRegion(row,col,height,width)
+        assert _is_pixel_list(pixels) and len(pixels) == height*width
+        self._settle()
+        if self._shared:
+            self._unshare()
+        span = self.getWidth()
+        start = 0
+        for pos in range(row*span+col,(row+height)*span,span):
+            self._store(slice(pos,pos+width),pixels[start:start+width])
+            start = start + width
+    
+    def fill(self, rect, pixel):
+        """
+        Sets every pixel in the given rectangle to pixel.
+        
+        The rectangle is a tuple (row, col, height, width). It has its top left
+        corner at (row, col) and is height rows tall and width columns wide.
+        
+        Parameter rect: The rectangle to fill
+        Precondition: rect is a 4-element tuple (row, col, height, width) of 
+        ints >= 0 that lies inside the image
         
+        Parameter pixel: The pixel value
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        """
+        assert type(rect) == tuple and len(rect) == 4 and self._isRegion(*rect)
+        assert _is_pixel(pixel)
+        self._settle()
+        if self._shared:
+            self._unshare()
+        row, col, height, width = rect
+        span = self.getWidth()
+        line = [pixel]*width
+        for pos in range(row*span+col,(row+height)*span,span):
+            self._store(slice(pos,pos+width),line)
+    
+    def fillSpans(self, spans, pixel):
+        """
+        Sets every pixel in the given spans to pixel.
+        
+        A span is a tuple (row, col, width): the width pixels of the row, 
+        starting at col.  Each span is written as a single slice, so this is
+        how the shapes in the module a6draw are drawn.  Unlike fill, the spans
+        do not have to lie inside the image; the parts outside are left out.
+        
+        Parameter spans: The spans to fill
+        Precondition: spans is a list of 3-element tuples (row, col, width) of 
+        ints, with width >= 0
+        
+        Parameter pixel: The pixel value
+        Precondition: pixel is a 3-element tuple (r,g,b) of ints in 0..255
+        """
+        assert type(spans) == list, repr(spans)+' is not a list of spans'
+        assert _is_pixel(pixel)
+        self._settle()
+        if self._shared:
+            self._unshare()
+        span = self.getWidth()
+        height = self.getHeight()
+        lines = {}
+        for row, col, width in spans:
+            left = max(col,0)
+            right = min(col+width,span)
+            if row < 0 or row >= height or left >= right:
+                continue
+            if not right-left in lines:
+                lines[right-left] = [pixel]*(right-left)
+            self._store(slice(row*span+left,row*span+right),lines[right-left])
+    
     # PART D
     def __str__(self):
         """
@@ -311,29 +588,58 @@ class Image(object):
         There should be spaces after the commas but no where else. Tuples 
         (the individual pixels) handle this  part for you automatically, but you
         need to handle the commas between pixels and the newlines between rows.
+
+        If the image has more than STR_LIMIT pixels, the rest are left out 
+        (see dump), so that printing a large image does not take forever.
+        """
+        result = io.StringIO()
+        self.dump(result,self.STR_LIMIT)
+        return result.getvalue()
+    
+    def dump(self, stream, limit=None):
+        """
+        Writes the string representation of this image to stream.
+        
+        The text is the same as that returned by __str__ (without a limit), 
+        but it is written one row at a time, so it never has to be built in 
+        memory all at once.
+        
+        If limit is not None, at most limit pixels are written. The pixels 
+        left out of a row are replaced by '...', and so are the rows left out
+        at the end. For example, the image in the __str__ example with a limit 
+        of 3 pixels is written as
+            
+            [[(255, 0, 0), (0, 255, 0)],
+            [(0, 0, 255), ...],
+            ...]
+        
+        Parameter stream: The stream to write to
+        Precondition: stream is a text stream (such as a file or StringIO)
+        
+        Parameter limit: The maximum number of pixels to write
+        Precondition: limit is an int >= 0 or None
         """
-        list_super = []
-        list_minor = []
-        counter = 1
-        for i in range(len(self._data)):
-            list_minor.append(self._data[i])
-            if counter == self._width:
-                list_super.append(list_minor)
-                list_minor = []
-                counter = 0
-            counter = counter + 1
-        str_list = str(list_super)
-        result = ''
-        count_parens = 0
-        save_index = 0
-        for i in range(len(str_list)):
-            if str_list[i] == '(' or str_list[i] == ')':
-                count_parens = count_parens + 1
-            if count_parens == (self._width*2):
-                result = result + str_list[save_index:i+3] + '\n'
-                save_index = i + 4
-                count_parens = 0
-        return result[:-1]
+        assert limit is None or (isinstance(limit,int) and limit >= 0)
+        if len(self) == 0:
+            return
+        
+        self._settle()
+        width = self.getWidth()
+        remain = len(self) if limit is None else limit
+        stream.write('[')
+        for row in range(self.getHeight()):
+            if row > 0:
+                stream.write(',\n')
+            if remain <= 0:
+                stream.write('...')
+                break
+            pos = row*width
+            stream.write('['+', '.join(map(str,self._data[pos:pos+min(width,remain)])))
+            if remain < width:
+                stream.write(', ...')
+            stream.write(']')
+            remain = remain-width
+        stream.write(']')
     
     # ADDITIONAL METHODS (WE HAVE PROVIDED THESE FOR YOU)
     def swapPixels(self, row1, col1, row2, col2):
@@ -358,11 +664,690 @@ class Image(object):
         self.setPixel(row1, col1, self.getPixel(row2, col2))
         self.setPixel(row2, col2, temp)
     
+    def transpose(self):
+        """
+        Transposes this image in place, so that each row becomes a column.
+        
+        The width and height are swapped, and the pixel at (row, col) moves to
+        (col, row). The image is not copied (unless its data is shared with a
+        copy, see copy).
+        
+        The image is split into squares, as large as possible, and each square 
+        is transposed where it is, by swapping blocks of BLOCK x BLOCK pixels.
+        This keeps the pixels read and written close together.  Then the rows
+        of the squares are moved to their places, each one as a whole (see 
+        _permuteSegments).  That only needs one extra bit for each row of a 
+        square.  A square image is a single square, so it is done at once.
+        If the squares would be tiny (less than BLOCK/4 pixels wide), each 
+        pixel is moved to its place instead.
+        
+        Unlike reorient, this moves the pixels right away.
+        """
+        if len(self._data) == 0:
+            return
+        self._settle()
+        if self._shared:
+            self._unshare()
+        width = self.getWidth()
+        height = self.getHeight()
+        size = math.gcd(width,height)
+        if width == height or size >= self.BLOCK//4:
+            for top in range(0,height,size):
+                for left in range(0,width,size):
+                    self._transposeSquare(top*width+left,width,size)
+        else:
+            size = 1
+        if width != height:
+            self._permuteSegments(size)
+        self.setWidth(height)
+    
+    def reorient(self, name):
+        """
+        Rotates, transposes or reflects this image, without moving any pixels.
+        
+        The name is that of the method in a6filter.Filter: 'transpose', 
+        'reflectHori' (reversing each row), 'reflectVert' (reversing each 
+        column), 'rotateLeft' or 'rotateRight' (by 90 degrees).  Each of these
+        only changes which pixel is at which (row, col), and any sequence of 
+        them is one of 8 orientations.  So this method just combines the new
+        change with the orientation of the image, which takes constant time.
+        The pixels are moved later, all at once, when a method needs them in 
+        order (see _settle).
+        
+        Parameter name: The change to the orientation
+        Precondition: name is one of the strings listed above
+        """
+        assert name in ('transpose','reflectHori','reflectVert','rotateLeft','rotateRight'), \
+            repr(name)+' is not an orientation'
+        if name in ('transpose','rotateLeft','rotateRight'):
+            self._orient ^= self.TRANSPOSED
+        
+        # Reversing the rows of a transposed image reverses the stored columns
+        transposed = self._orient & self.TRANSPOSED
+        if name in ('reflectHori','rotateRight'):
+            self._orient ^= self.FLIP_ROWS if transposed else self.FLIP_COLS
+        elif name in ('reflectVert','rotateLeft'):
+            self._orient ^= self.FLIP_COLS if transposed else self.FLIP_ROWS
+    
+    def getOrientation(self):
+        """
+        Returns the orientation of this image, as an int in 0..7.
+        
+        The orientation says how the pixels are stored (see reorient).  It is 0
+        once the pixels are stored in order. Otherwise its bits are TRANSPOSED,
+        FLIP_ROWS and FLIP_COLS.
+        """
+        return self._orient
+    
     def copy(self):
         """
         Returns a copy of this image object.
         
-        The underlying pixel data must be copied (e.g. the copy cannot refer 
-        to the same list of pixels that this object does).
+        The copy uses the same kind of storage as this image. Copying is 
+        lazy (copy-on-write): the copy shares the underlying pixel data with 
+        this image until one of them writes a pixel. Only then is the data 
+        actually copied, and only by the image doing the writing. So a copy 
+        that is never changed costs almost nothing, but changes to one image 
+        can never be seen in the other.
+        
+        Changing the width does not write any pixels, so it does not force
+        the data to be copied.  The copy has the same orientation (see 
+        reorient), so the pixels of neither image are moved.
+        """
+        result = _trusted_image(self._data,self._width)
+        result._orient = self._orient
+        result._shared = True
+        self._shared = True
+        return result
+    
+    def asarray(self):
+        """
+        Returns a NumPy view of the pixels, or None if there is not one.
+        
+        The view is an array of shape (height, width, 3) and type uint8. It 
+        shares its memory with this image (it is not a copy), so changing the
+        array changes the image. This allows filters to process the whole 
+        image at once instead of one pixel at a time.
+        
+        This method returns None if NumPy is not installed, or if the image 
+        stores its pixels in a pixel list (which cannot be viewed as an array).
+        
+        As the view can be written to, this method stops the image from 
+        sharing its data with any copy (see copy). Storage that cannot hold
+        every pixel (such as greyscale or palette mode) is switched to RGB 
+        storage first (see a6buffer.PixelBuffer.promote).
+        """
+        if not isinstance(self._data,a6buffer.PixelBuffer):
+            return None
+        self._settle()
+        data = self._data.promote()
+        if not data is self._data:
+            self._data = data
+            self._shared = False
+        elif self._shared:
+            self._unshare()
+        array = self._data.asarray()
+        if array is None:
+            return None
+        return array.reshape(self.getHeight(),self.getWidth(),3)
+    
+    def tobytes(self):
+        """
+        Returns the pixels of this image as packed bytes.
+        
+        The result is a bytes object with three bytes (r,g,b) per pixel, in
+        row-major order. This is the format expected by PIL (in mode 'RGB') 
+        and by Kivy textures (with colorfmt 'rgb'), and it can be turned back 
+        into an image with the function frombytes.
+        """
+        self._settle()
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            return self._data.tobytes()
+        return bytes(chain.from_iterable(self._data))
+    
+    def getBuffer(self):
+        """
+        Returns a read-only memoryview of the pixels as packed bytes.
+        
+        The bytes are laid out as in tobytes. If the image stores its pixels 
+        as a single block of packed bytes (such as a6buffer.PackedBuffer), the
+        view refers to that block directly and nothing is copied; it will show
+        any later changes to the image. Otherwise, the view is of a packed 
+        copy of the pixels.
+        
+        The view supports the buffer protocol, so it can be given to anything 
+        that reads bytes (PIL, file writers, hashing) without a copy.
+        """
+        self._settle()
+        view = None
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            view = self._data.asbuffer()
+        if view is None:
+            view = memoryview(self.tobytes())
+        return view.toreadonly()
+    
+    def __buffer__(self, flags):
+        """
+        Returns a read-only memoryview of the pixels as packed bytes.
+        
+        This special method supports the buffer protocol (Python 3.12 and 
+        later), so memoryview(image) is the same as image.getBuffer().
+        
+        Parameter flags: The buffer protocol request flags
+        Precondition: flags is an int
+        """
+        return self.getBuffer()
+    
+    def setBytes(self, buf, width=None):
+        """
+        Replaces the pixels of this image with the given packed bytes.
+        
+        The bytes are laid out as in tobytes, and there must be one pixel for 
+        each pixel of this image.  Afterwards the image stores them in a
+        a6buffer.PackedBuffer, as in the function frombytes.  If buf is a 
+        writable array of bytes (such as a bytearray), the image uses it 
+        directly; otherwise the bytes are copied.
+        
+        Parameter buf: The packed pixels
+        Precondition: buf is a bytes-like object of length 3*len(self)
+        
+        Parameter width: The new image width (or None to keep the width)
+        Precondition: width is None or a valid width (see setWidth)
+        """
+        buffer = a6buffer.PackedBuffer(buf)
+        assert len(buffer) == len(self), 'the data does not match the image size'
+        width = self.getWidth() if width is None else width
+        self._data = buffer
+        self._shared = False
+        self._orient = 0
+        self.setWidth(width)
+    
+    def getMode(self):
+        """
+        Returns the storage mode of this image.
+        
+        The mode is named as in PIL: 'L' for greyscale (a6buffer.GreyBuffer),
+        'P' for a palette (a6buffer.PaletteBuffer) and 'RGB' for any other 
+        storage. Images look the same in every mode; only the memory differs.
+        """
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            return self._data.MODE
+        return 'RGB'
+    
+    def nbytes(self, seen=None):
+        """
+        Returns the number of bytes of memory used by this image.
+        
+        This is the real memory used, counting every Python object the image
+        keeps (see a6buffer.sizeof). For a pixel list, that is the list and
+        each pixel tuple, which is far more than 3 bytes a pixel.  A tuple
+        used for several pixels is only counted once. For a pixel buffer, it
+        is whatever the buffer reports (see a6buffer.PixelBuffer.nbytes).
+        
+        A copy of an image shares its pixels until one of them is changed (see
+        copy).  To count several images together, give them the same seen;
+        anything already counted in seen is not counted again.
+        
+        Parameter seen: The ids of the objects already counted
+        Precondition: seen is a set of ints, or None
+        """
+        seen = set() if seen is None else seen
+        result = a6buffer.sizeof([self,self.__dict__],seen)
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            return result+self._data.nbytes(seen)
+        return result+a6buffer.sizeof(chain([self._data],self._data),seen)
+    
+    def compact(self):
         """
-        return Image(self._data[:],self._width)
\ No newline at end of file
+        Returns the storage mode of this image, after making it as small as possible.
+        
+        If every pixel is grey, the image switches to greyscale mode (1 byte a 
+        pixel). Otherwise, if it has at most 256 colors, it switches to palette 
+        mode (1 byte a pixel, plus the palette). Otherwise the storage does not 
+        change. Images that are already in greyscale or palette mode are left 
+        alone.
+        
+        This method reads the whole image, so it is best called once an image
+        is finished (for example, after a greyscale filter).
+        """
+        mode = self.getMode()
+        if mode != 'RGB' or len(self._data) == 0:
+            return mode
+        
+        data = self.tobytes()
+        red = data[0::3]
+        if red == data[1::3] and red == data[2::3]:
+            self._data = a6buffer.GreyBuffer(red)
+            self._shared = False
+            return 'L'
+        
+        # Give up as soon as there are too many colors
+        colors = set()
+        limit = a6buffer.PaletteBuffer.LIMIT
+        step = 3*self.COMPACT_CHUNK
+        for pos in range(0,len(data),step):
+            part = data[pos:pos+step]
+            colors.update(zip(part[0::3],part[1::3],part[2::3]))
+            if len(colors) > limit:
+                return mode
+        
+        pixels = list(zip(red,data[1::3],data[2::3]))
+        self._data = a6buffer.PaletteBuffer(pixels,sorted(colors))
+        self._shared = False
+        return 'P'
+    
+    def recolor(self, convert):
+        """
+        Changes every pixel of this image with a pointwise function.
+        
+        The function convert takes packed pixels (as returned by tobytes) and
+        returns the new packed pixels, as a bytes object of the same length.
+        Each new pixel must only depend on the old pixel in the same place, as
+        with the filters in the module a6lut.
+        
+        This is much faster than setting each pixel. The storage decides how
+        to convert its pixels (see a6buffer.PixelBuffer.recolor), so a palette
+        only converts its colors.  A pixel list converts each distinct color
+        once, and all of the pixels with the new color share one tuple.
+        
+        Parameter convert: The function changing the pixels
+        Precondition: convert is a pointwise function from packed pixels to
+        packed pixels
+        """
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            if self._shared:
+                self._unshare()
+            self._data = self._data.recolor(convert)
+            return
+        
+        colors = list(set(self._data))
+        data = convert(bytes(chain.from_iterable(colors)))
+        table = dict(zip(colors,zip(data[0::3],data[1::3],data[2::3])))
+        if self._shared:
+            self._data = list(map(table.__getitem__,self._data))
+            self._shared = False
+        else:
+            self._data[:] = map(table.__getitem__,self._data)
+    
+    # HELPER METHODS
+    def _store(self, pos, value):
+        """
+        Writes value to the pixel data at pos, changing the storage if needed.
+        
+        Storage with a reduced mode (such as a6buffer.GreyBuffer) cannot hold
+        every color, and some storage (a6buffer.RunBuffer) is only meant for a
+        few writes. If the storage will not take value, the data is replaced 
+        by an RGB buffer with the same pixels (see a6buffer.PixelBuffer.promote)
+        and the write is tried again.
+        
+        Parameter pos: The position (or positions) to write
+        Precondition: pos is a valid position or slice of _data
+        
+        Parameter value: The pixel (or pixels) to write
+        Precondition: value is a pixel, or a pixel list of the same size as pos
+        """
+        try:
+            self._data[pos] = value
+        except a6buffer.ModeError:
+            self._data = self._data.promote()
+            self._data[pos] = value
+    
+    def _transposeSquare(self, start, span, size):
+        """
+        Transposes a square of pixels in place, a block at a time.
+        
+        The square has size rows of size pixels. Its top left pixel is at 
+        position start, and each row starts span positions after the last.
+        Each block above the diagonal of the square is swapped with the 
+        matching block below it, transposing both, while a block on the 
+        diagonal is transposed where it is. The blocks are BLOCK x BLOCK 
+        pixels, so the pixels read and written are close together.
+        
+        If the data can be viewed as an array (see asarray), NumPy swaps the
+        blocks.  Otherwise they are read and written a row at a time.
+        
+        Parameter start: The position of the top left pixel
+        Precondition: start is an int >= 0
+        
+        Parameter span: The distance between rows
+        Precondition: span is an int >= size, and the square fits in the data
+        
+        Parameter size: The number of rows (and columns)
+        Precondition: size is an int > 0
+        """
+        square = None
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            square = self._data.asarray()
+        if not square is None:
+            row, col = divmod(start,span)
+            square = square.reshape(-1,span,3)[row:row+size,col:col+size]
+        
+        for top in range(0,size,self.BLOCK):
+            bottom = min(top+self.BLOCK,size)
+            for left in range(top,size,self.BLOCK):
+                right = min(left+self.BLOCK,size)
+                if not square is None:
+                    block = square[top:bottom,left:right].copy()
+                    square[top:bottom,left:right] = square[left:right,top:bottom].transpose(1,0,2)
+                    square[left:right,top:bottom] = block.transpose(1,0,2)
+                    continue
+                
+                block1 = [self._data[pos+left:pos+right] 
+                          for pos in range(start+top*span,start+bottom*span,span)]
+                block2 = [self._data[pos+top:pos+bottom] 
+                          for pos in range(start+left*span,start+right*span,span)]
+                rows = range(start+left*span,start+right*span,span)
+                for pos, pixels in zip(rows,zip(*block1)):
+                    self._store(slice(pos+top,pos+bottom),list(pixels))
+                if left != top:
+                    rows = range(start+top*span,start+bottom*span,span)
+                    for pos, pixels in zip(rows,zip(*block2)):
+                        self._store(slice(pos+left,pos+right),list(pixels))
+    
+    def _permuteSegments(self, size):
+        """
+        Moves the transposed squares of this image to their transposed places.
+        
+        This is the second step of transpose, for an image that is not square.
+        The image is split into squares of size x size pixels, where size 
+        divides the width and height, and each square has already been 
+        transposed where it is (see _transposeSquare).  So every row of a 
+        square (a segment of size pixels) only has to move to the place of 
+        that row in the transposed image.  If size is 1, this moves each pixel
+        to its place, transposing the whole image.
+        
+        The segments are moved one cycle at a time: the segment at each place 
+        moves to the next place in its cycle, with a single spare segment. A 
+        bit for each segment marks the cycles that are done.  If the data is 
+        a single block of packed bytes (see asbuffer), the segments are moved 
+        as bytes.
+        
+        Parameter size: The size of the squares
+        Precondition: size is an int > 0 that divides the width and height
+        """
+        view = None
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            view = self._data.asbuffer()
+        if view is None:
+            unit = size
+            read = lambda place: self._data[place*unit:(place+1)*unit]
+            write = lambda place, pixels: self._store(slice(place*unit,(place+1)*unit),pixels)
+        else:
+            unit = 3*size
+            read = lambda place: view[place*unit:(place+1)*unit].tobytes()
+            write = lambda place, pixels: view.__setitem__(slice(place*unit,(place+1)*unit),pixels)
+        
+        across = self.getWidth()//size
+        down = self.getHeight()//size
+        total = len(self._data)//size
+        done = bytearray(total//8+1)
+        for first in range(total):
+            if done[first >> 3] & (1 << (first & 7)):
+                continue
+            place = first
+            pixels = read(first)
+            while True:
+                # Row r of the squares in square column j goes to row j of the
+                # squares, in square column r // size
+                row, col = divmod(place,across)
+                place = (col*size+row % size)*down+row//size
+                done[place >> 3] |= 1 << (place & 7)
+                if place == first:
+                    write(place,pixels)
+                    break
+                temp = read(place)
+                write(place,pixels)
+                pixels = temp
+    
+    def _locate(self, row, col):
+        """
+        Returns the position in _data of the pixel at (row, col).
+        
+        This is where the pixel is stored, given the orientation of the image 
+        (see reorient).
+        
+        Parameter row: The pixel row
+        Precondition: row is an int >= 0 and < height
+        
+        Parameter col: The pixel column
+        Precondition: col is an int >= 0 and < width
+        """
+        if self._orient & self.TRANSPOSED:
+            row, col = col, row
+        if self._orient & self.FLIP_ROWS:
+            row = self._height-1-row
+        if self._orient & self.FLIP_COLS:
+            col = self._width-1-col
+        return row*self._width+col
+    
+    def _settle(self):
+        """
+        Moves the pixels of this image to match its orientation.
+        
+        Afterwards the pixels are stored in order, and the orientation is 0 
+        (see reorient).  The stored rows and columns are reversed first (see 
+        _reflect), and then the image is transposed.  All of this is done in 
+        place, but the data is copied first if it is shared with a copy.
+        """
+        if self._orient == 0:
+            return
+        orient = self._orient
+        self._orient = 0
+        if self._shared:
+            self._unshare()
+        if orient & (self.FLIP_ROWS | self.FLIP_COLS):
+            self._reflect(bool(orient & self.FLIP_ROWS),bool(orient & self.FLIP_COLS))
+        if orient & self.TRANSPOSED:
+            self.transpose()
+    
+    def _reflect(self, rows, cols):
+        """
+        Reverses the order of the stored rows, columns or both, in place.
+        
+        If the data is a single block of packed bytes (see asbuffer), the rows
+        are swapped and reversed as bytes.  Reversing the bytes of a row also
+        reverses the channels of each pixel, so those are swapped back.
+        
+        Parameter rows: Whether to reverse the order of the rows
+        Precondition: rows is a bool
+        
+        Parameter cols: Whether to reverse the order of the columns
+        Precondition: cols is a bool
+        """
+        width = self._width
+        height = self._height
+        view = None
+        if isinstance(self._data,a6buffer.PixelBuffer):
+            view = self._data.asbuffer()
+        
+        if not view is None:
+            span = 3*width
+            for row in range(height if cols else 0):
+                line = bytearray(view[row*span:(row+1)*span])[::-1]
+                line[0::3], line[2::3] = line[2::3], line[0::3]
+                view[row*span:(row+1)*span] = line
+            for row in range(height//2 if rows else 0):
+                other = height-1-row
+                line = view[row*span:(row+1)*span].tobytes()
+                view[row*span:(row+1)*span] = view[other*span:(other+1)*span]
+                view[other*span:(other+1)*span] = line
+            return
+        
+        for row in range(height if cols else 0):
+            line = slice(row*width,(row+1)*width)
+            self._store(line,self._data[line][::-1])
+        for row in range(height//2 if rows else 0):
+            other = height-1-row
+            line = self._data[row*width:(row+1)*width]
+            self._store(slice(row*width,(row+1)*width),self._data[other*width:(other+1)*width])
+            self._store(slice(other*width,(other+1)*width),line)
+    
+    def _unshare(self):
+        """
+        Gives this image its own copy of the pixel data.
+        
+        This method is called before any pixel is written when the data may 
+        be shared with a copy of this image (see copy).
+        """
+        self._data = self._data.copy()
+        self._shared = False
+    
+    def _reshape(self):
+        """
+        Lets the pixel buffer adjust to a change in the width.
+        
+        Some pixel buffers (such as a6buffer.TiledBuffer) arrange the pixels
+        according to the width of the image. Those return a new buffer from 
+        reshape, which then belongs to this image alone.
+        """
+        data = self._data.reshape(self.getWidth())
+        if not data is self._data:
+            self._data = data
+            self._shared = False
+    
+    def _isRegion(self, row, col, height, width):
+        """
+        Returns True if the given rectangle lies inside this image.
+        
+        Parameter row: The top row of the rectangle
+        Precondition: NONE (row can be anything)
+        
+        Parameter col: The left column of the rectangle
+        Precondition: NONE (col can be anything)
+        
+        Parameter height: The number of rows in the rectangle
+        Precondition: NONE (height can be anything)
+        
+        Parameter width: The number of columns in the rectangle
+        Precondition: NONE (width can be anything)
+        """
+        for value in (row,col,height,width):
+            if type(value) != int or value < 0:
+                return False
+        return row+height <= self.getHeight() and col+width <= self.getWidth()
+
+
+def frombytes(width, height, buf):
+    """
+    Returns a new Image for the given packed bytes.
+    
+    The bytes are three bytes (r,g,b) per pixel in row-major order, as 
+    returned by the method tobytes. The image stores them in a 
+    a6buffer.PackedBuffer. If buf is a writable array of bytes (such as a 
+    bytearray) the image uses it directly; otherwise the bytes are copied.
+    
+    Parameter width: The image width
+    Precondition: width is an int > 0
+    
+    Parameter height: The image height
+    Precondition: height is an int >= 0
+    
+    Parameter buf: The packed pixels
+    Precondition: buf is a bytes-like object of length 3*width*height
+    """
+    assert isinstance(width,int) and width > 0, repr(width)+' is not a valid width'
+    assert isinstance(height,int) and height >= 0, repr(height)+' is not a valid height'
+    buffer = a6buffer.PackedBuffer(buf)
+    assert len(buffer) == width*height, 'the data does not match the image size'
+    return _trusted_image(buffer,width)
+
+
+# RAW IMAGE FILES
+def save_raw(image, file):
+    """
+    Saves the given image to a raw image file.
+    
+    A raw image file is a short header (see RAW_HEADER) followed by the pixels
+    as packed bytes, three bytes (r,g,b) per pixel in row-major order. That is
+    exactly the layout of a PackedBuffer, so the file can be opened again by 
+    open_raw without decoding anything.
+    
+    Parameter image: The image to save
+    Precondition: image is an Image object
+    
+    Parameter file: The file to write
+    Precondition: file is a string (a path to a file)
+    """
+    assert isinstance(image,Image), repr(image)+' is not an image'
+    rows = (bytes(chain.from_iterable(image.getRow(row))) for row in range(image.getHeight()))
+    _write_raw(file,image.getWidth(),image.getHeight(),rows)
+
+
+def open_raw(file):
+    """
+    Returns a memory-mapped Image for the given raw image file.
+    
+    The image uses a MappedBuffer for storage, so this function returns 
+    immediately, no matter how large the image is. Pixels are only read from
+    the file as they are needed. Changes to the image are not saved to the 
+    file.
+    
+    Parameter file: The raw image file
+    Precondition: file is a path to a raw image file (see save_raw) of a 
+    non-empty image
+    """
+    with open(file,'rb') as handle:
+        header = handle.read(RAW_HEADER.size)
+    assert len(header) == RAW_HEADER.size, repr(file)+' is not a raw image file'
+    magic, width, height = RAW_HEADER.unpack(header)
+    assert magic == RAW_MAGIC, repr(file)+' is not a raw image file'
+    
+    buffer = a6buffer.MappedBuffer(file,RAW_HEADER.size)
+    assert len(buffer) == width*height, repr(file)+' is truncated'
+    return _trusted_image(buffer,width)
+
+
+def load_mapped(source, raw=None):
+    """
+    Returns a memory-mapped Image for the given image file.
+    
+    The first time this function is called on a file, it decodes the image 
+    and saves the pixels to a raw image file (see save_raw). After that, it 
+    just opens the raw file, which is instant. The raw file is decoded again 
+    if the image file is newer than it.
+    
+    Decoding requires PIL.
+    
+    Parameter source: The image file (e.g. a PNG file)
+    Precondition: source is a path to an image file
+    
+    Parameter raw: The raw image file to use (default source+'.raw')
+    Precondition: raw is a string or None
+    """
+    if raw is None:
+        raw = source+'.raw'
+    
+    if not os.path.isfile(raw) or os.path.getmtime(raw) < os.path.getmtime(source):
+        from PIL import Image as CoreImage
+        image = CoreImage.open(source)
+        image = image.convert("RGB")
+        _write_raw(raw,image.size[0],image.size[1],[image.tobytes()])
+    return open_raw(raw)
+
+
+def _write_raw(file, width, height, chunks):
+    """
+    Writes a raw image file from a sequence of packed byte chunks.
+    
+    The file is written under a temporary name and then renamed, so a reader
+    never sees a partially written file.
+    
+    Parameter file: The file to write
+    Precondition: file is a string (a path to a file)
+    
+    Parameter width: The image width
+    Precondition: width is an int >= 0
+    
+    Parameter height: The image height
+    Precondition: height is an int >= 0
+    
+    Parameter chunks: The pixels, as consecutive chunks of packed bytes
+    Precondition: chunks is an iterable of bytes objects, 3*width*height bytes
+    in total
+    """
+    temp = file+'.tmp'
+    with open(temp,'wb') as handle:
+        handle.write(RAW_HEADER.pack(RAW_MAGIC,width,height))
+        for chunk in chunks:
+            handle.write(chunk)
+    os.replace(temp,file)
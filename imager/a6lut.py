@@ -0,0 +1,317 @@
+"""
+Pointwise filters for the imager application.
+
+A pointwise filter changes each pixel on its own: the new color of a pixel
+only depends on its old color.  Inverting and monochromifying an image are
+both pointwise.  Computing such a filter pixel by pixel is slow in Python, as
+every pixel needs several float operations and a new tuple.
+
+The classes in this module describe a pointwise filter by lookup tables, which
+are computed once.  They then convert a whole image of packed pixels (see
+Image.tobytes) at a time, with bytes.translate or (if it is installed) NumPy.
+An object of these classes is a function from packed pixels to packed pixels,
+so it can be given to the method recolor in Image.
+
+Several filters in a row are combined with the function compose.  Where it can,
+compose makes a single lookup table for all of them, so the pixels are only
+looked up once.
+
+Aaron Baruch (amb565) Ilan Klimberg (idk7)
+10/17/2026
+"""
+import copy
+from fractions import Fraction
+from math import lcm
+import struct
+
+try:
+    import numpy
+except ImportError:     # NumPy is optional
+    numpy = None
+
+
+class Table(object):
+    """
+    A pointwise filter that changes each color channel on its own.
+
+    The filter is a table of 256 values for each channel.  A channel with value
+    v is changed to the value at position v of its table.  For example, the
+    table of every channel in the filter that inverts an image is 255-v.
+    """
+    # Attribute _tables: The tables for red, green and blue
+    # Invariant: _tables is a list of 3 bytes objects of length 256
+
+    def __init__(self, red, green=None, blue=None):
+        """
+        Initializes a filter from a function for each channel.
+
+        Each function is called once for every value 0..255, to make its table.
+
+        Parameter red: The function for the red channel
+        Precondition: red is a function from an int in 0..255 to an int in 0..255
+
+        Parameter green: The function for the green channel (red if None)
+        Precondition: green is None, or a function like red
+
+        Parameter blue: The function for the blue channel (green if None)
+        Precondition: blue is None, or a function like red
+        """
+        green = red if green is None else green
+        blue = green if blue is None else blue
+        self._tables = [bytes(map(function,range(256))) for function in (red,green,blue)]
+
+    def __call__(self, data):
+        """
+        Returns the converted pixels, as a bytes object.
+
+        If every channel has the same table, the pixels are converted in one
+        call of bytes.translate.  Otherwise each channel is converted with one
+        call.  Either way the pixels are never looked at in Python.
+
+        Parameter data: The packed pixels to convert
+        Precondition: data is a bytes-like object whose length is divisible by 3
+        """
+        data = bytes(data)
+        red, green, blue = self._tables
+        if red == green == blue:
+            return data.translate(red)
+
+        result = bytearray(len(data))
+        for channel in range(3):
+            result[channel::3] = data[channel::3].translate(self._tables[channel])
+        return bytes(result)
+
+    def then(self, other):
+        """
+        Returns a filter that applies this filter and then other.
+
+        The result is a single Table: the table of each channel is this table
+        looked up in the table of other.
+
+        Parameter other: The filter to apply second
+        Precondition: other is a Table
+        """
+        assert isinstance(other,Table), repr(other)+' is not a Table'
+        result = Table.__new__(Table)
+        result._tables = [first.translate(second) for (first, second) in zip(self._tables,other._tables)]
+        return result
+
+
+class Mixer(object):
+    """
+    A pointwise filter that mixes the color channels into a brightness.
+
+    The brightness of a pixel (r,g,b) is w0*r + w1*g + w2*b, for three weights.
+    Each channel of the new pixel is the brightness times a scale for that
+    channel, truncated to an int.  So monochromify uses the weights
+    (0.3,0.6,0.1) with the scales (1,1,1) for greyscale and (1,0.6,0.4) for
+    sepia.
+
+    The results are exactly those of Python evaluating
+
+        int(scale*(w0*r + w1*g + w2*b))
+
+    with floats, but they are computed with integers.  The weights (as written
+    in decimal) are fractions with a common denominator d, so the brightness
+    is q/d for the integer q = d*w0*r + d*w1*g + d*w2*b.  The new pixel for
+    each q is in a table.  The float brightness is never more than a tiny bit
+    off q/d, so it truncates to the same int, except when a channel lands
+    exactly on an int.  There, the float may be a tiny bit low (or not), so the
+    pixels with such a q (about one in ten, for monochromify) are computed with
+    floats instead.
+    """
+    # Attribute _weights: The weights of the channels in the brightness
+    # Invariant: _weights is a tuple of 3 floats (or ints) >= 0
+    #
+    # Attribute _scales: The scale of the brightness for each channel
+    # Invariant: _scales is a tuple of 3 floats (or ints) >= 0
+    #
+    # Attribute _factors: The integer weights (the weights times d)
+    # Invariant: _factors is a tuple of 3 ints >= 0
+    #
+    # Attribute _table: The new pixel for each q, as packed bytes
+    # Invariant: _table is a bytes object with 3 bytes for each possible q
+    #
+    # Attribute _exact: Whether the new pixel for each q is exact
+    # Invariant: _exact is a bytes object with one byte (1 or 0) for each q.
+    # It is 0 if the pixel must be computed with floats (a channel is an int 
+    # other than 0).
+    #
+    # Attribute _post: The filter applied after the brightness (see then)
+    # Invariant: _post is a Table, or None.  It is already part of _table, so
+    # it is only applied to the pixels computed with floats.
+
+    # The largest common denominator of the weights, times that of the scales
+    LIMIT = 1000
+
+    def __init__(self, weights, scales=(1,1,1)):
+        """
+        Initializes a filter from the weights of the brightness.
+
+        Parameter weights: The weights of the red, green and blue channels
+        Precondition: weights is a tuple of 3 floats (or ints) >= 0, with few
+        decimal places (see LIMIT)
+
+        Parameter scales: The scale of the brightness for each new channel
+        Precondition: scales is a tuple of 3 floats (or ints) >= 0, with few
+        decimal places (see LIMIT). Scaling the brightness of white must not 
+        give more than 255.
+        """
+        assert type(weights) == tuple and len(weights) == 3, repr(weights)+' is not 3 weights'
+        assert type(scales) == tuple and len(scales) == 3, repr(scales)+' is not 3 scales'
+        weights1 = [Fraction(repr(weight)) for weight in weights]
+        scales1 = [Fraction(repr(scale)) for scale in scales]
+        assert min(weights1+scales1) >= 0, 'the weights and scales cannot be negative'
+        denom = lcm(*[weight.denominator for weight in weights1])
+        assert denom*lcm(*[scale.denominator for scale in scales1]) <= self.LIMIT, \
+            'the weights and scales have too many decimal places'
+        assert max(scales1)*sum(weights1)*255 < 256, 'the brightness is too large'
+
+        self._weights = weights
+        self._scales = scales
+        self._factors = tuple(int(weight*denom) for weight in weights1)
+        table = bytearray()
+        exact = bytearray()
+        for q in range(255*sum(self._factors)+1):
+            values = [scale*q/denom for scale in scales1]
+            table.extend(int(value) for value in values)
+            exact.append(all(value.denominator != 1 or value == 0 for value in values))
+        self._table = bytes(table)
+        self._exact = bytes(exact)
+        self._post = None
+
+    def __call__(self, data):
+        """
+        Returns the converted pixels, as a bytes object.
+
+        With NumPy, every pixel is converted at once.  Without it, each distinct
+        color is converted just once.
+
+        Parameter data: The packed pixels to convert
+        Precondition: data is a bytes-like object whose length is divisible by 3
+        """
+        if numpy is not None:
+            return self._convertArray(data)
+
+        colors = {}
+        for color in set(struct.iter_unpack('3B',data)):
+            colors[color] = self._convert(color)
+        return b''.join(map(colors.__getitem__,struct.iter_unpack('3B',data)))
+
+    def then(self, other):
+        """
+        Returns a filter that applies this filter and then other.
+
+        The result is a Mixer whose table has other applied to each new pixel.
+        So sepia tone followed by inverting, for example, is still a single
+        lookup for each pixel.
+
+        Parameter other: The filter to apply second
+        Precondition: other is a Table
+        """
+        assert isinstance(other,Table), repr(other)+' is not a Table'
+        result = copy.copy(self)
+        table = bytearray(self._table)
+        for channel in range(3):
+            table[channel::3] = self._table[channel::3].translate(other._tables[channel])
+        result._table = bytes(table)
+        result._post = other if self._post is None else self._post.then(other)
+        return result
+
+    # HELPER METHODS
+    def _convert(self, color):
+        """
+        Returns the new pixel for the given color, as packed bytes.
+
+        Parameter color: The color to convert
+        Precondition: color is a 3-element tuple (r,g,b) of ints in 0..255
+        """
+        q = self._factors[0]*color[0]+self._factors[1]*color[1]+self._factors[2]*color[2]
+        if self._exact[q]:
+            return self._table[3*q:3*q+3]
+        w0, w1, w2 = self._weights
+        brightness = w0*color[0] + w1*color[1] + w2*color[2]
+        result = bytes(int(scale*brightness) for scale in self._scales)
+        return result if self._post is None else self._post(result)
+
+    def _convertArray(self, data):
+        """
+        Returns the converted pixels, using NumPy.
+
+        Parameter data: The packed pixels to convert
+        Precondition: data is a bytes-like object whose length is divisible by 3
+        """
+        array = numpy.frombuffer(data,dtype=numpy.uint8).reshape(-1,3)
+        q = array.dot(numpy.array(self._factors))
+        table = numpy.frombuffer(self._table,dtype=numpy.uint8).reshape(-1,3)
+        result = table[q]
+
+        # Redo the pixels that land on an int with floats
+        exact = numpy.frombuffer(self._exact,dtype=numpy.uint8)
+        inexact = numpy.flatnonzero(exact[q] == 0)
+        if len(inexact) > 0:
+            pixels = array[inexact].astype(numpy.float64)
+            w0, w1, w2 = self._weights
+            brightness = w0*pixels[:,0] + w1*pixels[:,1] + w2*pixels[:,2]
+            for channel in range(3):
+                result[inexact,channel] = self._scales[channel]*brightness
+            if self._post is not None:
+                pixels = numpy.ascontiguousarray(result[inexact])
+                pixels = numpy.frombuffer(self._post(pixels.tobytes()),dtype=numpy.uint8)
+                result[inexact] = pixels.reshape(-1,3)
+        return result.tobytes()
+
+
+class Chain(object):
+    """
+    A pointwise filter that applies several filters, one after the other.
+
+    This is what compose returns when the filters cannot be combined into one 
+    table.  The pixels are still converted in memory, so an image is only read
+    and written once (see the method recolor in Image).
+    """
+    # Attribute _filters: The filters to apply, in order
+    # Invariant: _filters is a nonempty list of pointwise filters
+
+    def __init__(self, filters):
+        """
+        Initializes a filter applying the given filters in order.
+
+        Parameter filters: The filters to apply
+        Precondition: filters is a nonempty list of pointwise filters
+        """
+        assert len(filters) > 0, 'a chain needs a filter'
+        self._filters = list(filters)
+
+    def __call__(self, data):
+        """
+        Returns the converted pixels, as a bytes object.
+
+        Parameter data: The packed pixels to convert
+        Precondition: data is a bytes-like object whose length is divisible by 3
+        """
+        for function in self._filters:
+            data = function(data)
+        return data
+
+
+def compose(*filters):
+    """
+    Returns a pointwise filter that applies the given filters in order.
+
+    A Table after a Table or a Mixer is combined with it (see the method then
+    in those classes), so the result usually needs just one lookup for each 
+    pixel.  Any other filters are applied one after the other (see Chain).
+
+    Parameter filters: The filters to apply
+    Precondition: filters are one or more pointwise filters (functions from
+    packed pixels to packed pixels, such as Table and Mixer objects)
+    """
+    assert len(filters) > 0, 'compose needs a filter'
+    result = []
+    for function in filters:
+        if len(result) > 0 and isinstance(function,Table) and isinstance(result[-1],(Table,Mixer)):
+            result[-1] = result[-1].then(function)
+        else:
+            result.append(function)
+    return result[0] if len(result) == 1 else Chain(result)
@@ -0,0 +1,474 @@
+"""
+Parallel filters for the imager application.
+
+The filters in a6filter run in one thread, so they only ever use one core.  The
+pools in this module run some of them on several cores instead, with each
+worker computing its own band of rows.
+
+The class ProcessPool uses processes.  The image is packed (see Image.tobytes)
+into shared memory, which every process can see without copying it.  Each
+process writes its band straight into the shared memory.  At the end the result
+is copied once, into a bytearray that the image keeps as its pixels (see
+Image.setBytes), as shared memory cannot outlive the edit.  The class ThreadPool uses threads, which share
+the image already.  Threads only run at the same time while NumPy is working
+on an array (it lets go of the GIL), so they need NumPy to help, but they cost
+much less to start and to feed.
+
+How the rows are split depends on the edit (see KERNELS):
+
+    POINTWISE   Each output row only needs the same input row, so the rows are
+                converted in place (invert, monochromify and vignette).
+    BLOCKS      Each band must be made of whole blocks, so the bands are a
+                multiple of the block size (pixellate).
+    HALO        Each output row needs the input rows around it, so each band
+                reads a few more rows than it writes (blur).
+    GATHER      Each output row is gathered from anywhere in the input, so the
+                output goes to a second buffer (rotations and reflections).
+
+Aaron Baruch (amb565) Ilan Klimberg (idk7)
+10/17/2026
+"""
+from itertools import chain
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+import os
+import traceback
+import a6image
+import a6filter
+import a6area
+
+
+# The ways to split an edit into bands
+POINTWISE = 'pointwise'
+BLOCKS    = 'blocks'
+HALO      = 'halo'
+GATHER    = 'gather'
+
+# The edits that can be run in parallel, and how to split them
+KERNELS = {'invert': POINTWISE, 'monochromify': POINTWISE, 'vignette': POINTWISE,
+           'pixellate': BLOCKS, 'blur': HALO,
+           'transpose': GATHER, 'reflectHori': GATHER, 'reflectVert': GATHER,
+           'rotateLeft': GATHER, 'rotateRight': GATHER}
+
+
+class BandPool(object):
+    """
+    The base class of the pools in this module.
+
+    A pool runs the edits in KERNELS on bands of rows of an image, with one
+    worker for each band at a time.  The subclasses decide what the workers
+    are (processes or threads) and where the pixels are put so that every
+    worker can see them.  The workers are started the first time an edit is
+    run, and they are kept until close is called, so that many edits can share
+    them.  A pool is given to the method setExecutor in a6filter.Filter.
+
+    The results are exactly those of the methods in Filter.
+    """
+    # Attribute _workers: The number of workers
+    # Invariant: _workers is an int > 0
+    #
+    # Attribute _pool: The workers, once they are started
+    # Invariant: _pool is a pool of the subclass, or None
+
+    # The number of bands for each worker, so a slow band does not hold up the rest
+    BANDS = 4
+
+    # The largest band, in bytes (no limit if None)
+    CHUNK = None
+
+    def __init__(self, workers=None):
+        """
+        Initializes a pool with the given number of workers.
+
+        Parameter workers: The number of workers (one for each core if None)
+        Precondition: workers is None or an int > 0
+        """
+        assert workers is None or (type(workers) == int and workers > 0), \
+            repr(workers)+' is not a valid number of workers'
+        self._workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pool = None
+
+    def getWorkers(self):
+        """
+        Returns the number of workers in this pool.
+        """
+        return self._workers
+
+    def supports(self, name):
+        """
+        Returns True if the edit name can be run by this pool.
+
+        Parameter name: The name of an edit method
+        Precondition: name is a string
+        """
+        return name in KERNELS
+
+    def run(self, image, name, args):
+        """
+        Applies the edit name to image, using every worker in the pool.
+
+        The image is changed in place, just as by the method of Filter with the
+        given name.  Afterwards it stores its pixels in a a6buffer.PackedBuffer
+        or a NumPy array (or in greyscale mode, after a greyscale monochromify).
+
+        Parameter image: The image to edit
+        Precondition: image is an Image object
+
+        Parameter name: The name of the edit method
+        Precondition: name is a key of KERNELS
+
+        Parameter args: The arguments of the edit method
+        Precondition: args is a tuple of valid arguments for that method
+        """
+        assert self.supports(name), repr(name)+' cannot be run in parallel'
+        if len(image) == 0:
+            return
+        kind = KERNELS[name]
+        width = image.getWidth()
+        height = image.getHeight()
+        orient = 0
+        outwidth = width
+        if kind == GATHER:
+            # The workers read the settled pixels, so only the orientation of
+            # this edit is applied to them, not any orientation still pending
+            probe = a6image.Image([(0,0,0)],1)
+            probe.reorient(name)
+            orient = probe.getOrientation()
+            outwidth = height if orient & a6image.Image.TRANSPOSED else width
+        step = args[0] if kind == BLOCKS else 1
+
+        tasks = [(name,args,width,height,orient,start,stop)
+                 for (start, stop) in self._bands(len(image)//outwidth,step,3*outwidth)]
+        result = self._execute(image,kind,tasks)
+        if not result is None:
+            image.setBytes(result,outwidth)
+        if name == 'monochromify' and args == (False,):
+            image.compact()
+
+    def close(self):
+        """
+        Stops the workers in this pool.
+
+        The pool can still be used; the workers are started again when needed.
+        """
+        pass
+
+    # HELPER METHODS
+    def _bands(self, height, step, span):
+        """
+        Returns the bands of rows to compute, as a list of pairs (start, stop).
+
+        A band is the rows start..stop-1.  There are about BANDS bands for each
+        worker, unless that makes a band larger than CHUNK bytes, in which case
+        there are more.  Each band (but the last) is a multiple of step rows.
+
+        Parameter height: The number of rows to compute
+        Precondition: height is an int > 0
+
+        Parameter step: The number of rows that each band is a multiple of
+        Precondition: step is an int > 0
+
+        Parameter span: The number of bytes in a row
+        Precondition: span is an int > 0
+        """
+        size = -(-height//(self._workers*self.BANDS))
+        if not self.CHUNK is None:
+            size = min(size,max(self.CHUNK//span,1))
+        size = -(-size//step)*step
+        return [(start,min(start+size,height)) for start in range(0,height,size)]
+
+    def _execute(self, image, kind, tasks):
+        """
+        Computes every band of an edit, returning the packed result.
+
+        Each task is the arguments of the function _compute, after the buffer.
+        The result is None if the bands were written straight into image.
+
+        Parameter image: The image to edit
+        Precondition: image is an Image object
+
+        Parameter kind: How the edit is split into bands
+        Precondition: kind is a value of KERNELS
+
+        Parameter tasks: The bands to compute
+        Precondition: tasks is a list of tuples of arguments of _compute
+        """
+        raise NotImplementedError('_execute is defined by each kind of pool')
+
+
+class ProcessPool(BandPool):
+    """
+    A pool of processes running the edits in KERNELS on bands of an image.
+
+    The image is packed into shared memory for each edit, and taken back once
+    every band is done.  The processes do not share the GIL, so this is the
+    pool to use when the edits run in pure Python (without NumPy).
+    """
+    # Attribute _pool: The processes, once they are started
+    # Invariant: _pool is a multiprocessing.pool.Pool, or None
+
+    def __init__(self, processes=None):
+        """
+        Initializes a pool with the given number of processes.
+
+        Parameter processes: The number of processes (one for each core if None)
+        Precondition: processes is None or an int > 0
+        """
+        assert processes is None or (type(processes) == int and processes > 0), \
+            repr(processes)+' is not a valid number of processes'
+        BandPool.__init__(self,processes)
+
+    def getProcesses(self):
+        """
+        Returns the number of processes in this pool.
+        """
+        return self._workers
+
+    def close(self):
+        """
+        Stops the processes in this pool.
+
+        The pool can still be used; the processes are started again when needed.
+        """
+        if not self._pool is None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    # HELPER METHODS
+    def _getPool(self):
+        """
+        Returns the processes of this pool, starting them if needed.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._workers)
+        return self._pool
+
+    def _execute(self, image, kind, tasks):
+        """
+        Computes every band of an edit in shared memory, returning the result.
+
+        The pixels are copied straight from the image into the shared memory,
+        and the result is copied straight out into the bytearray returned,
+        which the image then uses as is.  See BandPool._execute for the
+        parameters.
+        """
+        size = 3*len(image)
+        memory = shared_memory.SharedMemory(create=True,size=2*size if kind in (HALO,GATHER) else size)
+        try:
+            memory.buf[:size] = image.getBuffer()
+            self._getPool().starmap(_work,[(memory.name,)+task for task in tasks])
+            offset = size if kind in (HALO,GATHER) else 0
+            return bytearray(memory.buf[offset:offset+size])
+        finally:
+            memory.close()
+            memory.unlink()
+
+
+class ThreadPool(BandPool):
+    """
+    A pool of threads running the edits in KERNELS on bands of an image.
+
+    Threads share the image, so nothing is copied to start an edit.  With
+    NumPy, a POINTWISE or BLOCKS edit writes each band straight into the NumPy
+    view of the image (see Image.asarray); otherwise the bands are written into
+    a packed copy that the image then takes.  Only one thread runs Python code
+    at a time, but NumPy lets go of the GIL while it works on an array, so the
+    vectorized parts of the edits (vignette factors, mixing colors and summed
+    area tables) run on every core at once.  This is the pool to use with
+    NumPy; without it, a ProcessPool is faster.
+
+    The bands are at most CHUNK bytes, so the arrays made for a band stay in
+    the cache of the core working on it.
+    """
+    # Attribute _pool: The threads, once they are started
+    # Invariant: _pool is a concurrent.futures.ThreadPoolExecutor, or None
+
+    # The largest band, in bytes
+    CHUNK = 1 << 18
+
+    def __init__(self, threads=None):
+        """
+        Initializes a pool with the given number of threads.
+
+        Parameter threads: The number of threads (one for each core if None)
+        Precondition: threads is None or an int > 0
+        """
+        assert threads is None or (type(threads) == int and threads > 0), \
+            repr(threads)+' is not a valid number of threads'
+        BandPool.__init__(self,threads)
+
+    def getThreads(self):
+        """
+        Returns the number of threads in this pool.
+        """
+        return self._workers
+
+    def close(self):
+        """
+        Stops the threads in this pool.
+
+        The pool can still be used; the threads are started again when needed.
+        """
+        if not self._pool is None:
+            self._pool.shutdown()
+            self._pool = None
+
+    # HELPER METHODS
+    def _getPool(self):
+        """
+        Returns the threads of this pool, starting them if needed.
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self._workers,thread_name_prefix='a6parallel')
+        return self._pool
+
+    def _execute(self, image, kind, tasks):
+        """
+        Computes every band of an edit with the threads, in place if possible.
+
+        See BandPool._execute for the parameters.
+        """
+        if kind == POINTWISE:
+            # Each thread reads the cached vignette terms, so they are made first
+            a6filter._kernel(*tasks[0][:4])
+        pixels = image.asarray() if kind in (POINTWISE,BLOCKS) else None
+        if pixels is None:
+            size = 3*len(image)
+            result = bytearray(2*size if kind in (HALO,GATHER) else size)
+            result[:size] = image.getBuffer()
+            buffer = memoryview(result)
+        else:
+            result = None
+            buffer = memoryview(pixels.reshape(-1))
+        # Listing the results raises the error of any band that failed
+        list(self._getPool().map(lambda task: _compute(buffer,*task),tasks))
+        buffer.release()
+        if result is None or kind in (POINTWISE,BLOCKS):
+            return result
+        del result[:size]
+        return result
+
+
+# HELPER FUNCTIONS
+def _work(name, edit, args, width, height, orient, start, stop):
+    """
+    Computes a band of rows of an edit, in shared memory.
+
+    This is the function run by each process.  The shared memory holds the
+    packed pixels of the image, followed by room for the output if the edit is
+    HALO or GATHER (see KERNELS).
+
+    Parameter name: The name of the shared memory
+    Precondition: name is a string
+
+    Parameter edit: The name of the edit method
+    Precondition: edit is a key of KERNELS
+
+    Parameter args: The arguments of the edit method
+    Precondition: args is a tuple of valid arguments for that method
+
+    Parameter width: The width of the image
+    Precondition: width is an int > 0
+
+    Parameter height: The height of the image
+    Precondition: height is an int > 0
+
+    Parameter orient: The orientation of the output, for a GATHER edit
+    Precondition: orient is an int in 0..7 (see Image.reorient)
+
+    Parameter start: The first row of the band (in the output)
+    Precondition: start is an int >= 0
+
+    Parameter stop: The row after the band (in the output)
+    Precondition: stop is an int > start
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        _compute(memory.buf,edit,args,width,height,orient,start,stop)
+    except Exception as error:
+        # The frames of the error hold views of the memory, which would stop it
+        # from closing (and hide the error behind a BufferError)
+        traceback.clear_frames(error.__traceback__)
+        raise
+    finally:
+        memory.close()
+
+
+def _compute(buffer, edit, args, width, height, orient, start, stop):
+    """
+    Computes a band of rows of an edit, in the given buffer.
+
+    See _work for the parameters, except for buffer.  All of the views of the
+    buffer made here are gone when this function returns, so that the shared
+    memory can be closed.
+
+    Parameter buffer: The shared memory (or the memory of a ThreadPool)
+    Precondition: buffer is a writable memoryview of bytes holding the packed
+    pixels, followed by room for the output if the edit is HALO or GATHER
+    """
+    kind = KERNELS[edit]
+    size = 3*width*height
+    source = buffer[:size]
+    target = buffer[size:2*size] if kind in (HALO,GATHER) else source
+
+    if kind == POINTWISE:
+        stage = a6filter._kernel(edit,args,width,height)
+        band = slice(3*start*width,3*stop*width)
+        target[band] = a6filter._run_stages([stage],bytes(source[band]),start*width,stop*width)
+    elif kind == BLOCKS:
+        band = a6image.frombytes(width,stop-start,target[3*start*width:3*stop*width])
+        a6filter._pixellate(band,args[0])
+    elif kind == HALO:
+        radius = args[0]
+        top = max(start-radius,0)
+        bottom = min(stop+radius,height)
+        band = a6image.frombytes(width,bottom-top,bytes(source[3*top*width:3*bottom*width]))
+        pixels = a6area.Integral(band).blur(radius)[(start-top)*width:(stop-top)*width]
+        target[3*start*width:3*stop*width] = bytes(chain.from_iterable(pixels))
+    else:
+        span = 3*(height if orient & a6image.Image.TRANSPOSED else width)
+        for row in range(start,stop):
+            target[row*span:(row+1)*span] = _gather_row(source,width,height,orient,row)
+
+
+def _gather_row(source, width, height, orient, row):
+    """
+    Returns a row of a reoriented image, as packed bytes.
+
+    The row is gathered from the packed pixels of the image, as it would be
+    found by getPixel after reorienting the image (see Image.reorient).  A
+    transposed row is a column of the image, which is sliced out one channel
+    at a time.
+
+    Parameter source: The packed pixels of the image
+    Precondition: source is a bytes-like object of 3*width*height bytes
+
+    Parameter width: The width of the image
+    Precondition: width is an int > 0
+
+    Parameter height: The height of the image
+    Precondition: height is an int > 0
+
+    Parameter orient: The orientation
+    Precondition: orient is an int in 0..7
+
+    Parameter row: The row of the reoriented image
+    Precondition: row is an int >= 0, less than its height
+    """
+    if orient & a6image.Image.TRANSPOSED:
+        col = width-1-row if orient & a6image.Image.FLIP_COLS else row
+        result = bytearray(3*height)
+        for channel in range(3):
+            result[channel::3] = bytes(source[3*col+channel::3*width])
+        reverse = orient & a6image.Image.FLIP_ROWS
+    else:
+        stored = height-1-row if orient & a6image.Image.FLIP_ROWS else row
+        result = bytearray(source[3*stored*width:3*(stored+1)*width])
+        reverse = orient & a6image.Image.FLIP_COLS
+    if reverse:
+        # Reversing the bytes also reverses the channels of each pixel
+        result.reverse()
+        result[0::3], result[2::3] = result[2::3], result[0::3]
+    return result
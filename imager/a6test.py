@@ -12,9 +12,18 @@ Date:   October 29, 2019
 """
 import introcs
 import a6image
+import a6buffer
+import a6editor
 import a6filter
+import a6draw
+import a6area
+import a6parallel
+import a6lut
 import a6encode
+from itertools import chain
 import traceback
+import io
+import os
 
 # Helper to read the test images
 
@@ -95,6 +104,11 @@ def test_pixel_list():
     introcs.assert_true(a6image._is_pixel_list([(0,244,255),(100,64,255),(50,3,250)]))
     introcs.assert_false(a6image._is_pixel_list([(0,244,255),(100,'64',255),(50,3,250)]))
     introcs.assert_false(a6image._is_pixel_list([(0,244,255),(100,-64,255),(50,3,250)]))
+    introcs.assert_true(a6image._is_pixel_list([]))
+    introcs.assert_false(a6image._is_pixel_list([(0,244,255),(0,244)]))
+    introcs.assert_false(a6image._is_pixel_list([(1,244,255),(1.0,244,255)]))
+    introcs.assert_false(a6image._is_pixel_list([(True,244,255)]))
+    introcs.assert_false(a6image._is_pixel_list([(0,244,256)]))
 
 
 def test_image_init():
@@ -252,6 +266,528 @@ def test_image_str():
     introcs.assert_equals(str3,str(image))
     image.setWidth(1)
     introcs.assert_equals(str4,str(image))
+    
+    # Large images are cut off
+    image.setWidth(2)
+    stream = io.StringIO()
+    image.dump(stream,3)
+    introcs.assert_equals('[['+str(p[0])+', '+str(p[1])+'],\n['+str(p[2])+', ...],\n...]',stream.getvalue())
+    stream = io.StringIO()
+    image.dump(stream,4)
+    introcs.assert_equals('[['+str(p[0])+', '+str(p[1])+'],\n['+str(p[2])+', '+str(p[3])+'],\n...]',stream.getvalue())
+    stream = io.StringIO()
+    image.dump(stream)
+    introcs.assert_equals(str1,stream.getvalue())
+    introcs.assert_equals('',str(a6image.Image([],1)))
+
+
+def test_image_bytes():
+    """
+    Tests the packed byte methods tobytes and getBuffer, and the function frombytes
+    """
+    print('Testing image byte methods')
+    p = [(255, 64, 0),(0, 255, 64),(64, 0, 255),(64, 255, 128),(128, 64, 255),(255, 128, 64)]
+    packed = bytes([255,64,0,0,255,64,64,0,255,64,255,128,128,64,255,255,128,64])
+    
+    for data in [p[:], a6buffer.PackedBuffer(p), a6buffer.TiledBuffer(p,3,2)]:
+        image = a6image.Image(data,3)
+        introcs.assert_equals(packed,image.tobytes())
+        view = image.getBuffer()
+        introcs.assert_true(view.readonly)
+        introcs.assert_equals(packed,bytes(view))
+    
+    # Packed images share their bytes with the view
+    image = a6image.frombytes(2,3,bytearray(packed))
+    introcs.assert_equals(2,image.getWidth())
+    introcs.assert_equals(p,image.getData())
+    view  = image.getBuffer()
+    image[0] = (1,2,3)
+    introcs.assert_equals([1,2,3],list(view[:3]))
+    introcs.assert_equals(image.tobytes(),a6image.frombytes(2,3,image.getBuffer()).tobytes())
+
+
+def test_image_copy():
+    """
+    Tests the (copy-on-write) copy method in class Image
+    """
+    print('Testing image copy method')
+    p = [(255,0,0),(0,255,0),(0,0,255),(0,255,255),(255,0,255),(255,255,0)]
+    rgb = (64,128,192)
+    
+    for data in [p[:], a6buffer.PackedBuffer(p)]:
+        image = a6image.Image(data,3)
+        copy  = image.copy()
+        introcs.assert_equals(id(image._data),id(copy._data))
+        introcs.assert_equals(p,copy.getData())
+        
+        # Writing to the copy copies the data once
+        copy[1] = rgb
+        introcs.assert_not_equals(id(image._data),id(copy._data))
+        introcs.assert_equals(rgb,copy[1])
+        introcs.assert_equals(p[1],image[1])
+        
+        # Writing to the original does not change the copy
+        copy  = image.copy()
+        image.fill((0,0,2,1),rgb)
+        introcs.assert_equals(rgb,image.getPixel(1,0))
+        introcs.assert_equals(p[3],copy.getPixel(1,0))
+        
+        # Changing the width does not copy
+        copy  = image.copy()
+        copy.setWidth(2)
+        introcs.assert_equals(id(image._data),id(copy._data))
+        introcs.assert_equals(3,image.getWidth())
+        introcs.assert_equals(image[3],copy.getPixel(1,1))
+    
+    # An edit that does not write does not copy
+    editor = a6filter.Filter(a6image.Image(p[:],3))
+    editor.increment()
+    editor.increment()
+    introcs.assert_equals(id(editor.getOriginal()._data),id(editor.getCurrent()._data))
+    editor.getCurrent()[0] = rgb
+    introcs.assert_equals(p[0],editor.getOriginal()[0])
+    editor.undo()
+    introcs.assert_equals(p[0],editor.getCurrent()[0])
+
+
+def test_packed_buffer():
+    """
+    Tests the class PackedBuffer as the storage for an Image
+    """
+    print('Testing packed pixel storage')
+    p = [(255,0,0),(0,255,0),(0,0,255),(0,255,255),(255,0,255),(255,255,0)]
+    rgb = (64,128,192)
+    
+    buffer = a6buffer.PackedBuffer(p)
+    introcs.assert_equals(6,len(buffer))
+    introcs.assert_equals(18,len(buffer.tobytes()))
+    introcs.assert_equals(p,buffer[:])
+    introcs.assert_equals(p,list(buffer))
+    
+    image = a6image.Image(buffer,2)
+    introcs.assert_equals(p,image.getData())
+    introcs.assert_equals(3,image.getHeight())
+    for n in range(6):
+        introcs.assert_equals(p[n],image[n])
+        introcs.assert_equals(p[n],image.getPixel(n // 2, n % 2))
+    
+    image.setPixel(2,1,rgb)
+    introcs.assert_equals(rgb,image.getPixel(2,1))
+    introcs.assert_equals(rgb,image[5])
+    image[0] = rgb
+    introcs.assert_equals(rgb,image.getPixel(0,0))
+    
+    copy = image.copy()
+    introcs.assert_true(isinstance(copy._data,a6buffer.PackedBuffer))
+    copy[1] = rgb
+    introcs.assert_equals(p[1],image[1])
+    
+    # Packed bytes are used directly
+    data = bytearray(18)
+    image = a6image.Image(a6buffer.PackedBuffer(data),3)
+    image[1] = rgb
+    introcs.assert_equals(bytearray([0,0,0,64,128,192]+[0]*12),data)
+    
+    introcs.assert_error(a6buffer.PackedBuffer,bytes(4), message='PackedBuffer does not enforce the precondition on data')
+    introcs.assert_error(image.__setitem__,1,(0,0,'255'), message='__setitem__ does not enforce the precondition on pixel value')
+    introcs.assert_error(image.__setitem__,1,(0,0,256),   message='__setitem__ does not enforce the precondition on pixel value')
+
+
+def test_palette_buffer():
+    """
+    Tests the classes PaletteBuffer and GreyBuffer, and the storage modes of Image
+    """
+    print('Testing palette and greyscale storage')
+    p = [(255,0,0),(0,255,0),(255,0,0),(0,0,255),(0,255,0),(255,0,0)]
+    g = [(0,0,0),(64,64,64),(128,128,128),(64,64,64)]
+    rgb = (64,128,192)
+    
+    buffer = a6buffer.PaletteBuffer(p)
+    introcs.assert_equals(6,len(buffer))
+    introcs.assert_equals([p[0],p[1],p[3]],buffer.getPalette())
+    introcs.assert_equals(p,buffer[:])
+    introcs.assert_equals(p[1:5:2],buffer[1:5:2])
+    introcs.assert_equals(p,list(buffer))
+    introcs.assert_equals(a6buffer.PackedBuffer(p).tobytes(),buffer.tobytes())
+    
+    # New colors are added to the palette
+    image = a6image.Image(buffer,2)
+    introcs.assert_equals('P',image.getMode())
+    image.setPixel(1,1,rgb)
+    introcs.assert_equals(rgb,image[3])
+    introcs.assert_equals(4,len(buffer.getPalette()))
+    copy = image.copy()
+    copy.fill((0,0,1,2),(1,2,3))
+    introcs.assert_equals(p[:2],image.getRow(0))
+    introcs.assert_equals(4,len(buffer.getPalette()))
+    
+    # A full palette changes to RGB storage
+    image = a6image.Image(a6buffer.PaletteBuffer([(0,0,0)]*2,[(0,0,n) for n in range(256)]),1)
+    image[1] = rgb
+    introcs.assert_equals('RGB',image.getMode())
+    introcs.assert_equals([(0,0,0),rgb],image.getData())
+    
+    # Greyscale storage only holds greys
+    buffer = a6buffer.GreyBuffer(g)
+    introcs.assert_equals(bytes([0,0,0,64,64,64,128,128,128,64,64,64]),buffer.tobytes())
+    introcs.assert_equals(g,a6buffer.GreyBuffer(bytes([0,64,128,64]))[:])
+    image = a6image.Image(buffer,2)
+    introcs.assert_equals('L',image.getMode())
+    image[0] = (9,9,9)
+    introcs.assert_equals('L',image.getMode())
+    image.setRow(1,[(1,1,1),rgb])
+    introcs.assert_equals('RGB',image.getMode())
+    introcs.assert_equals([(9,9,9),(64,64,64),(1,1,1),rgb],image.getData())
+    
+    # Compacting picks the smallest mode
+    introcs.assert_equals('L',a6image.Image(g[:],2).compact())
+    introcs.assert_equals('P',a6image.Image(p[:],3).compact())
+    image = a6image.Image([(n,0,0) for n in range(256)]+[rgb],1)
+    introcs.assert_equals('RGB',image.compact())
+    image = a6image.Image(p[:],3)
+    image.compact()
+    introcs.assert_equals(p,image.getData())
+    
+    # Array views have three channels
+    if not a6buffer.numpy is None:
+        image = a6image.Image(a6buffer.GreyBuffer(g),2)
+        introcs.assert_equals((2,2,3),image.asarray().shape)
+        introcs.assert_equals('RGB',image.getMode())
+
+
+def test_array_buffer():
+    """
+    Tests the class ArrayBuffer and the method asarray in class Image
+    """
+    print('Testing NumPy pixel storage')
+    if a6buffer.numpy is None:
+        print('NumPy is not installed; skipping these tests')
+        return
+    
+    p = [(255,0,0),(0,255,0),(0,0,255),(0,255,255),(255,0,255),(255,255,0)]
+    rgb = (64,128,192)
+    
+    image = a6image.Image(a6buffer.ArrayBuffer(p),2)
+    introcs.assert_equals(p,image.getData())
+    for n in range(6):
+        introcs.assert_equals(p[n],image[n])
+        introcs.assert_equals(p[n],image.getPixel(n // 2, n % 2))
+    image.setPixel(2,1,rgb)
+    introcs.assert_equals(rgb,image[5])
+    introcs.assert_true(type(image[5][0]) == int)
+    
+    # The array is a view, not a copy
+    array = image.asarray()
+    introcs.assert_equals((3,2,3),array.shape)
+    array[0,1] = rgb
+    introcs.assert_equals(rgb,image[1])
+    
+    # Packed storage has a view too, but a pixel list does not
+    image = a6image.Image(a6buffer.PackedBuffer(p),3)
+    array = image.asarray()
+    introcs.assert_equals((2,3,3),array.shape)
+    array[1,2] = rgb
+    introcs.assert_equals(rgb,image[5])
+    introcs.assert_equals(None,a6image.Image(p,3).asarray())
+
+
+def test_image_bulk():
+    """
+    Tests the row and region access methods in class Image
+    """
+    print('Testing image row and region methods')
+    p = [(255,0,0),(0,255,0),(0,0,255),(0,255,255),(255,0,255),(255,255,0)]
+    rgb1 = (255,255,255)
+    rgb2 = (64,128,192)
+    
+    for data in [p[:], a6buffer.PackedBuffer(p)]:
+        image = a6image.Image(data,3)
+        introcs.assert_equals(p[:3],image.getRow(0))
+        introcs.assert_equals(p[3:],image.getRow(1))
+        image.setRow(0,[rgb1,rgb2,rgb1])
+        introcs.assert_equals([rgb1,rgb2,rgb1],image.getRow(0))
+        introcs.assert_equals(p[3:],image.getRow(1))
+        
+        introcs.assert_equals([rgb2,rgb1,p[4],p[5]],image.getRegion(0,1,2,2))
+        introcs.assert_equals([],image.getRegion(1,1,0,2))
+        image.setRegion(0,1,2,2,[p[0],p[1],p[2],p[3]])
+        introcs.assert_equals([rgb1,p[0],p[1],p[3],p[2],p[3]],image.getData())
+        
+        image.fill((0,0,2,1),rgb2)
+        introcs.assert_equals([rgb2,p[0],p[1],rgb2,p[2],p[3]],image.getData())
+        image.fill((0,1,1,2),rgb1)
+        introcs.assert_equals([rgb2,rgb1,rgb1,rgb2,p[2],p[3]],image.getData())
+        
+        # Test enforcement
+        introcs.assert_error(image.getRow, 2,   message='getRow does not enforce the precondition on row value')
+        introcs.assert_error(image.setRow, 0, p[:2], message='setRow does not enforce the precondition on pixels length')
+        introcs.assert_error(image.setRow, 0, [rgb1,rgb1,(0,0,'255')], message='setRow does not enforce the precondition on pixels')
+        introcs.assert_error(image.getRegion, 1, 1, 2, 1, message='getRegion does not enforce the precondition on height')
+        introcs.assert_error(image.getRegion, 0, 2, 1, 2, message='getRegion does not enforce the precondition on width')
+        introcs.assert_error(image.setRegion, 0, 0, 1, 2, p[:3], message='setRegion does not enforce the precondition on pixels')
+        introcs.assert_error(image.fill, (0,0,3,1), rgb1, message='fill does not enforce the precondition on rect')
+        introcs.assert_error(image.fill, (0,0,1,1), (0,0,256), message='fill does not enforce the precondition on pixel')
+
+
+def test_mapped_buffer():
+    """
+    Tests the class MappedBuffer and the raw image file functions
+    """
+    import os.path
+    import tempfile
+    print('Testing memory-mapped pixel storage')
+    p = [(255,0,0),(0,255,0),(0,0,255),(0,255,255),(255,0,255),(255,255,0)]
+    rgb = (64,128,192)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        file = os.path.join(folder,'image.raw')
+        a6image.save_raw(a6image.Image(p[:],3),file)
+        
+        image = a6image.open_raw(file)
+        introcs.assert_true(isinstance(image._data,a6buffer.MappedBuffer))
+        introcs.assert_equals(3,image.getWidth())
+        introcs.assert_equals(2,image.getHeight())
+        introcs.assert_equals(p,image.getData())
+        introcs.assert_equals(p[3:],image.getRow(1))
+        
+        # Changes are private, and copies are independent
+        copy = image.copy()
+        image.setPixel(1,2,rgb)
+        introcs.assert_equals(rgb,image[5])
+        introcs.assert_equals(p[5],copy[5])
+        introcs.assert_equals(p,a6image.open_raw(file).getData())
+        
+        # The loader decodes once and then reopens the raw file
+        source = os.path.join(os.path.split(__file__)[0],'tests','blocks.png')
+        raw = os.path.join(folder,'blocks.raw')
+        image = a6image.load_mapped(source,raw)
+        introcs.assert_true(os.path.isfile(raw))
+        compare_images(image,load_image('blocks'),'blocks.raw','blocks')
+        
+        editor = a6filter.Filter(a6image.load_mapped(source,raw))
+        editor.monochromify(False)
+        compare_images(editor.getCurrent(),load_image('blocks-grey'),'blocks.raw','blocks-grey')
+        
+        introcs.assert_error(a6image.open_raw,source, message='open_raw does not enforce the precondition on file')
+        del image, copy, editor
+
+
+def test_run_buffer():
+    """
+    Tests the class RunBuffer as the storage for an Image
+    """
+    print('Testing run-length storage')
+    red, blue, rgb = (255,0,0), (0,0,255), (64,128,192)
+    p = [red]*5+[blue]*3+[red]*4
+    
+    buffer = a6buffer.RunBuffer(p,6)
+    introcs.assert_equals(12,len(buffer))
+    introcs.assert_equals(4,buffer.getRunCount())
+    introcs.assert_equals(p,buffer[:])
+    introcs.assert_equals(p,list(buffer))
+    introcs.assert_equals(p[3:9],buffer[3:9])
+    introcs.assert_equals(p[1:11:3],buffer[1:11:3])
+    introcs.assert_equals(a6buffer.PackedBuffer(p).tobytes(),buffer.tobytes())
+    
+    image = a6image.Image(buffer,6)
+    for n in range(12):
+        introcs.assert_equals(p[n],image.getPixel(n // 6, n % 6))
+    
+    # A few writes keep the runs, and do not change a copy
+    image = a6image.Image(a6buffer.RunBuffer(p*8,6),6)
+    copy = image.copy()
+    image.setPixel(0,2,rgb)
+    introcs.assert_true(isinstance(image._data,a6buffer.RunBuffer))
+    introcs.assert_equals(34,image._data.getRunCount())
+    introcs.assert_equals(rgb,image[2])
+    introcs.assert_equals(red,copy[2])
+    
+    # Changing the width encodes the rows again
+    copy.setWidth(4)
+    introcs.assert_equals(32,copy._data.getRunCount())
+    introcs.assert_equals(blue,copy.getPixel(1,2))
+    
+    # Many writes switch to packed storage
+    image = a6image.Image(a6buffer.RunBuffer(p*8,6),6)
+    image.fill((0,0,16,6),rgb)
+    introcs.assert_true(isinstance(image._data,a6buffer.PackedBuffer))
+    introcs.assert_equals([rgb]*96,image.getData())
+
+
+def test_image_recolor():
+    """
+    Tests the method recolor in class Image, for every kind of storage
+    """
+    print('Testing method recolor')
+    invert = a6lut.Table(lambda value: 255-value)
+    swap = a6lut.Table(lambda value: value//2,None,lambda value: 255)
+    p = [(n,2*n,3*n) for n in range(20)]*2
+    q = [(255-n,255-2*n,255-3*n) for n in range(20)]*2
+    r = [(n//2,n,255) for n in range(20)]*2
+    introcs.assert_equals(bytes(chain.from_iterable(q)),invert(bytes(chain.from_iterable(p))))
+    introcs.assert_equals(bytes(chain.from_iterable(r)),swap(bytes(chain.from_iterable(p))))
+    
+    storage = [list, a6buffer.PackedBuffer, a6buffer.PaletteBuffer, 
+               lambda data: a6buffer.RunBuffer(data,5), 
+               lambda data: a6buffer.TiledBuffer(data,5,2)]
+    for make in storage:
+        image = a6image.Image(make(p[:]),5)
+        copy = image.copy()
+        image.recolor(invert)
+        introcs.assert_equals(q,image.getData())
+        introcs.assert_equals(p,copy.getData())
+        image.recolor(invert)
+        image.recolor(swap)
+        introcs.assert_equals(r,image.getData())
+    
+    # A pixel list shares the new pixels
+    image = a6image.Image(p[:],5)
+    image.recolor(invert)
+    introcs.assert_true(image._data[0] is image._data[20])
+    
+    # Palette storage stays small, and becomes grey if it can
+    grey = [(n,n,n) for n in range(0,200,10)]
+    image = a6image.Image(a6buffer.GreyBuffer(grey),5)
+    image.recolor(invert)
+    introcs.assert_equals('L',image.getMode())
+    introcs.assert_equals([(255-n,255-n,255-n) for n in range(0,200,10)],image.getData())
+    image.recolor(swap)
+    introcs.assert_equals('P',image.getMode())
+    introcs.assert_equals([((255-n)//2,(255-n)//2,255) for n in range(0,200,10)],image.getData())
+
+
+def test_image_transpose():
+    """
+    Tests the method transpose in class Image, for every kind of storage
+    """
+    print('Testing method transpose')
+    storage = [list, a6buffer.PackedBuffer, a6buffer.ArrayBuffer, 
+               lambda data: a6buffer.RunBuffer(data,1), 
+               lambda data: a6buffer.TiledBuffer(data,1,2)]
+    sizes = [(1,1),(1,5),(5,1),(3,3),(4,6),(7,4),(30,20),(70,70),(100,37)]
+    for width, height in sizes:
+        p = [(n % 256,n//256 % 256,5) for n in range(width*height)]
+        q = [p[row*width+col] for col in range(width) for row in range(height)]
+        for make in storage:
+            if make is a6buffer.ArrayBuffer and a6buffer.numpy is None:
+                continue
+            image = a6image.Image(make(p[:]),width)
+            copy = image.copy()
+            image.transpose()
+            introcs.assert_equals(height,image.getWidth())
+            introcs.assert_equals(width,image.getHeight())
+            introcs.assert_equals(q,image.getData())
+            introcs.assert_equals(p,copy.getData())
+    
+    # A pixel list is transposed in place
+    data = [(n,n,n) for n in range(12)]
+    image = a6image.Image(data,4)
+    image.transpose()
+    introcs.assert_true(image._data is data)
+    introcs.assert_equals((1,1,1),image.getPixel(1,0))
+
+
+def test_image_reorient():
+    """
+    Tests the methods reorient and getOrientation in class Image
+    """
+    print('Testing method reorient')
+    names = ['transpose','reflectHori','reflectVert','rotateLeft','rotateRight']
+    storage = [list, a6buffer.PackedBuffer, lambda data: a6buffer.RunBuffer(data,3)]
+    p = [(n,2*n,3*n) for n in range(15)]
+    grid = [p[row*3:row*3+3] for row in range(5)]
+    for make in storage:
+        for name1 in names:
+            for name2 in names:
+                data = make(p[:])
+                image = a6image.Image(data,3)
+                copy = image.copy()
+                image.reorient(name1)
+                image.reorient(name2)
+                expect = grid
+                for name in (name1,name2):
+                    if name in ('transpose','rotateLeft','rotateRight'):
+                        expect = [list(line) for line in zip(*expect)]
+                    if name in ('reflectHori','rotateRight'):
+                        expect = [line[::-1] for line in expect]
+                    if name in ('reflectVert','rotateLeft'):
+                        expect = expect[::-1]
+                
+                # Nothing moves until the pixels are needed in order
+                introcs.assert_true(image._data is data)
+                introcs.assert_equals(len(expect[0]),image.getWidth())
+                introcs.assert_equals(len(expect),image.getHeight())
+                for row in range(len(expect)):
+                    for col in range(len(expect[0])):
+                        introcs.assert_equals(expect[row][col],image.getPixel(row,col))
+                flat = [pixel for line in expect for pixel in line]
+                introcs.assert_equals(flat,[image[pos] for pos in range(15)])
+                other = image.copy()
+                introcs.assert_equals(flat,image.getData())
+                introcs.assert_equals(0,image.getOrientation())
+                introcs.assert_equals(flat,other.getData())
+                introcs.assert_equals(p,copy.getData())
+    
+    # Four rotations leave the image as it was
+    data = p[:]
+    image = a6image.Image(data,3)
+    for name in ['rotateLeft']*4:
+        image.reorient(name)
+    introcs.assert_equals(0,image.getOrientation())
+    image.reorient('rotateRight')
+    introcs.assert_equals(image.TRANSPOSED | image.FLIP_ROWS,image.getOrientation())
+    image.setPixel(0,1,(255,255,255))
+    introcs.assert_equals((255,255,255),data[9])
+    introcs.assert_equals((255,255,255),image.getRow(0)[1])
+    introcs.assert_true(image._data is data)
+
+
+def test_tiled_buffer():
+    """
+    Tests the class TiledBuffer as the storage for an Image
+    """
+    print('Testing tiled pixel storage')
+    p = [(n,2*n,3*n) for n in range(20)]
+    rgb = (64,128,192)
+    
+    # 5 columns and 4 rows in 2x2 tiles: 3 tiles across, 2 tiles down
+    buffer = a6buffer.TiledBuffer(p,5,2)
+    introcs.assert_equals(20,len(buffer))
+    introcs.assert_equals(p,buffer[:])
+    introcs.assert_equals(p[3:17],buffer[3:17])
+    introcs.assert_equals(bytes(a6buffer.PackedBuffer(p).tobytes()),buffer.tobytes())
+    introcs.assert_equals([],buffer.getTiles())
+    
+    image = a6image.Image(buffer,5)
+    for n in range(20):
+        introcs.assert_equals(p[n],image[n])
+        introcs.assert_equals(p[n],image.getPixel(n // 5, n % 5))
+    
+    # Writes only dirty the tiles they touch
+    image.setPixel(2,4,rgb)
+    introcs.assert_equals(rgb,image[14])
+    introcs.assert_equals([(2,4,2,1)],buffer.getTiles())
+    stamp = buffer.markClean()
+    introcs.assert_false(buffer.isDirty())
+    image.fill((0,1,1,2),rgb)
+    introcs.assert_equals([rgb,rgb],image.getRegion(0,1,1,2))
+    introcs.assert_equals([(0,0,2,2),(0,2,2,2)],buffer.getTiles(stamp))
+    
+    # Copies share the tiles they do not write
+    copy = image.copy()
+    copy[0] = rgb
+    introcs.assert_equals(p[0],image[0])
+    introcs.assert_equals(rgb,copy[0])
+    shared = [a is b for (a,b) in zip(image._data._tiles,copy._data._tiles)]
+    introcs.assert_equals([False,True,True,True,True,True],shared)
+    
+    # Changing the width arranges the tiles again
+    data = image.getData()
+    image.setWidth(4)
+    introcs.assert_equals(data,image.getData())
+    introcs.assert_equals(data[4:8],image.getRow(1))
+    introcs.assert_equals(5,copy.getWidth())
+    introcs.assert_equals(rgb,copy.getPixel(0,0))
 
 
 ## All of these tests hava a familiar form
@@ -290,6 +826,393 @@ def compare_images(image1,image2,file1,file2):
                                   ' at ('+str(col)+','+str(row)+')')
 
 
+def test_editor_undo():
+    """
+    Tests the (delta-based) edit history in class Editor
+    """
+    print('Testing edit history')
+    image = load_image('home')
+    editor = a6filter.Filter(image)
+    introcs.assert_false(editor.undo())
+    
+    # Keep every state to compare with
+    states = [editor.getCurrent().getData()]
+    for action in [editor.jail, editor.invert, editor.reflectVert, editor.transpose, editor.jail]:
+        editor.increment()
+        action()
+        states.append(editor.getCurrent().getData())
+    
+    # A local edit only keeps the rows it changed
+    introcs.assert_equals(4,len(editor._history))
+    delta = editor._history[0]
+    introcs.assert_true(isinstance(delta.payload,list))
+    introcs.assert_true(0 < sum(len(data) for (pos,data) in delta.payload) < len(image))
+    
+    width = image.getWidth()
+    while len(states) > 1:
+        states.pop()
+        introcs.assert_true(editor.undo())
+        introcs.assert_equals(states[-1],editor.getCurrent().getData())
+    introcs.assert_equals(width,editor.getCurrent().getWidth())
+    introcs.assert_false(editor.undo())
+    
+    # Undo in the middle, then edit again
+    editor.increment()
+    editor.invert()
+    editor.increment()
+    editor.jail()
+    editor.undo()
+    editor.undo()
+    introcs.assert_equals(states[0],editor.getCurrent().getData())
+    
+    # The history is limited
+    editor.clear()
+    for n in range(editor.MAX_HISTORY+5):
+        editor.increment()
+        editor.getCurrent()[0] = (n,n,n)
+    count = 0
+    while editor.undo():
+        count = count+1
+    introcs.assert_equals(editor.MAX_HISTORY-1,count)
+    introcs.assert_equals((5,5,5),editor.getCurrent()[0])
+
+
+def test_editor_apply():
+    """
+    Tests the method apply (and the action log) in class Editor
+    """
+    print('Testing edit actions')
+    image = load_image('home')
+    editor = a6filter.Filter(image)
+    actions = [('jail',()),('monochromify',(True,)),('vignette',()),('jail',()),
+               ('monochromify',(False,)),('vignette',()),('invert',()),('jail',()),
+               ('reflectHori',()),('transpose',())]
+    
+    states = [editor.getCurrent().getData()]
+    for name, args in actions:
+        editor.apply(name,*args)
+        states.append(editor.getCurrent().getData())
+    introcs.assert_equals(actions,editor.getLog())
+    
+    # Only some actions keep a checkpoint
+    editor.increment()
+    kept = [record.hasCheckpoint() if isinstance(record,a6editor._Action) else None
+            for record in editor._history]
+    introcs.assert_equals([True]+[False]*(editor.CHECKPOINT-1)+[True,None,True,None,None],kept)
+    editor.undo()
+    
+    while len(states) > 1:
+        states.pop()
+        introcs.assert_true(editor.undo())
+        introcs.assert_equals(states[-1],editor.getCurrent().getData())
+    introcs.assert_equals([],editor.getLog())
+    
+    # Actions mixed with other edits
+    editor.apply('invert')
+    editor.increment()
+    editor.getCurrent()[0] = (1,2,3)
+    editor.apply('jail')
+    editor.apply('reflectVert')
+    introcs.assert_equals([('invert',()),(None,()),('jail',()),('reflectVert',())],editor.getLog())
+    editor.apply('transpose')
+    editor.undo()
+    editor.undo()
+    editor.undo()
+    introcs.assert_equals((1,2,3),editor.getCurrent()[0])
+    
+    # The oldest action is deleted with a full history
+    editor.clear()
+    for n in range(editor.MAX_HISTORY+3):
+        editor.apply(actions[n % len(actions)][0],*actions[n % len(actions)][1])
+    expect = editor.getCurrent().getData()
+    editor.apply('invert')
+    editor.undo()
+    introcs.assert_equals(expect,editor.getCurrent().getData())
+    count = 0
+    while editor.undo():
+        count = count+1
+    introcs.assert_equals(editor.MAX_HISTORY-2,count)
+    introcs.assert_equals(5,len(editor.getLog()))
+    log = editor.getLog()
+    other = a6filter.Filter(image)
+    other.replay(log)
+    introcs.assert_equals(other.getCurrent().getData(),editor.getCurrent().getData())
+    
+    # A session can be repeated from its log
+    other = a6filter.Filter(image)
+    other.replay(actions)
+    introcs.assert_equals(actions,other.getLog())
+    editor.replay(actions)
+    introcs.assert_equals(editor.getCurrent().getData(),other.getCurrent().getData())
+
+
+def test_editor_inverse():
+    """
+    Tests undoing invertible edits (see INVERSES) in class Editor
+    """
+    print('Testing invertible edits')
+    image = load_image('home')
+    image = a6image.Image(a6buffer.PackedBuffer(image.getData()),image.getWidth())
+    editor = a6filter.Filter(image)
+    
+    # A reflection writes nothing, the first write copies the original, and 
+    # then nothing is copied
+    editor.apply('reflectHori')
+    introcs.assert_true(editor.getCurrent()._data is image._data)
+    editor.apply('invert')
+    data = editor.getCurrent()._data
+    for name in ['reflectHori','reflectVert','reflectHori','invert']:
+        editor.apply(name)
+        introcs.assert_true(editor.getCurrent()._data is data)
+    for n in range(4):
+        editor.undo()
+        introcs.assert_true(editor.getCurrent()._data is data)
+    introcs.assert_true(all(isinstance(record,a6editor._Inverse) for record in editor._history))
+    
+    states = [editor.getCurrent().getData()]
+    for name in ['rotateLeft','jail','rotateRight','transpose','invert']:
+        editor.apply(name)
+        states.append(editor.getCurrent().getData())
+    while len(states) > 1:
+        states.pop()
+        introcs.assert_true(editor.undo())
+        introcs.assert_equals(states[-1],editor.getCurrent().getData())
+    editor.undo()
+    editor.undo()
+    introcs.assert_equals(image.getData(),editor.getCurrent().getData())
+    introcs.assert_false(editor.undo())
+
+
+def test_editor_redo():
+    """
+    Tests redo and branches in class Editor
+    """
+    print('Testing redo and branches')
+    image = load_image('home')
+    editor = a6filter.Filter(image)
+    introcs.assert_false(editor.redo())
+    
+    # Every kind of history record, and an edit still in progress
+    states = [editor.getCurrent().getData()]
+    for name in ['jail','invert','monochromify','rotateLeft','vignette']:
+        editor.apply(name,*([False] if name == 'monochromify' else []))
+        states.append(editor.getCurrent().getData())
+    editor.increment()
+    editor.reflectVert()
+    states.append(editor.getCurrent().getData())
+    log = editor.getLog()
+    
+    for pos in range(len(states)-1,0,-1):
+        introcs.assert_true(editor.undo())
+        introcs.assert_equals(states[pos-1],editor.getCurrent().getData())
+    for pos in range(1,len(states)):
+        introcs.assert_true(editor.redo())
+        introcs.assert_equals(states[pos],editor.getCurrent().getData())
+    introcs.assert_false(editor.redo())
+    introcs.assert_equals(log,editor.getLog())
+    
+    # Undo and redo again, now that the history has checkpoints
+    for pos in range(3):
+        editor.undo()
+    editor.redo()
+    introcs.assert_equals(states[-3],editor.getCurrent().getData())
+    
+    # A new edit makes a branch of the undone edits
+    editor.apply('reflectHori')
+    other = editor.getCurrent().getData()
+    introcs.assert_false(editor.redo())
+    introcs.assert_equals([(4,['vignette',None])],editor.getBranches())
+    
+    # Checking out the branch makes a branch of the new edit
+    introcs.assert_true(editor.checkout(0))
+    introcs.assert_equals(states[-1],editor.getCurrent().getData())
+    introcs.assert_equals(log,editor.getLog())
+    introcs.assert_equals([(4,['reflectHori'])],editor.getBranches())
+    introcs.assert_true(editor.checkout(0))
+    introcs.assert_equals(other,editor.getCurrent().getData())
+    introcs.assert_equals([(4,['vignette',None])],editor.getBranches())
+    
+    # Branches of branches
+    editor.undo()
+    editor.undo()
+    editor.apply('transpose')
+    introcs.assert_equals([(3,['rotateLeft','reflectHori'])],editor.getBranches())
+    introcs.assert_true(editor.checkout(0))
+    introcs.assert_equals(other,editor.getCurrent().getData())
+    introcs.assert_equals(2,len(editor.getBranches()))
+    editor.clear()
+    introcs.assert_equals([],editor.getBranches())
+    introcs.assert_false(editor.redo())
+
+
+def test_editor_memory():
+    """
+    Tests the memory reports of class Editor (and of Image)
+    """
+    print('Testing memory usage')
+    image = load_image('home')
+    packed = a6image.Image(a6buffer.PackedBuffer(bytearray(image.tobytes())),image.getWidth())
+    introcs.assert_true(image.nbytes() > 20*len(image))
+    introcs.assert_true(3*len(image) < packed.nbytes() < 3*len(image)+1000)
+    
+    # A copy is only counted once, until it is changed
+    copy = packed.copy()
+    seen = set()
+    size = packed.nbytes(seen)
+    introcs.assert_true(copy.nbytes(seen) < 1000)
+    copy[0] = (0,0,0)
+    introcs.assert_true(copy.nbytes(seen) > 3*len(image))
+    
+    editor = a6filter.Filter(packed)
+    introcs.assert_equals([],editor.memoryUsage()['entries'])
+    introcs.assert_true(size < editor.memoryUsage()['images'] < size+1000)
+    editor.apply('invert')
+    editor.apply('jail')
+    editor.apply('vignette')
+    editor.increment()
+    editor.reflectVert()
+    usage = editor.memoryUsage()
+    introcs.assert_equals(['invert','jail','vignette',None],[entry[0] for entry in usage['entries']])
+    introcs.assert_true(usage['entries'][0][1] < 1000)
+    introcs.assert_true(usage['entries'][1][1] > 3*len(image))
+    introcs.assert_true(usage['entries'][2][1] < 1000)
+    introcs.assert_equals(usage['entries'][3][1],usage['names'][None])
+    introcs.assert_equals(usage['total'],usage['images']+usage['redo']+
+                          sum(entry[1] for entry in usage['entries']))
+    editor.undo()
+    introcs.assert_true(editor.memoryUsage()['redo'] > 0)
+    
+    # Trimming deletes the oldest edits first
+    total = editor.trim(editor.memoryUsage()['total']-1)
+    introcs.assert_equals(total,editor.memoryUsage()['total'])
+    introcs.assert_equals(['jail','vignette'],[entry[0] for entry in editor.memoryUsage()['entries']])
+    total = editor.trim(0)
+    introcs.assert_equals(total,editor.memoryUsage()['total'])
+    introcs.assert_equals([],editor.memoryUsage()['entries'])
+    introcs.assert_false(editor.undo())
+    introcs.assert_true(editor.redo())
+    
+    # Trimming the edits before an undone action keeps it safe to redo
+    pixels = [(pos % 256,3*pos % 256,5*pos % 256) for pos in range(400)]
+    editor = a6filter.Filter(a6image.Image(pixels,20))
+    states = [editor.getCurrent().getData()]
+    for edit in [('vignette',),('pixellate',3),('blur',1),('monochromify',True)]:
+        editor.apply(*edit)
+        states.append(editor.getCurrent().getData())
+    for pos in range(3):
+        editor.undo()
+    total = editor.trim(0)
+    introcs.assert_equals(total,editor.memoryUsage()['total'])
+    introcs.assert_true(editor.redo())
+    introcs.assert_true(editor.redo())
+    introcs.assert_equals(states[3],editor.getCurrent().getData())
+    introcs.assert_true(editor.undo())
+    introcs.assert_equals(states[2],editor.getCurrent().getData())
+    introcs.assert_true(editor.undo())
+    introcs.assert_equals(states[1],editor.getCurrent().getData())
+    introcs.assert_false(editor.undo())
+    
+    # Redo checks for itself that the edits before an action are still there
+    editor = a6filter.Filter(a6image.Image(pixels,20))
+    for edit in [('vignette',),('pixellate',3),('blur',1)]:
+        editor.apply(*edit)
+    editor.undo()
+    editor.undo()
+    editor._discard(editor._history.popleft)
+    introcs.assert_true(editor.redo())
+    introcs.assert_true(editor.redo())
+    introcs.assert_true(editor.undo())
+    introcs.assert_equals(states[2],editor.getCurrent().getData())
+
+
+def test_editor_budget():
+    """
+    Tests the compressed (and spilled) edit history in class Editor
+    """
+    print('Testing edit history with a budget')
+    image = load_image('home')
+    editor = a6filter.Filter(image,3*len(image))
+    
+    states = [editor.getCurrent().getData()]
+    for n in range(12):
+        if n % 3 == 0:
+            editor.increment()
+            editor.jail()
+        else:
+            editor.apply(['invert','transpose','reflectVert','monochromify'][n % 4],*([True] if n % 4 == 3 else []))
+        states.append(editor.getCurrent().getData())
+    editor.flush()
+    
+    # Everything is compressed, and the oldest records are on disk
+    records = list(editor._history)
+    introcs.assert_true(all(record.payload is None for record in records))
+    introcs.assert_true(records[0].file is not None)
+    introcs.assert_true(sum(record.getSize() for record in records) <= 3*len(image))
+    
+    while len(states) > 1:
+        states.pop()
+        introcs.assert_true(editor.undo())
+        introcs.assert_equals(states[-1],editor.getCurrent().getData())
+    introcs.assert_false(editor.undo())
+    
+    # Closing stops the background thread, which starts again when needed
+    worker = editor._worker
+    editor.close()
+    introcs.assert_false(worker.is_alive())
+    editor.apply('monochromify',True)
+    editor.apply('monochromify',False)
+    editor.flush()
+    introcs.assert_true(editor._worker.is_alive())
+    editor.close()
+    introcs.assert_true(editor._worker is None)
+    
+    # Redone edits are compressed again, even with a new checkpoint
+    editor.clear()
+    for edit in [('vignette',),('pixellate',3),('blur',1)]:
+        editor.apply(*edit)
+    editor.undo()
+    editor.undo()
+    editor._discard(editor._history.popleft)
+    editor.redo()
+    editor.redo()
+    editor.flush()
+    introcs.assert_true(editor._history[0].hasCheckpoint())
+    introcs.assert_true(all(record.payload is None for record in editor._history))
+    
+    # Spilled files are deleted with their records
+    files = [record.file for record in records if record.file is not None]
+    introcs.assert_false(any(os.path.exists(file) for file in files))
+    
+    # The other compression method
+    for codec in ['zlib','lzma']:
+        record = a6editor._Delta(image,image.copy())
+        record.setPayload(image)
+        record.store(record.pack(codec),codec)
+        introcs.assert_equals(image.getData(),record.getPayload().getData())
+    
+    # The size of a payload is measured without encoding it
+    edited = image.copy()
+    edited.setPixel(3,4,(1,2,3))
+    for record in [a6editor._Delta(image,edited), a6editor._Delta(image,image.copy()),
+                   a6editor._Delta(image,a6image.Image(image.getData()[:-1],1))]:
+        introcs.assert_equals(len(record._encode(record.payload)),record.getSize())
+    record = a6editor._Action('invert',())
+    introcs.assert_equals(0,record.getSize())
+    introcs.assert_equals(None,record.encode())
+    
+    # The background thread only compresses bytes encoded beforehand
+    turned = image.copy()
+    turned.reorient('rotateLeft')
+    record.setPayload(turned)
+    data = record.encode()
+    introcs.assert_equals(0,turned.getOrientation())
+    record.store(record.pack('zlib',data),'zlib')
+    compare_images(record.getPayload(),turned,'pack','rotateLeft')
+    record = a6editor._Action('invert',())
+    record.setPayload(image)
+    introcs.assert_equals(len(record._encode(image)),record.getSize())
+
+
 def test_reflect_vert():
     """
     Tests the method reflectVert in class Filter
@@ -315,6 +1238,55 @@ def test_reflect_vert():
     compare_images(editor.getCurrent(),image2,file1,file2)
 
 
+def test_rotate():
+    """
+    Tests the methods transpose, rotateLeft and rotateRight in class Filter
+    """
+    print('Testing methods transpose and rotate')
+    for width, height in [(1,1),(3,5),(6,4),(40,40)]:
+        p = [(n % 256,n//256,0) for n in range(width*height)]
+        cases = [('transpose',lambda row, col: p[col*width+row]),
+                 ('rotateRight',lambda row, col: p[(height-col-1)*width+row]),
+                 ('rotateLeft',lambda row, col: p[col*width+width-row-1])]
+        for name, pixel in cases:
+            editor = a6filter.Filter(a6image.Image(p[:],width))
+            editor.apply(name)
+            current = editor.getCurrent()
+            introcs.assert_equals(height,current.getWidth())
+            q = [pixel(row,col) for row in range(width) for col in range(height)]
+            introcs.assert_equals(q,current.getData())
+            editor.undo()
+            introcs.assert_equals(p,editor.getCurrent().getData())
+
+
+def test_lookup_tables():
+    """
+    Tests the lookup tables of the pointwise filters (module a6lut)
+    """
+    print('Testing lookup tables')
+    colors = [(red,green,blue) for red in range(0,256,5) 
+              for green in range(0,256,15) for blue in range(0,256,3)]
+    colors = colors+[(n,n,n) for n in range(256)]
+    data = bytes(chain.from_iterable(colors))
+    
+    # The tables give the same results as computing with floats
+    for scales in [(1,1,1),(1,0.6,0.4),(0.5,1,0.25)]:
+        expected = []
+        for red, green, blue in colors:
+            brightness = 0.3*red + 0.6*green + 0.1*blue
+            expected.extend(int(scale*brightness) for scale in scales)
+        mixer = a6lut.Mixer((0.3,0.6,0.1),scales)
+        introcs.assert_equals(bytes(expected),mixer(data))
+        
+        # Again, without NumPy
+        numpy = a6lut.numpy
+        try:
+            a6lut.numpy = None
+            introcs.assert_equals(bytes(expected),mixer(data))
+        finally:
+            a6lut.numpy = numpy
+
+
 def test_monochromify():
     """
     Tests the method monochromify in class Filter
@@ -338,6 +1310,7 @@ def test_monochromify():
     
     editor.monochromify(False)
     compare_images(editor.getCurrent(),image2,file1,file2)
+    introcs.assert_equals('L',editor.getCurrent().getMode())
     
     print('Testing method monochromify (sepia)')
     
@@ -358,6 +1331,27 @@ def test_monochromify():
     
     editor.monochromify(True)
     compare_images(editor.getCurrent(),image2,file1,file2)
+    
+    print('Testing method monochromify (array)')
+    if not a6buffer.numpy is None:
+        for file1 in ['blocks','home']:
+            for sepia in [False,True]:
+                file2 = file1+('-sepia' if sepia else '-grey')
+                image1 = load_image(file1)
+                image1 = a6image.Image(a6buffer.ArrayBuffer(image1.getData()),image1.getWidth())
+                image2 = load_image(file2)
+                editor = a6filter.Filter(image1)
+                
+                editor.monochromify(sepia)
+                compare_images(editor.getCurrent(),image2,file1,file2)
+    
+    print('Testing method monochromify (packed)')
+    image1 = load_image(file1)
+    image1 = a6image.Image(a6buffer.PackedBuffer(image1.getData()),image1.getWidth())
+    editor = a6filter.Filter(image1)
+    
+    editor.monochromify(True)
+    compare_images(editor.getCurrent(),image2,file1,file2)
 
 
 def test_jail():
@@ -385,6 +1379,295 @@ def test_jail():
     compare_images(editor.getCurrent(),image2,file1,file2)
 
 
+def test_jail_tiled():
+    """
+    Tests the method jail in class Filter on a tiled image
+    """
+    print('Testing method jail (tiled)')
+    
+    file1 = 'home'
+    file2 = 'home-jail'
+    image1 = load_image(file1)
+    image1 = a6image.Image(a6buffer.TiledBuffer(image1.getData(),image1.getWidth(),16),image1.getWidth())
+    image2 = load_image(file2)
+    editor = a6filter.Filter(image1)
+    
+    editor.increment()
+    editor.jail()
+    compare_images(editor.getCurrent(),image2,file1,file2)
+    
+    # The original shares every tile that is not under a bar
+    original = editor.getOriginal()._data._tiles
+    current  = editor.getCurrent()._data._tiles
+    shared = [a is b for (a,b) in zip(original,current)]
+    introcs.assert_true(0 < shared.count(True) < len(shared))
+    
+    print('Testing method jail (runs)')
+    image1 = load_image(file1)
+    image1 = a6image.Image(a6buffer.RunBuffer(image1.getData(),image1.getWidth()),image1.getWidth())
+    editor = a6filter.Filter(image1)
+    
+    editor.increment()
+    editor.jail()
+    compare_images(editor.getCurrent(),image2,file1,file2)
+
+
+def test_draw():
+    """
+    Tests the module a6draw and the drawing methods in class Filter
+    """
+    print('Testing drawing methods')
+    introcs.assert_equals([(2,1,3),(3,1,3)],a6draw.rectangle(2,1,2,3))
+    introcs.assert_equals([(0,0,2),(1,2,2),(2,4,2),(3,6,2)],a6draw.line((0,0),(3,7)))
+    introcs.assert_equals([(4,4,3),(5,4,3),(6,4,3)],a6draw.line((5,5),(5,5),3))
+    introcs.assert_equals([(0,0,4),(1,3,1),(2,3,1)],a6draw.polyline([(0,0),(0,3),(2,3)]))
+    introcs.assert_equals([(-1,0,1),(0,-1,3),(1,0,1)],a6draw.circle((0,0),1))
+    introcs.assert_equals([(-2,0,1),(-1,-1,1),(-1,1,1),(0,-2,1),(0,2,1),(1,-1,1),(1,1,1),(2,0,1)],
+                          a6draw.circle((0,0),2,1))
+    introcs.assert_equals([(0,0,4),(1,0,4),(2,0,4)],a6draw.polygon([(0,0),(0,4),(3,4),(3,0)]))
+    introcs.assert_equals([(1,1,1)],a6draw.polygon([(0,1),(2,1),(2,3)]))
+    
+    # Every pixel of a filled circle is within the radius
+    pixels = set()
+    for (row, col, width) in a6draw.circle((0,0),10):
+        pixels.update((row,pos) for pos in range(col,col+width))
+    inside = set((row,col) for row in range(-10,11) for col in range(-10,11) if row*row+col*col <= 100)
+    introcs.assert_equals(inside,pixels)
+    
+    # Shapes are clipped at the edges of the image
+    red = (255,0,0)
+    black = (0,0,0)
+    storage = [list, a6buffer.PackedBuffer, lambda data: a6buffer.RunBuffer(data,6), 
+               lambda data: a6buffer.TiledBuffer(data,6,2)]
+    for make in storage:
+        editor = a6filter.Filter(a6image.Image(make([black]*24),6))
+        editor.drawRect((-1,4,2,5),red)
+        editor.drawLine((3,0),(3,2),red)
+        editor.drawCircle((2,5),0,red)
+        image = editor.getCurrent()
+        expect = [black]*24
+        for pos in [4,5,17,18,19,20]:
+            expect[pos] = red
+        introcs.assert_equals(expect,image.getData())
+        introcs.assert_equals([black]*24,editor.getOriginal().getData())
+        editor.drawPolygon([(0,-10),(0,20),(10,20),(10,-10)],red)
+        introcs.assert_equals([red]*24,image.getData())
+
+
+def test_pixellate():
+    """
+    Tests the method pixellate in class Filter
+    """
+    print('Testing method pixellate')
+    for file1 in ['blocks','home']:
+        for step in [10,20,50]:
+            file2 = file1+'-pixellate-'+str(step)
+            image1 = load_image(file1)
+            image2 = load_image(file2)
+            editor = a6filter.Filter(image1)
+            
+            editor.pixellate(step)
+            compare_images(editor.getCurrent(),image2,file1,file2)
+    
+    print('Testing method pixellate (packed)')
+    image1 = load_image('home')
+    image1 = a6image.Image(a6buffer.PackedBuffer(image1.getData()),image1.getWidth())
+    image2 = load_image('home-pixellate-20')
+    editor = a6filter.Filter(image1)
+    editor.pixellate(20)
+    compare_images(editor.getCurrent(),image2,'home','home-pixellate-20')
+
+
+def test_area():
+    """
+    Tests the module a6area and the method blur in class Filter
+    """
+    print('Testing summed area tables')
+    p = [(n,2*n,(7*n) % 256) for n in range(35)]
+    image = a6image.Image(p,7)
+    integral = a6area.Integral(image)
+    introcs.assert_equals((0,0,0),integral.total(2,3,0,4))
+    introcs.assert_equals((sum(range(35)),2*sum(range(35)),sum((7*n) % 256 for n in range(35))),
+                          integral.total(0,0,5,7))
+    introcs.assert_equals((8+9+15+16,16+18+30+32,56+63+105+112),integral.total(1,1,2,2))
+    introcs.assert_equals((12,24,84),integral.average(1,1,2,2))
+    introcs.assert_equals([(8,16,56),(11,22,77),(13,26,91),(25,51,178),(28,57,199),(30,61,213)],
+                          integral.grid(3))
+    
+    # The box blur of each pixel is the average of its neighbors
+    blur = integral.blur(1)
+    for row in range(5):
+        for col in range(7):
+            top = max(row-1,0)
+            left = max(col-1,0)
+            rect = (top,left,min(row+2,5)-top,min(col+2,7)-left)
+            introcs.assert_equals(integral.average(*rect),blur[row*7+col])
+    introcs.assert_equals(p,integral.blur(0))
+    
+    editor = a6filter.Filter(image)
+    editor.blur(1)
+    introcs.assert_equals(blur,editor.getCurrent().getData())
+    introcs.assert_equals(p,editor.getOriginal().getData())
+    
+    small = a6area.downscale(image,3)
+    introcs.assert_equals(3,small.getWidth())
+    introcs.assert_equals(2,small.getHeight())
+    introcs.assert_equals(integral.grid(3),small.getData())
+
+
+def test_apply_chain():
+    """
+    Tests the method applyChain in class Filter and the function compose in a6lut
+    """
+    print('Testing method applyChain')
+    invert = a6lut.Table(lambda value: 255-value)
+    half = a6lut.Table(lambda value: value//2)
+    sepia = a6lut.Mixer((0.3,0.6,0.1),(1,0.6,0.4))
+    data = bytes(range(256))*3
+    introcs.assert_true(isinstance(a6lut.compose(invert,half),a6lut.Table))
+    introcs.assert_true(isinstance(a6lut.compose(sepia,invert,half),a6lut.Mixer))
+    introcs.assert_true(isinstance(a6lut.compose(invert,sepia),a6lut.Chain))
+    for filters in [(invert,half),(sepia,invert),(sepia,half,invert),(invert,sepia,invert)]:
+        expect = data
+        for function in filters:
+            expect = function(expect)
+        introcs.assert_equals(expect,a6lut.compose(*filters)(data))
+    
+    chains = [['invert',('monochromify',True),'vignette'],
+              [('monochromify',False),'vignette','invert'],
+              ['vignette','rotateLeft','invert',('pixellate',10),'vignette']]
+    for make in [list, a6buffer.PackedBuffer]:
+        for steps in chains:
+            image = load_image('home')
+            image1 = a6image.Image(make(image.getData()),image.getWidth())
+            image2 = a6image.Image(make(image.getData()),image.getWidth())
+            editor1 = a6filter.Filter(image1)
+            editor2 = a6filter.Filter(image2)
+            editor1.apply('applyChain',steps)
+            for step in steps:
+                if type(step) == str:
+                    editor2.apply(step)
+                else:
+                    editor2.apply(*step)
+            compare_images(editor1.getCurrent(),editor2.getCurrent(),'chain','steps')
+            
+            # The whole chain is one edit
+            introcs.assert_equals(1,len(editor1.getLog()))
+            introcs.assert_true(editor1.undo())
+            compare_images(editor1.getCurrent(),image,'undo','home')
+            introcs.assert_false(editor1.undo())
+
+
+def test_parallel():
+    """
+    Tests the class ProcessPool in a6parallel and the method parallel in class Filter
+    """
+    print('Testing method parallel')
+    pool = a6parallel.ProcessPool(2)
+    edits = [('invert',),('monochromify',False),('vignette',),('pixellate',10),
+             ('blur',2),('transpose',),('rotateLeft',),('reflectHori',)]
+    try:
+        for edit in edits:
+            image = load_image('home')
+            editor1 = a6filter.Filter(image.copy())
+            editor2 = a6filter.Filter(image.copy())
+            editor1.setExecutor(pool)
+            editor1.apply('parallel',*edit)
+            editor2.apply(*edit)
+            compare_images(editor1.getCurrent(),editor2.getCurrent(),'parallel',edit[0])
+            editor1.undo()
+            compare_images(editor1.getCurrent(),image,'undo','home')
+        
+        # The image keeps the bytes copied out of the shared memory as they are
+        image = load_image('home')
+        pool.run(image,'vignette',())
+        compare_images(image,load_image('home-vignette'),'home','home-vignette')
+        introcs.assert_equals(bytearray,type(image.getBuffer().obj))
+        
+        # Bands of blocks are whole blocks
+        introcs.assert_equals([(0,20),(20,40),(40,50)],pool._bands(50,20,30))
+        introcs.assert_equals([(0,1),(1,2),(2,3),(3,4),(4,5)],pool._bands(5,1,30))
+        
+        # An orientation still pending is applied just once
+        for other in [pool, a6parallel.ThreadPool(2)]:
+            for edit in ['reflectHori','transpose','rotateRight']:
+                image = a6image.Image(load_image('home').getData()[:35],7)
+                editor1 = a6filter.Filter(image.copy())
+                editor2 = a6filter.Filter(image.copy())
+                editor1.setExecutor(other)
+                editor1.apply('rotateLeft')
+                editor2.apply('rotateLeft')
+                editor1.apply('parallel',edit)
+                editor2.apply(edit)
+                compare_images(editor1.getCurrent(),editor2.getCurrent(),'parallel',edit)
+            other.close()
+        
+        # Edits the pool cannot split are run as usual
+        editor = a6filter.Filter(load_image('blocks'))
+        editor.setExecutor(pool)
+        editor.parallel('jail')
+        compare_images(editor.getCurrent(),load_image('blocks-jail'),'blocks','blocks-jail')
+    finally:
+        pool.close()
+
+
+def test_threads():
+    """
+    Tests the class ThreadPool in a6parallel and the attribute EXECUTOR in class Filter
+    """
+    print('Testing class ThreadPool')
+    pool = a6parallel.ThreadPool(3)
+    introcs.assert_equals(3,pool.getThreads())
+    edits = [('invert',),('monochromify',True),('vignette',),('pixellate',10),
+             ('blur',2),('rotateRight',),('reflectVert',)]
+    try:
+        a6filter.Filter.EXECUTOR = pool
+        # Pixel lists are copied, and packed pixels are changed in place
+        for make in [list, a6buffer.PackedBuffer]:
+            for edit in edits:
+                image = load_image('home')
+                image = a6image.Image(make(image.getData()),image.getWidth())
+                editor1 = a6filter.Filter(image.copy())
+                editor2 = a6filter.Filter(image.copy())
+                introcs.assert_true(editor1.getExecutor() is pool)
+                editor1.apply('parallel',*edit)
+                editor2.apply(*edit)
+                compare_images(editor1.getCurrent(),editor2.getCurrent(),'threads',edit[0])
+                editor1.undo()
+                compare_images(editor1.getCurrent(),image,'undo','home')
+        
+        # A filter with its own executor does not use EXECUTOR
+        editor = a6filter.Filter(load_image('home'))
+        editor.setExecutor(a6parallel.ProcessPool(1))
+        introcs.assert_false(editor.getExecutor() is pool)
+        
+        # An executor given to parallel is used for just that call
+        other = a6parallel.ThreadPool(1)
+        editor.parallel('invert',executor=other)
+        introcs.assert_false(other._pool is None)
+        introcs.assert_false(editor.getExecutor() is other)
+        other.close()
+        
+        # The vignette terms are made once, before the threads start
+        a6filter._vignette_terms.cache_clear()
+        a6filter.Filter(load_image('home')).parallel('vignette')
+        introcs.assert_equals(1,a6filter._vignette_terms.cache_info().misses)
+        
+        # Bands are kept under CHUNK bytes, and there are enough for every thread
+        introcs.assert_equals(100,len(pool._bands(100,1,pool.CHUNK)))
+        introcs.assert_equals([(0,25),(25,50),(50,75),(75,100)],pool._bands(100,25,pool.CHUNK))
+        introcs.assert_equals(12,len(pool._bands(100,1,3)))
+        
+        # The pool is started once and reused
+        thread = pool._getPool()
+        a6filter.Filter(load_image('home')).parallel('invert')
+        introcs.assert_true(pool._getPool() is thread)
+    finally:
+        a6filter.Filter.EXECUTOR = None
+        pool.close()
+    introcs.assert_true(a6filter.Filter(load_image('home')).getExecutor() is None)
+
+
 def test_vignette():
     """
     Tests the method vignette in class Filter
@@ -408,6 +1691,38 @@ def test_vignette():
     
     editor.vignette()
     compare_images(editor.getCurrent(),image2,file1,file2)
+    
+    print('Testing method vignette (array)')
+    if not a6buffer.numpy is None:
+        for file1 in ['blocks','home']:
+            file2 = file1+'-vignette'
+            image1 = load_image(file1)
+            image1 = a6image.Image(a6buffer.ArrayBuffer(image1.getData()),image1.getWidth())
+            image2 = load_image(file2)
+            editor = a6filter.Filter(image1)
+            
+            editor.vignette()
+            compare_images(editor.getCurrent(),image2,file1,file2)
+    
+    print('Testing method vignette (cached)')
+    image1 = load_image('home')
+    image2 = load_image('home-vignette')
+    hits = a6filter._vignette_terms.cache_info().hits
+    for n in range(2):
+        image = a6image.Image(a6buffer.PackedBuffer(image1.getData()),image1.getWidth())
+        editor = a6filter.Filter(image)
+        editor.vignette()
+        compare_images(editor.getCurrent(),image2,'home','home-vignette')
+    introcs.assert_equals(hits+2,a6filter._vignette_terms.cache_info().hits)
+    
+    # Only the terms of each row and column are kept, and they cannot be changed
+    rows, cols, scale = a6filter._vignette_terms(3,2)
+    introcs.assert_true(rows.readonly and cols.readonly)
+    introcs.assert_equals([2.25,0.25,0.25],list(cols))
+    introcs.assert_floats_equal(3.25,scale)
+    factors = a6filter._vignette_factors((rows,cols,scale),2,5)
+    expect = [1-(rows[row]+cols[col])/scale for (row, col) in [(0,2),(1,0),(1,1)]]
+    introcs.assert_float_lists_equal(expect,[float(factor) for factor in factors])
 
 
 def test_encode():
@@ -502,14 +1817,45 @@ def test_all():
     test_image_operators()
     test_image_access()
     test_image_str()
+    test_image_bytes()
+    test_image_bulk()
+    test_image_copy()
+    test_packed_buffer()
+    test_array_buffer()
+    test_palette_buffer()
+    test_mapped_buffer()
+    test_tiled_buffer()
+    test_run_buffer()
+    test_image_recolor()
+    test_image_transpose()
+    test_image_reorient()
     print('Class Image passed all tests.')
     print()
     
+    print('Testing class Editor')
+    test_editor_undo()
+    test_editor_apply()
+    test_editor_inverse()
+    test_editor_redo()
+    test_editor_memory()
+    test_editor_budget()
+    print('Class Editor passed all tests.')
+    print()
+    
     print('Testing class Filter')
     test_reflect_vert()
+    test_rotate()
+    test_lookup_tables()
     test_monochromify()
     test_jail()
+    test_jail_tiled()
+    test_draw()
+    test_pixellate()
+    test_area()
     test_vignette()
+    test_apply_chain()
+    test_parallel()
+    test_threads()
     print('Class Filter passed all tests.')
     print()
     
@@ -73,6 +73,9 @@ class InterfacePanel(BoxLayout):
     # For handling the "progress" monitor
     processing = BooleanProperty(False)
     
+    # The bytes of memory the edit history may use before spilling to disk
+    HISTORY_BUDGET = 1 << 28
+    
     def config(self):
         """
         Configures the application at start-up.
@@ -84,9 +87,10 @@ class InterfacePanel(BoxLayout):
         # For working with pop-ups (Hidden since not .kv aware)
         self._popup = None
         self.place_image('',self.source)
-        self.imagedrop = ImageDropDown(choices=['load','save','undo','reset'], 
+        self.imagedrop = ImageDropDown(choices=['load','save','undo','redo','reset'], 
                                        save=[self.save_image], load=[self.load_image],
-                                       undo=[self.undo], reset=[self.clear])
+                                       undo=[self.undo], redo=[self.redo],
+                                       reset=[self.clear])
         self.textdrop  = TextDropDown( choices=['show','hide','code','load','save'],
                                        show=[self.show_text], hide=[self.hide_text],
                                        code=[self.encode], load=[self.load_text], 
@@ -108,7 +112,10 @@ class InterfacePanel(BoxLayout):
                                        p100=[self.do_async,'pixellate',100],
                                        p200=[self.do_async,'pixellate',200])
         self.async_action = None
-        self.async_thread = None
+        self.async_future = None
+        # One thread runs every action, instead of a new thread for each
+        from concurrent.futures import ThreadPoolExecutor
+        self.async_pool = ThreadPoolExecutor(1)
         
         self.textpanel.hide_widget(True)
         self.textdrop.disable(True)
@@ -229,12 +236,13 @@ class InterfacePanel(BoxLayout):
         Precondition: file is a string
         """
         import a6image
+        import a6buffer
         from PIL import Image as CoreImage
         
         try:
             image = CoreImage.open(file)
             image = image.convert("RGB")
-            buffer = list(image.getdata())
+            buffer = a6buffer.PackedBuffer(bytearray(image.tobytes()))
             size  = image.size[0]*image.size[1]
             width = image.size[0]
         except:
@@ -311,11 +319,11 @@ class InterfacePanel(BoxLayout):
         # prepare image for saving
         from PIL import Image as CoreImage
 
-        # This worked (Unlike Kivy)!  But is slow.
+        # This worked (Unlike Kivy)!  Packed bytes avoid a per-pixel copy.
         current = self.workspace.getCurrent()
         try:
-            im = CoreImage.new('RGBA',(current.getWidth(),current.getHeight()))
-            im.putdata(tuple(current.getData()))
+            size = (current.getWidth(),current.getHeight())
+            im = CoreImage.frombytes('RGB',size,current.getBuffer())
             im.save(filename,'PNG')
         except:
             traceback.print_exc()
@@ -345,8 +353,10 @@ class InterfacePanel(BoxLayout):
         
         import a6encode
         self.picture = self.read_image(file)
+        if not self.workspace is None:
+            self.workspace.close()
         try:
-            self.workspace = a6encode.Encoder(self.picture)
+            self.workspace = a6encode.Encoder(self.picture,self.HISTORY_BUDGET)
             self.workimage.setImage(self.workspace.getCurrent())
             self.origimage.setImage(self.workspace.getOriginal())
         except:
@@ -496,6 +506,21 @@ class InterfacePanel(BoxLayout):
         except:
             traceback.print_exc()
             self.error('An error occurred when trying to undo')
+    
+    def redo(self):
+        """
+        Redos the last undone edit to the image.
+        
+        This method will redo the last undo, if there has been no edit since.
+        """
+        try:
+            self.workspace.redo()
+            self.workimage.update(self.workspace.getCurrent())
+            self.decode()
+            self.canvas.ask_update()
+        except:
+            traceback.print_exc()
+            self.error('An error occurred when trying to redo')
         
     def clear(self):
         """
@@ -538,17 +563,17 @@ class InterfacePanel(BoxLayout):
         The action parameters are an expanded list where the first element is 
         a callable and any other elements are parameters to the callable.
         
-        The thread progress is monitored by async_monitor.  When the thread 
-        is done, it will call async_complete in the main event thread.
+        The action runs in the thread of async_pool, which is started once and
+        then reused by every action.  The thread progress is monitored by 
+        async_monitor.  When the action is done, it will call async_complete in
+        the main event thread.
         
         Parameter(s) *action: An expanded list defining the action
         Precondition: The first element of action is callable
         """
-        import threading
         self.menubar.disabled = True
         self.processing = True
-        self.async_thread = threading.Thread(target=self.async_work,args=action)
-        self.async_thread.start()
+        self.async_future = self.async_pool.submit(self.async_work,*action)
 
     def async_work(self,*action):
         """
@@ -564,8 +589,7 @@ class InterfacePanel(BoxLayout):
         Precondition: The first element of action is callable
         """
         try:
-            self.workspace.increment()
-            getattr(self.workspace,action[0])(*action[1:])
+            self.workspace.apply(action[0],*action[1:])
             self.decode()
         except:
             traceback.print_exc()
@@ -578,9 +602,9 @@ class InterfacePanel(BoxLayout):
         Cleans up an asynchronous thread after completion.
         """
         self.workimage.update(self.workspace.getCurrent())
-        self.async_thread.join()
+        self.async_future.result()
         Clock.unschedule(self.async_action)
-        self.async_thread = None
+        self.async_future = None
         self.async_action = None
         self.menubar.disabled = False
         self.processing = False
@@ -616,8 +640,7 @@ class InterfacePanel(BoxLayout):
         """
         try:
             self.textpanel.active = True
-            self.workspace.increment()
-            if not self.workspace.encode(self.textpanel.hidden.text):
+            if not self.workspace.apply('encode',self.textpanel.hidden.text):
                 traceback.print_exc()
                 self.error('The message could not be encoded')
                 self.workspace.undo()
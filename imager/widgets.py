@@ -20,7 +20,6 @@ from kivy.metrics import sp
 
 from kivy.properties import *
 
-from array import array             # Byte buffers
 from io import StringIO             # Making complex strings
 import traceback
 
@@ -182,6 +181,8 @@ class ImageDropDown(MenuDropDown):
     savechoice = ObjectProperty(None)
     # Undo one edit step
     undochoice  = ObjectProperty(None)
+    # Redo one undone edit step
+    redochoice  = ObjectProperty(None)
     # Undo all edits
     clearchoice = ObjectProperty(None)
 
@@ -326,12 +327,13 @@ class ImagePanel(Widget):
         return os.path.join(dir,filename)
     
     def blit(self,picture):
-        for pos in range(len(picture)):
-            pixel = picture[pos]
-            self._blitter[pos*3  ] = pixel[0]
-            self._blitter[pos*3+1] = pixel[1]
-            self._blitter[pos*3+2] = pixel[2]
-        return self._blitter
+        """
+        Returns the pixels of picture packed as bytes for the texture.
+        
+        Parameter picture: The image to pack
+        Precondition: picture is an Image object
+        """
+        return picture.tobytes()
     
     def setImage(self,picture):
         """
@@ -358,7 +360,6 @@ class ImagePanel(Widget):
             self.picture  = picture
             self.texture  = Texture.create(size=(picture.getWidth(), picture.getHeight()), 
                                            colorfmt='rgb', bufferfmt='ubyte')
-            self._blitter = array('B',[0]*len(picture)*3)
             self.texture.blit_buffer(self.blit(picture), colorfmt='rgb', bufferfmt='ubyte')
             self.texture.flip_vertical()
             